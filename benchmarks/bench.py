@@ -0,0 +1,224 @@
+"""
+Benchmarks for parsing and handler throughput, run on synthetic event files
+(see generate_events.py).
+
+Each benchmark is timed --repeat times and the best time is kept. Results
+are written as one JSON object, and appended as one line to --output if
+given, so that runs can be compared over time.
+
+Run from the top of the repository, e.g.
+    PYTHONPATH=. python benchmarks/bench.py --games 2000 --output bench.jsonl
+"""
+import os
+import json
+import time
+import shutil
+import inspect
+import platform
+import tempfile
+import importlib.util
+import subprocess
+import logging as log
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+from retrosheet import Analysis, event
+from retrosheet.analysis import _subscribers, _handle_line
+from retrosheet import handlers as handlers_module
+from retrosheet.handlers.handler import Handler
+from retrosheet.handlers.inning import Inning
+
+from generate_events import generate
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Arguments needed to construct handlers whose constructor takes any
+HANDLER_ARGS = {
+    'GameTrigger': ('endofgame',),
+}
+
+def best_time(fcn, repeat):
+    """ Run @fcn @repeat times, and return the fastest time and the last return value """
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ret = fcn()
+        elapsed = time.perf_counter() - t0
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ret
+
+def bench_stream(event_files, repeat):
+    """ Time Analysis._get_python_stream """
+    analysis = Analysis(filenames=event_files)
+    seconds, nlines = best_time(lambda: sum(1 for _ in analysis._get_python_stream()), repeat)
+    return OrderedDict([('seconds', seconds), ('lines', nlines), ('lines_per_sec', nlines / seconds)])
+
+def handler_classes():
+    """ All Handler subclasses defined in retrosheet.handlers """
+    return [cls for _, cls in inspect.getmembers(handlers_module, inspect.isclass)
+            if issubclass(cls, Handler) and cls is not Handler]
+
+def run_handlers(handlers, pylines):
+    """
+    Feed @pylines (already Python objects) to @handlers the way Analysis.run
+    does, resetting every handler after each ID record like regressionWAR
+    does at the end of each game
+    """
+    subscribers = _subscribers(handlers)
+    fire = lambda trigger_name: None
+    for pyline in pylines:
+        _handle_line(subscribers, pyline, fire)
+        if type(pyline) is event.ID:
+            for handler in handlers.values():
+                handler.resolve_error()
+                handler.reset()
+
+def bench_handlers(event_files, repeat):
+    """
+    Time each handler in retrosheet.handlers on its own (with the game state,
+    if it uses it), on pre-parsed lines
+    """
+    pylines = list(Analysis(filenames=event_files)._get_python_stream())
+    ngames = sum(1 for pyline in pylines if type(pyline) is event.ID)
+
+    results = OrderedDict()
+    for cls in handler_classes():
+        args = HANDLER_ARGS.get(cls.__name__, ())
+        def run():
+            # Registered with an Analysis, which adds the game state for
+            # handlers that use it
+            analysis = Analysis(filenames=event_files)
+            analysis.register_handler(cls.__name__, cls(*args))
+            run_handlers(analysis.handlers, pylines)
+        seconds, _ = best_time(run, repeat)
+        results[cls.__name__] = OrderedDict([
+            ('seconds', seconds),
+            ('lines_per_sec', len(pylines) / seconds),
+            ('games_per_sec', ngames / seconds),
+        ])
+    return results
+
+class SharedInning(Handler):
+    """ Reads the inning at each play from the shared game state """
+    uses_game_state = True
+
+    def __init__(self):
+        super(SharedInning, self).__init__()
+        self.inning = None
+
+    def handle_play(self, play):
+        self.inning = self.game_state.inning
+
+def bench_game_state(event_files, repeat, counts=(1, 2, 4, 8)):
+    """
+    Time running N handlers that need the inning, for each N in @counts:
+    N Inning handlers, which each count the outs themselves, and N handlers
+    reading the shared game state, which counts them once
+    """
+    pylines = list(Analysis(filenames=event_files)._get_python_stream())
+
+    results = OrderedDict()
+    for label, cls in [('Inning', Inning), ('shared', SharedInning)]:
+        results[label] = OrderedDict()
+        for n in counts:
+            def run():
+                analysis = Analysis(filenames=event_files)
+                for i in range(n):
+                    analysis.register_handler('{}{}'.format(label, i), cls())
+                run_handlers(analysis.handlers, pylines)
+            seconds, _ = best_time(run, repeat)
+            results[label][str(n)] = OrderedDict([
+                ('seconds', seconds),
+                ('lines_per_sec', len(pylines) / seconds),
+            ])
+    return results
+
+def load_regressionWAR():
+    spec = importlib.util.spec_from_file_location(
+        'regressionWAR', os.path.join(REPO_DIR, 'examples', 'regressionWAR.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def bench_regressionWAR(event_files, ngames, repeat):
+    """ Time building the regressionWAR dataset """
+    try:
+        regressionWAR = load_regressionWAR()
+    except ImportError as e:
+        return OrderedDict([('skipped', str(e))])
+
+    data_dir = tempfile.mkdtemp(prefix='bench_regressionWAR')
+    try:
+        def run():
+            regressionWAR.check_outdir(data_dir, overwrite=True)
+            regressionWAR.create_dataset(event_files, data_dir, ngames)
+        seconds, _ = best_time(run, repeat)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return OrderedDict([('seconds', seconds), ('games_per_sec', ngames / seconds)])
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+BENCHMARKS = ['stream', 'handlers', 'game_state', 'regressionWAR']
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Benchmark parsing and handlers on synthetic event files")
+    parser.add_argument("--games", type=int, default=1000, help="total number of games to generate")
+    parser.add_argument("--files", type=int, default=4, help="number of event files to split them into")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sub-rate", type=float, default=0.03,
+                        help="probability of a substitution after each play")
+    parser.add_argument("--hard-play-rate", type=float, default=0.01,
+                        help="probability that a play comes from hard_plays.txt")
+    parser.add_argument("--repeat", type=int, default=3, help="times to run each benchmark")
+    parser.add_argument("--only", type=str, nargs='+', choices=BENCHMARKS, default=BENCHMARKS,
+                        help="benchmarks to run")
+    parser.add_argument("--output", type=str, default=None,
+                        help="append results to this file as one line of JSON")
+    args = parser.parse_args()
+
+    # regressionWAR logs an error when it stops the analysis; keep that quiet
+    log.getLogger().setLevel(log.CRITICAL)
+
+    event_dir = tempfile.mkdtemp(prefix='bench_events')
+    try:
+        event_files = generate(event_dir, args.files, args.games // args.files, seed=args.seed,
+                               sub_rate=args.sub_rate, hard_play_rate=args.hard_play_rate)
+        ngames = (args.games // args.files) * args.files
+
+        results = OrderedDict()
+        if 'stream' in args.only:
+            results['stream'] = bench_stream(event_files, args.repeat)
+        if 'handlers' in args.only:
+            results['handlers'] = bench_handlers(event_files, args.repeat)
+        if 'game_state' in args.only:
+            results['game_state'] = bench_game_state(event_files, args.repeat)
+        if 'regressionWAR' in args.only:
+            results['regressionWAR'] = bench_regressionWAR(event_files, ngames, args.repeat)
+    finally:
+        shutil.rmtree(event_dir, ignore_errors=True)
+
+    report = OrderedDict([
+        ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+        ('git_commit', git_commit()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('params', OrderedDict([
+            ('games', ngames), ('files', args.files), ('seed', args.seed),
+            ('sub_rate', args.sub_rate), ('hard_play_rate', args.hard_play_rate),
+            ('repeat', args.repeat),
+        ])),
+        ('results', results),
+    ])
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'a') as outfile:
+            outfile.write(json.dumps(report) + '\n')
@@ -0,0 +1,169 @@
+"""
+Generate synthetic Retrosheet event files, for benchmarking without having
+to download the real thing.
+
+Games are internally consistent as far as the handlers in retrosheet.handlers
+are concerned: every half inning has exactly three outs (counted with
+retrosheet.play_parser), each team has its own players, and the winning
+pitcher pitched for one of the teams. Base/runner state is not simulated, so
+e.g. a caught stealing can happen with the bases empty.
+"""
+import os
+import random
+from argparse import ArgumentParser
+
+from retrosheet import utils
+from retrosheet.play_parser import parse_event
+
+TEAMS = ['ANA', 'ARI', 'ATL', 'BAL', 'BOS', 'CHA', 'CHN', 'CIN', 'CLE', 'COL',
+         'DET', 'HOU', 'KCA', 'LAN', 'MIA', 'MIL', 'MIN', 'NYA', 'NYN', 'OAK',
+         'PHI', 'PIT', 'SDN', 'SEA', 'SFN', 'SLN', 'TBA', 'TEX', 'TOR', 'WAS']
+
+# Common play strings and their relative frequencies
+PLAY_MIX = [
+    ('63/G', 12), ('43/G', 10), ('8/F', 10), ('7/F', 7), ('9/F', 7),
+    ('K', 20), ('S7/L', 6), ('S8/G', 6), ('S9/L.1-3', 3), ('D8/F.2-H;1-3', 3),
+    ('W', 8), ('HR/F.2-H;1-H', 3), ('E6/G.1-2', 2), ('FC6/G.1X2(64)', 2),
+    ('64(1)3/GDP', 2), ('8(B)84(2)/LDP', 1), ('K+SB2', 1), ('K+WP.B-1', 1),
+    ('W+PB.1-2', 1), ('CS2(26)', 2), ('PO1(13)', 1), ('SB2', 2), ('WP.2-3', 1),
+    ('S7/G.2XH(72)', 1), ('NP', 4),
+]
+
+HARD_PLAYS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'retrosheet', 'hard_plays.txt'
+)
+
+def load_hard_plays(path=HARD_PLAYS_FILE):
+    """
+    Return the play strings listed in hard_plays.txt: the second line of each
+    blank-line-separated block after the title
+    """
+    with open(path, 'r') as infile:
+        blocks = infile.read().split('\n\n')[1:]
+    return [block.strip().split('\n')[1].strip().lstrip("'") for block in blocks if block.strip()]
+
+class EventFileGenerator(object):
+    def __init__(self, seed=0, sub_rate=0.03, hard_play_rate=0.01, comment_rate=0.02,
+                 year=2019, players=None):
+        """
+        @param seed - random seed, so the same files can be regenerated
+        @param sub_rate - probability of a substitution after each play
+        @param hard_play_rate - probability that a play is one of those in hard_plays.txt
+        @param comment_rate - probability of a comment after each play
+        @param year - year in the game IDs and dates
+        @param players - list of playerIDs to draw rosters from. Defaults to
+                         every player in utils.players.
+        """
+        self.random = random.Random(seed)
+        self.sub_rate = sub_rate
+        self.hard_play_rate = hard_play_rate
+        self.comment_rate = comment_rate
+        self.year = year
+        self.players = list(players if players is not None else utils.players)
+
+        self.plays = [play for play, _ in PLAY_MIX]
+        self.weights = [weight for _, weight in PLAY_MIX]
+        self.hard_plays = load_hard_plays()
+        self.ngames = 0
+
+    def _choose_play(self, outs):
+        """ Choose a play that doesn't put out more than the 3 - @outs batters left """
+        while True:
+            if self.random.random() < self.hard_play_rate:
+                play = self.random.choice(self.hard_plays)
+            else:
+                play = self.random.choices(self.plays, self.weights)[0]
+            if outs + parse_event(play).outs <= 3:
+                return play
+
+    def game(self):
+        """ Return the lines of one game """
+        rand = self.random
+        self.ngames += 1
+        visteam, hometeam = rand.sample(TEAMS, 2)
+        lines = [
+            'id,{}{}{:04d}0'.format(hometeam, self.year, self.ngames),
+            'version,2',
+            'info,visteam,{}'.format(visteam),
+            'info,hometeam,{}'.format(hometeam),
+            'info,date,{}/{:02d}/{:02d}'.format(self.year, rand.randint(4, 9), rand.randint(1, 28)),
+        ]
+
+        # Lineup (batting order 0 is the pitcher, who doesn't bat) plus a
+        # bench to substitute from, all distinct across both teams
+        people = rand.sample(self.players, 50)
+        lineups = [people[:10], people[25:35]]
+        benches = [people[10:25], people[35:50]]
+        pitchers = [[lineup[0]] for lineup in lineups]
+        for homeaway, lineup in enumerate(lineups):
+            for battingorder, playerID in enumerate(lineup):
+                position = 1 if battingorder == 0 else battingorder
+                lines.append('start,{},"Player {}",{},{},{}'.format(
+                    playerID, playerID, homeaway, battingorder, position))
+
+        for inning in range(1, 10):
+            for homeaway in (0, 1):
+                outs = 0
+                batter = 1
+                while outs < 3:
+                    play = self._choose_play(outs)
+                    outs += parse_event(play).outs
+                    lines.append('play,{},{},{},??,,{}'.format(
+                        inning, homeaway, lineups[homeaway][batter], play))
+                    batter = batter % 9 + 1
+
+                    if rand.random() < self.sub_rate:
+                        side = rand.randint(0, 1)
+                        if benches[side]:
+                            battingorder = rand.randint(0, 9)
+                            playerID = benches[side].pop()
+                            lineups[side][battingorder] = playerID
+                            position = 1 if battingorder == 0 else battingorder
+                            if position == 1:
+                                pitchers[side].append(playerID)
+                            lines.append('sub,{},"Player {}",{},{},{}'.format(
+                                playerID, playerID, side, battingorder, position))
+                    if rand.random() < self.comment_rate:
+                        lines.append('com,"Synthetic comment, with a comma"')
+
+        wp = rand.choice(pitchers[rand.randint(0, 1)])
+        lines.append('data,er,{},{}'.format(wp, rand.randint(0, 5)))
+        lines.append('info,wp,{}'.format(wp))
+        return lines
+
+    def write(self, path, ngames):
+        """ Write an event file of @ngames games to @path """
+        with open(path, 'w') as outfile:
+            for _ in range(ngames):
+                outfile.write('\n'.join(self.game()))
+                outfile.write('\n')
+
+def generate(outdir, nfiles, games_per_file, **kwargs):
+    """
+    Write @nfiles event files of @games_per_file games each into @outdir,
+    and return their paths. Keyword arguments go to EventFileGenerator.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    generator = EventFileGenerator(**kwargs)
+    paths = []
+    for i in range(nfiles):
+        path = os.path.join(outdir, 'SYN{:03d}.EVN'.format(i))
+        generator.write(path, games_per_file)
+        paths.append(path)
+    return paths
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Generate synthetic Retrosheet event files")
+    parser.add_argument("outdir", type=str, help="directory to write event files into")
+    parser.add_argument("--nfiles", type=int, default=1, help="number of event files")
+    parser.add_argument("--games-per-file", type=int, default=100, help="games in each file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--sub-rate", type=float, default=0.03,
+                        help="probability of a substitution after each play")
+    parser.add_argument("--hard-play-rate", type=float, default=0.01,
+                        help="probability that a play comes from hard_plays.txt")
+    args = parser.parse_args()
+
+    for path in generate(args.outdir, args.nfiles, args.games_per_file, seed=args.seed,
+                         sub_rate=args.sub_rate, hard_play_rate=args.hard_play_rate):
+        print(path)
@@ -1,9 +1,11 @@
 """
 Perform a linear regression to predict wins as a function of innings played by each player.
 """
-import os, sys
-import pickle
+import os
+import time
+import random
 import shutil
+import tracemalloc
 import logging as log
 
 
@@ -13,21 +15,33 @@ import joblib
 
 import numpy as np
 import h5py
-import scipy.sparse
 from sklearn import linear_model
 
-from retrosheet import Analysis, HOME, AWAY, utils, StopAnalysis
-from retrosheet.handlers import InningsPlayed, Winner, GameTrigger, ActivePlayers
+from retrosheet import Analysis, AWAY, utils, StopAnalysis, archives
+from retrosheet.handlers import InningsPlayed, InningsPlayedMatrix, Winner, GameTrigger, ActivePlayers
+from retrosheet.sparse_dataset import SparseDatasetWriter, SparseDatasetReader
+from retrosheet.shards import season_of, shard_by_season, shard_by_file, run_shards
 
-H5_FILENAME = "winlose.h5"
-NPZ_FILENAME = "inn_played.npz"
+H5_FILENAME = "dataset.h5"
 RESULTS_FILENAME = "reg.pkl"
 
-def load_h5(data_dir):
+# --compare skips the dense solver when x as a dense array would be bigger
+# than this, unless --compare-dense is passed
+DENSE_COMPARE_MAX_BYTES = 1 << 30
+
+def load_activeIDs(data_dir):
     with h5py.File(os.path.join(data_dir, H5_FILENAME), 'r') as infile:
-        y = infile['y'][:]
-        activeIDs = infile['activeIDs'][:]
-        return y, activeIDs
+        return infile['activeIDs'][:]
+
+def load_dataset(data_dir, batch_size=1 << 16):
+    """
+    Read x (innings played by the active players) and y from the dataset
+    file, a batch of rows at a time
+    """
+    activeIDs = load_activeIDs(data_dir)
+    with SparseDatasetReader(os.path.join(data_dir, H5_FILENAME)) as reader:
+        x, y = reader.to_csr(columns=activeIDs, batch_size=batch_size)
+    return x, y, activeIDs
 
 def check_outdir(outdir, overwrite):
     """
@@ -44,16 +58,10 @@ def check_outdir(outdir, overwrite):
                             " --create-dataset is passed. Pass --overwrite to continue anyways")
         
 
-def create_dataset(event_files, data_dir, ngames):
-
-    # Main analysis object
-    analysis = Analysis(filenames=event_files)
-
+def register_handlers(analysis):
     # Register a handler that keeps track of all players who play in
-    # the sample of games we analyze. This is only used to trim the array
-    # at the very end
-    actives = ActivePlayers()
-    analysis.register_handler('all_players', actives)
+    # each game. This is only used to trim the array at the very end
+    analysis.register_handler('all_players', ActivePlayers())
 
     # Register a handler that keeps track of the # of innings played by each player
     analysis.register_handler('inn_played', InningsPlayed())
@@ -64,129 +72,309 @@ def create_dataset(event_files, data_dir, ngames):
     # Register a handler that fires a trigger called 'endofgame' at the end of each game
     analysis.register_handler('trigger', GameTrigger('endofgame'))
 
-    # Define data structures where we will store analysis results
-    nplayers = len(utils.playerID_to_idx)
-    y = np.zeros(shape=2*ngames)
-    # x = scipy.sparse.csr_matrix((2*ngames, nplayers))
-    x = np.zeros(shape=(2*ngames, nplayers))
+# The 'endofgame' trigger is split in two. game_result is passed the
+# dictionary of handlers that we registered, and returns what we need from
+# them for one game. The function it is registered with takes that and
+# populates the x and y arrays, with add_game_rows. Only the second runs
+# for games whose results are in the result cache.
+
+def game_result(handlers):
+    # The handlers clear their containers in place when they are reset
+    # below, so the result holds copies of them
+    gameID = handlers['trigger'].prev_gameID
+    players = set(handlers['all_players'].players)
+
+    # Check if any handlers errored. Only process this game's data if no handlers errored
+    err_handlers = [h for h in handlers.values() if h.error]
+    if err_handlers:
+        log.info("Could not process game {} because of these errored handlers: {}".format(
+            handlers['trigger'].current_gameID, err_handlers)
+        )
+        for handler in err_handlers:
+            # In this analysis, we resolve errors by skipping the game
+            # So there's no work to do before marking the error resolved.
+            # The handler will get reset at the end of the game as usual.
+            handler.resolve_error()
+
+        # Leave this game's rows empty
+        result = gameID, players, None, None, None
+    else:
+        # The # of innings played by each player on the away and home teams
+        inn_played = handlers['inn_played']
+
+        # Determine who won
+        winning_homeaway, winning_team = handlers['winner'].get_winning_team()
+        result = (gameID, players, dict(inn_played.away.inn_played),
+                  dict(inn_played.home.inn_played), winning_homeaway)
+
+    # Finally, reset all handlers for the next game
+    for hname in ['all_players', 'inn_played', 'winner']:
+            handlers[hname].reset()
+
+    return result
+
+def add_game_rows(dataset, result):
+    """
+    Add the rows for the away team and home team, in that order, from a
+    game_result to @dataset (anything with add_row(row, label))
+    """
+    gameID, players, away_inn_played, home_inn_played, winning_homeaway = result
+    if winning_homeaway is None:
+        dataset.add_row({}, 0)
+        dataset.add_row({}, 0)
+    else:
+        # Place the # of innings played by each player on the away and
+        # home teams into the sparse array, with +1 or -1 for y
+        away_won = winning_homeaway == AWAY
+        dataset.add_row(away_inn_played, +1 if away_won else -1)
+        dataset.add_row(home_inn_played, -1 if away_won else +1)
+
+def save_activeIDs(dataset_path, actives):
+    """
+    Save the columns of x representing players who played in the sample
+    of games we analyzed, so the others can be trimmed when loading it
+    """
+    activeIDs = np.array(sorted(actives), dtype=np.int64)
+    with h5py.File(dataset_path, 'a') as outfile:
+        if 'activeIDs' in outfile:
+            del outfile['activeIDs']
+        outfile.create_dataset('activeIDs', data=activeIDs)
+    return activeIDs
+
+def create_dataset(event_files, data_dir, ngames, checkpoint_path=None, result_cache_dir=None):
+
+    # Main analysis object. With a checkpoint, an interrupted build picks
+    # up where it left off, and a finished one is extended with only the
+    # event files added since. With a result cache, games that have been
+    # through a previous build aren't parsed again
+    analysis = Analysis(filenames=event_files, checkpoint_path=checkpoint_path,
+                        result_cache_dir=result_cache_dir)
+    register_handlers(analysis)
+
+    # Define data structures where we will store analysis results.
+    # x and y are written to disk one row at a time as the games are
+    # processed, so they never need to fit in memory. The handlers key
+    # players by their codes, which are their columns. When resuming from a
+    # checkpoint, rows are added to the ones already there
+    dataset_path = os.path.join(data_dir, H5_FILENAME)
+    resuming = checkpoint_path is not None and os.path.exists(checkpoint_path)
+    dataset = SparseDatasetWriter(dataset_path, len(utils.players), append=resuming)
+
+    # All players who played in the sample of games we analyze
+    actives = set()
 
     game_i = 0 # counter of how many games we've processed
     # Index game_i * 2 + AWAY represents the away team of game game_i (AWAY = 0)
     # Index game_i * 2 + HOME represents the home team of game game_i (HOME = 1)
-    
-    # Define the function that will get called when this trigger fires.
-    # This function will be passed the dictionary of handlers that we
-    # just registered. In it, we populate the x and y arrays one game
-    # at a time.
 
-    def endofgame(handlers):
+    def endofgame(result):
         nonlocal game_i
-        log.info("Processing game {} ({} of {})".format(
-            handlers['trigger'].prev_gameID, game_i, ngames
-        ))
-
-        # Check if any handlers errored. Only process this game's data if no handlers errored
-        err_handlers = [h for h in handlers.values() if h.error]
-        if err_handlers:
-            log.info("Could not process game {} because of these errored handlers: {}".format(
-                handlers['trigger'].current_gameID, err_handlers)
-            )
-            for handler in err_handlers:
-                # In this analysis, we resolve errors by skipping the game
-                # So there's no work to do before marking the error resolved.
-                # The handler will get reset at the end of the game as usual.
-                handler.resolve_error()
-        else:
-            # Grab the # of innings played by each player on the home and away teams
-            inn_played_home = handlers['inn_played'].home.inn_played
-            inn_played_away = handlers['inn_played'].away.inn_played
+        log.info("Processing game {} ({} of {})".format(result[0], game_i, ngames))
 
-            away_i = game_i * 2 + AWAY
-            home_i = game_i * 2 + HOME
+        actives.update(result[1])
+        add_game_rows(dataset, result)
 
-            # Place this game's data in sparse array
-            x[away_i, :] = utils.to_row(inn_played_away)
-            x[home_i, :] = utils.to_row(inn_played_home)
+        game_i += 1
+        if game_i >= ngames:
+            raise StopAnalysis()
 
-            # TODO future: construct in standard CSR representation
-            # see https://docs.scipy.org/doc/scipy/reference/generated/scipy.sparse.csr_matrix.html
+    # Register this trigger to the analysis:
+    analysis.register_cached_trigger('endofgame', game_result, endofgame, version=2)
+
+    # The dataset, actives and game_i live outside the handlers, so save
+    # them with each checkpoint. The dataset is on disk already, so only
+    # how many rows it had is saved, and any rows added after that are
+    # dropped when resuming
+    def save_arrays():
+        dataset.flush()
+        return dataset.nrows, actives, game_i
+
+    def restore_arrays(state):
+        nonlocal actives, game_i
+        nrows, actives, game_i = state
+        dataset.truncate(nrows)
+
+    analysis.register_checkpoint_hook(save_arrays, restore_arrays)
+
+    # Run the analysis we just set up to contruct these arrays. Delivering
+    # the records a game at a time means the trigger also fires at the end
+    # of the final game, which is not followed by an 'id' record.
+    try:
+        analysis.run(by_game=True)
+    finally:
+        dataset.close()
+
+    activeIDs = save_activeIDs(dataset_path, actives)
+    log.info("Saved datasets")
 
-            # Determine who won and put +1 or -1 into the y vector
-            winning_homeaway, winning_team = handlers['winner'].get_winning_team()
-            if winning_homeaway == AWAY:
-                y[away_i] = +1
-                y[home_i] = -1
-            else:
-                y[away_i] = -1
-                y[home_i] = +1
+    return activeIDs
 
-        # Finally, reset all handlers for the next game
-        for hname in ['inn_played', 'winner']:
-                handlers[hname].reset()
+class ShardRows(object):
+    """ The rows of x and y for one shard, kept in memory """
+    def __init__(self):
+        self.x = InningsPlayedMatrix()
+        self.y = []
+        # Players in each game, in order
+        self.players = []
 
-        game_i += 1
-        if game_i >= ngames:
-            raise StopAnalysis()
+    def add_row(self, row, label):
+        self.x.add_row(row)
+        self.y.append(label)
 
+def setup_shard(analysis):
+    """ Set up the Analysis for one shard (see retrosheet.shards.run_shards) """
+    register_handlers(analysis)
+    rows = ShardRows()
 
+    def endofgame(result):
+        rows.players.append(result[1])
+        add_game_rows(rows, result)
 
-    # Register this trigger to the analysis:
-    analysis.register_trigger('endofgame', endofgame)
-
-    # Run the analysis we just set up to contruct these arrays
-    analysis.run()
-
-    # The final game does not end with 'id' record, so we need to manually
-    # fire the trigger to process it:
-    # analysis.handlers['trigger'].advance_game("lastgame")
-    # analysis.fire_trigger('endofgame')
-
-    # Trim columns of X representing players who didn't play
-    # in the sample of games we analyzed, and convert to coo
-    # sparse matrix format. We use coo because this page shows
-    # coo is faster than dense matrix in lasso regression:
-    # https://scikit-learn.org/stable/auto_examples/linear_model/plot_lasso_dense_vs_sparse_data.html
-    activeIDs = np.array([utils.playerID_to_idx[playerID] for playerID in actives.playerIDs])
-    activeIDs = sorted(activeIDs)
-    # x = x.tocsc()[:, activeIDs].tocoo()
-    x = scipy.sparse.coo_matrix(x[:, activeIDs])
-
-    # Save the arrays to disk
-    scipy.sparse.save_npz(os.path.join(data_dir, NPZ_FILENAME), x)
-    with h5py.File(os.path.join(data_dir, H5_FILENAME), 'w') as outfile:
-        outfile.create_dataset('y', data=y)
-        outfile.create_dataset('activeIDs', data=activeIDs)
+    analysis.register_cached_trigger('endofgame', game_result, endofgame, version=2)
+    return lambda: (rows.x.to_csr(len(utils.players)), np.array(rows.y, dtype=float), rows.players)
 
+def create_dataset_sharded(event_files, data_dir, ngames, nprocs, shard_by='season'):
+    """
+    Same as create_dataset, but split the event files into shards (by season
+    or by file), and build each shard's rows in a separate process. The
+    shards' rows are written to the dataset in order, and use the same
+    global player columns, so the dataset is the same as create_dataset's.
+    """
+    shard = shard_by_season if shard_by == 'season' else shard_by_file
+    shards = shard(event_files)
+    log.info("Running {} shards in {} processes".format(len(shards), nprocs))
+
+    dataset_path = os.path.join(data_dir, H5_FILENAME)
+    actives = set()
+    game_i = 0
+    with SparseDatasetWriter(dataset_path, len(utils.players)) as dataset:
+        for index, handlers, (x, y, players) in run_shards(shards, setup_shard, nprocs, by_game=True):
+            # Only keep as many games as we still need
+            keep = min(len(players), ngames - game_i)
+            dataset.add_rows(x[:2 * keep], y[:2 * keep])
+            for game_players in players[:keep]:
+                actives.update(game_players)
+            game_i += keep
+            log.info("Added shard {} of {} ({} games so far)".format(index + 1, len(shards), game_i))
+            if game_i >= ngames:
+                break
+
+    activeIDs = save_activeIDs(dataset_path, actives)
     log.info("Saved datasets")
 
-    return x, y, activeIDs
-    
-def regression(data_dir=None, x=None, y=None, activeIDs=None):
-    # Load data if not passed in
-    if x is None:
-        x = scipy.sparse.load_npz(os.path.join(data_dir, NPZ_FILENAME)).todense()
-    if y is None or activeIDs is None:
-        y, activeIDs = load_h5(data_dir)
-
-    # Perform linear regression
-    reg = linear_model.LinearRegression()
+    return activeIDs
+
+def fit_dense(data_dir, alpha=0.0, **kwargs):
+    """ Fit on x as a dense array. Needs memory for every player in every game. """
+    x, y, activeIDs = load_dataset(data_dir)
+    x = x.toarray()
+    reg = linear_model.Ridge(alpha=alpha) if alpha else linear_model.LinearRegression()
     reg.fit(x, y)
+    return reg
+
+def fit_sparse(data_dir, alpha=0.0, **kwargs):
+    """ Fit on x as a sparse matrix, with a sparse least-squares solver """
+    x, y, activeIDs = load_dataset(data_dir)
+    if alpha:
+        reg = linear_model.Ridge(alpha=alpha, solver='sparse_cg')
+    else:
+        reg = linear_model.LinearRegression()
+    reg.fit(x, y)
+    return reg
 
-    import ipdb; ipdb.set_trace()
+def fit_sgd(data_dir, alpha=0.0, batch_size=4096, epochs=5, seed=0, **kwargs):
+    """
+    Fit with stochastic gradient descent, reading x a batch of rows at a
+    time, so that only one batch is ever in memory. Each epoch goes through
+    the batches in a different random order.
+    """
+    activeIDs = load_activeIDs(data_dir)
+    reg = linear_model.SGDRegressor(penalty='l2' if alpha else None, alpha=alpha,
+                                    random_state=seed)
+    rand = random.Random(seed)
+    with SparseDatasetReader(os.path.join(data_dir, H5_FILENAME)) as reader:
+        starts = list(range(0, reader.nrows, batch_size))
+        for epoch in range(epochs):
+            rand.shuffle(starts)
+            for start in starts:
+                x, y = reader.rows(start, start + batch_size, columns=activeIDs)
+                reg.partial_fit(x, y)
+            log.info("Finished epoch {} of {}".format(epoch + 1, epochs))
+    return reg
+
+SOLVERS = {
+    'dense': fit_dense,
+    'sparse': fit_sparse,
+    'sgd': fit_sgd,
+}
+
+def dense_bytes(data_dir):
+    """ Size of x as the dense array fit_dense makes, which it needs on top of the dataset """
+    with SparseDatasetReader(os.path.join(data_dir, H5_FILENAME)) as reader:
+        nrows = reader.nrows
+    return nrows * len(load_activeIDs(data_dir)) * np.dtype(np.float64).itemsize
+
+def measure(fcn, *args, **kwargs):
+    """
+    Call @fcn, and return its return value, how long it took in seconds, and
+    the peak memory it allocated in bytes (as seen by tracemalloc)
+    """
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        ret = fcn(*args, **kwargs)
+        seconds = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return ret, seconds, peak
+
+def regression(data_dir, solver='sparse', compare=False, compare_dense=False, **kwargs):
+    """
+    Regress wins on innings played using @solver (see SOLVERS), and save the
+    fitted model. Keyword arguments go to the solver.
+    @param compare - if True, also fit with every other solver, and report
+                     the time and peak memory each one takes. The dense
+                     solver is left out if x would take more than
+                     DENSE_COMPARE_MAX_BYTES as a dense array.
+    @param compare_dense - if True, compare with the dense solver whatever
+                           the size of x
+    """
+    solvers = list(SOLVERS) if compare else [solver]
+    if compare and solver != 'dense' and not compare_dense:
+        nbytes = dense_bytes(data_dir)
+        if nbytes > DENSE_COMPARE_MAX_BYTES:
+            log.warning("Not comparing with the dense solver, since x would take {:.1f} GB"
+                        " as a dense array. Pass --compare-dense to compare anyway".format(nbytes / 1e9))
+            solvers.remove('dense')
+    reports = []
+    for name in solvers:
+        reg, seconds, peak = measure(SOLVERS[name], data_dir, **kwargs)
+        reports.append((name, seconds, peak))
+        log.info("Fit with {} in {:.2f} sec, {:.1f} MB peak".format(name, seconds, peak / 1e6))
+        if name == solver:
+            result = reg
+
+    if compare:
+        print("{:<8} {:>10} {:>12}".format('solver', 'seconds', 'peak MB'))
+        for name, seconds, peak in reports:
+            print("{:<8} {:>10.2f} {:>12.1f}".format(name, seconds, peak / 1e6))
 
     # Save regression results to disk
-    joblib.dump(reg, RESULTS_FILENAME)
+    joblib.dump(result, RESULTS_FILENAME)
 
     log.info("Done.")
+    return result
 
 if __name__ == '__main__':
     parser = ArgumentParser(description="Linearly regress wins on innings played using the MLB retrosheet")
-    # parser.add_arugment("--year-from", "--start-year", type=int, required=False, default=2020,
-    #                     help="First year to analyze")
-    # parser.add_arugment("--year-to", "--end-year", type=int, required=False, default=2020,
-    #                     help="Last year to analyze")
+    parser.add_argument("--year-from", "--start-year", type=int, required=False, default=None,
+                        help="First year to analyze, going by the event file names")
+    parser.add_argument("--year-to", "--end-year", type=int, required=False, default=None,
+                        help="Last year to analyze, going by the event file names")
     parser.add_argument("--event-files", type=str, nargs='+', required=False, default=None,
-                        help="Event file(s) from MLB retrosheet. Required if not using stdin")
+                        help="Event file(s) from MLB retrosheet, which can be zip archives" + \
+                        " or gzipped, and globs (see retrosheet.archives). Required if not using stdin")
     parser.add_argument("--data-dir", type=str, required=False, default='./regressionWARdata',
                         help="directory where data should be stored (if --create-dataset is" + \
                         " passed) and/or read from (if --regression is passed)")
@@ -198,6 +386,32 @@ if __name__ == '__main__':
                         help="Overwrite the data directory if not empty")
     parser.add_argument("--ngames", type=int, required=True,
                         help="How many games to analyze. Ignore all games after this.")
+    parser.add_argument("--checkpoint", type=str, required=False, default=None,
+                        help="checkpoint file for --create-dataset. If it exists, resume" + \
+                        " from it, only reading games (or event files) not read yet")
+    parser.add_argument("--nprocs", type=int, default=1,
+                        help="for --create-dataset, split the event files into shards and run" + \
+                        " them in this many processes")
+    parser.add_argument("--shard-by", type=str, choices=['season', 'file'], default='season',
+                        help="how to split the event files when --nprocs > 1")
+    parser.add_argument("--result-cache", type=str, required=False, default=None,
+                        help="directory to cache each game's results in for --create-dataset," + \
+                        " so that games already seen by a previous build aren't parsed again")
+    parser.add_argument("--solver", type=str, choices=list(SOLVERS), default='sparse',
+                        help="how to fit the regression: on a dense array (needs memory for every" + \
+                        " player in every game), on the sparse matrix, or by stochastic gradient" + \
+                        " descent over batches of rows read from disk")
+    parser.add_argument("--alpha", type=float, default=0.0,
+                        help="strength of L2 regularization (0 for none)")
+    parser.add_argument("--batch-size", type=int, default=4096,
+                        help="rows per batch for --solver sgd")
+    parser.add_argument("--epochs", type=int, default=5,
+                        help="passes over the data for --solver sgd")
+    parser.add_argument("--compare", action='store_true', default=False,
+                        help="fit with every solver, and report the time and peak memory of each")
+    parser.add_argument("--compare-dense", action='store_true', default=False,
+                        help="with --compare, fit with the dense solver even if x is too big to" + \
+                        " compare it by default (see DENSE_COMPARE_MAX_BYTES)")
     parser.add_argument("--log", type=str, choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                         required=False, default='warning',
                         help='set the level of log messages to see')
@@ -211,10 +425,34 @@ if __name__ == '__main__':
     if not args.create_dataset and not args.regression:
         raise Exception("Must pass either --create-dataset or --regression")
 
-    x, y, activeIDs = None, None, None
     if args.create_dataset:
-        check_outdir(args.data_dir, args.overwrite)
-        x, y, activeIDs = create_dataset(args.event_files, args.data_dir, args.ngames)
+        event_files = archives.expand(args.event_files) if args.event_files else None
+        if event_files and (args.year_from is not None or args.year_to is not None):
+            year_from = args.year_from if args.year_from is not None else float('-inf')
+            year_to = args.year_to if args.year_to is not None else float('inf')
+            event_files = [filename for filename in event_files
+                           if season_of(filename) is not None and
+                           year_from <= season_of(filename) <= year_to]
+
+        if args.nprocs > 1:
+            if not event_files:
+                raise Exception("--nprocs > 1 needs --event-files")
+            if args.checkpoint or args.result_cache:
+                raise Exception("--checkpoint and --result-cache can't be used with --nprocs > 1")
+            check_outdir(args.data_dir, args.overwrite)
+            create_dataset_sharded(event_files, args.data_dir, args.ngames, args.nprocs,
+                                   shard_by=args.shard_by)
+        else:
+            if args.checkpoint and os.path.exists(args.checkpoint):
+                # Resuming: the data directory holds the dataset so far
+                os.makedirs(args.data_dir, exist_ok=True)
+            else:
+                check_outdir(args.data_dir, args.overwrite)
+            create_dataset(event_files, args.data_dir, args.ngames,
+                           checkpoint_path=args.checkpoint,
+                           result_cache_dir=args.result_cache)
 
     if args.regression:
-        regression(data_dir=args.data_dir, x=x, y=y, activeIDs=activeIDs)
+        regression(args.data_dir, solver=args.solver, compare=args.compare,
+                   compare_dense=args.compare_dense, alpha=args.alpha,
+                   batch_size=args.batch_size, epochs=args.epochs)
@@ -3,14 +3,21 @@ This file defines the object which reads in the actual retrosheet,
 hands the data off to each of the handlers registered to it, and
 produces the final output
 """
+import os
 import sys
-import csv
+import queue
+import pickle
 import itertools
+import time
+import threading
 import logging as log
 from collections import OrderedDict
-from fileinput import FileInput
+from contextlib import closing
+from multiprocessing import Pool
 
-from retrosheet.event import pythonify_line
+from retrosheet import ids, archives
+from retrosheet.event import pythonify_line, class_for, ID
+from retrosheet.reader import read_event_files, split_lines
 
 class FatalHandlerException(Exception):
     """
@@ -32,15 +39,251 @@ class StopAnalysis(FatalHandlerException):
     """
     pass
 
-    
+
+def _subscribers(handlers, profiler=None, by_game=False):
+    """
+    Given the dict of handlers, return a dict mapping each record type to a
+    list of (handler, handling function) for the handlers subscribed to that
+    type, in the order the handlers were registered
+    @param profiler - if passed, each handling function is wrapped so that
+                      this Profiler counts and times its calls
+    @param by_game - if True, leave out batch handlers (those with a
+                     handle_game method), which get whole games instead
+    """
+    subscribers = {}
+    for name, handler in handlers.items():
+        if by_game and hasattr(handler, 'handle_game'):
+            continue
+        for typ, fcn in handler.subscriptions().items():
+            if profiler:
+                fcn = profiler.time_handler(name, typ.__name__, fcn)
+            subscribers.setdefault(typ, []).append((handler, fcn))
+    return subscribers
+
+def _handle_line(subscribers, pyline, fire_trigger):
+    """
+    Pass one line to each handler subscribed to its type, calling
+    @fire_trigger with the name of any trigger a handler returns
+    @param subscribers - dict returned by _subscribers()
+    """
+    for handler, fcn in subscribers.get(type(pyline), ()):
+        if handler.error:
+            # Errored handlers don't run until the error is resolved
+            continue
+        try:
+            # run the handler
+            trigger_name = fcn(pyline)
+        except NonfatalHandlerException as e:
+            log.error(e)
+            handler.mark_error()
+            trigger_name = None
+
+        # if the handler returned a trigger, fire it
+        if trigger_name:
+            fire_trigger(trigger_name)
+
+def _end_of_game(handlers, profiler=None):
+    """
+    Return a list of (handler, function) for the handlers that do anything at
+    the end of a game (see Handler.end_of_game), in the order the handlers
+    were registered
+    """
+    end_of_game = []
+    for name, handler in handlers.items():
+        fcn = handler.end_of_game()
+        if fcn:
+            if profiler:
+                fcn = profiler.time_handler(name, 'end of game', fcn)
+            end_of_game.append((handler, fcn))
+    return end_of_game
+
+def _handle_game(subscribers, end_of_game, game, fire_trigger):
+    """
+    Pass each line of @game to the handlers subscribed to its type, then the
+    whole game to each handler's end-of-game function, calling @fire_trigger
+    with the name of any trigger a handler returns
+    @param subscribers - dict returned by _subscribers(by_game=True)
+    @param end_of_game - list returned by _end_of_game()
+    """
+    for pyline in game:
+        _handle_line(subscribers, pyline, fire_trigger)
+
+    for handler, fcn in end_of_game:
+        if handler.error:
+            continue
+        try:
+            trigger_name = fcn(game)
+        except NonfatalHandlerException as e:
+            log.error(e)
+            handler.mark_error()
+            trigger_name = None
+
+        if trigger_name:
+            fire_trigger(trigger_name)
+
+# Pickled copy of the handlers as they were when the parallel run started.
+# Each worker process receives this once, and unpickles a fresh copy of it
+# for every game.
+_worker_handlers = None
+
+# True if the worker should time its handlers
+_worker_profile = False
+
+# True if the worker should deliver games in batches (see Analysis.run)
+_worker_by_game = False
+
+def _init_worker(handlers_pickle, profile, by_game):
+    global _worker_handlers, _worker_profile, _worker_by_game
+    _worker_handlers = handlers_pickle
+    _worker_profile = profile
+    _worker_by_game = by_game
+
+def _run_game(task):
+    """
+    Run a fresh copy of the handlers over one game in a worker process.
+    @param task - tuple of (list of lines in the game, ID record of the
+                  following game or None). Unless delivering games in
+                  batches, the following ID record is handled last so that
+                  end-of-game triggers fire.
+    Returns a list of (trigger name, pickled handlers at the time the trigger
+    fired), the handlers as they stand at the end of the game, the
+    FatalHandlerException that stopped the game, if any, and the handler
+    timings if profiling (see Profiler.handler_stats), else None.
+    """
+    lines, next_id = task
+    handlers = pickle.loads(_worker_handlers)
+    fired = []
+    def fire(trigger_name):
+        fired.append((trigger_name, pickle.dumps(handlers)))
+
+    profiler = None
+    if _worker_profile:
+        from retrosheet.profiling import Profiler
+        profiler = Profiler()
+    subscribers = _subscribers(handlers, profiler, _worker_by_game)
+
+    exc = None
+    try:
+        if _worker_by_game:
+            _handle_game(subscribers, _end_of_game(handlers, profiler), lines, fire)
+        else:
+            if next_id is not None:
+                lines = lines + [next_id]
+            for pyline in lines:
+                _handle_line(subscribers, pyline, fire)
+    except FatalHandlerException as e:
+        exc = e
+    return fired, handlers, exc, profiler.handler_stats() if profiler else None
+
+# Number of lines (or games, when delivering games in batches) handed from
+# the reader thread to the handlers at a time when prefetching
+PREFETCH_LINES = 1024
+PREFETCH_GAMES = 16
+
+# Marks the end of the stream in the prefetch queue
+_end_of_stream = object()
+
+# Result of a cached trigger that hasn't fired yet in the current game
+_not_fired = object()
+
+def _prefetched(stream, maxsize, batch_size):
+    """
+    Yield the items of @stream, which is read in a separate thread up to
+    @maxsize batches of @batch_size items ahead of the caller. Reading and
+    parsing the retrosheet can then overlap with the handlers, e.g. while
+    waiting on the disk.
+
+    The reader thread blocks once the queue is full, so it never gets more
+    than @maxsize batches ahead. If the reader raises, the exception is
+    re-raised here. If the caller stops early (e.g. a handler raises
+    FatalHandlerException), close() the generator and the reader thread
+    stops before its next batch.
+    """
+    batches = queue.Queue(maxsize)
+    stopping = threading.Event()
+
+    def put(item):
+        # Give up if the consumer has stopped, rather than block forever
+        while not stopping.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            it = iter(stream)
+            while not stopping.is_set():
+                batch = list(itertools.islice(it, batch_size))
+                if not batch or not put(batch):
+                    break
+        except BaseException as e:
+            put(e)
+        else:
+            put(_end_of_stream)
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+
+    reader = threading.Thread(target=read, name='retrosheet-prefetch', daemon=True)
+    reader.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _end_of_stream:
+                return
+            if isinstance(batch, BaseException):
+                raise batch
+            yield from batch
+    finally:
+        stopping.set()
+        reader.join()
+
 
 class Analysis(object):
-    def __init__(self, filename=None, filenames=None):
+    def __init__(self, filename=None, filenames=None, cache_dir=None, profile=False,
+                 game_filter=None, index_path=None, checkpoint_path=None,
+                 checkpoint_every=1000, result_cache_dir=None, result_cache_bytes=1 << 30):
         """
         Creates an Analysis object for parsing the MLB retrosheet.
         @param filename - name of the retrosheet Event file 
         @param filenames - if running on multiple Event files (you usually will),
                            pass them as a list here.
+                           Event files can be in zip archives or gzipped, and
+                           named with globs (see retrosheet.archives). Archived
+                           Event files can't be used with @cache_dir,
+                           @game_filter, @checkpoint_path or @result_cache_dir.
+        @param cache_dir - if passed, keep a binary cache of each Event file in
+                           this directory (see retrosheet.cache), and read from
+                           it instead of the Event file when it is up to date.
+        @param profile - if True, record how long each stage of the run and each
+                         handler takes, log progress as the run goes, and write a
+                         summary to STDERR at the end (see retrosheet.profiling).
+                         The results are kept in self.profiler.
+        @param game_filter - if passed, only run on the games for which this is True.
+                             It is called with a retrosheet.index.GameEntry for each
+                             game (see retrosheet.index.GameFilter). The games are
+                             found with a GameIndex of the Event files, and read
+                             directly, skipping everything else. The cache is not used.
+        @param index_path - file to save the GameIndex in, so it is only rebuilt
+                            for Event files that have changed. If not passed, the
+                            index is built in memory for each run.
+        @param checkpoint_path - if passed, save a checkpoint of the run in this file
+                                 every @checkpoint_every games and at the end (see
+                                 retrosheet.checkpoint), and resume from it if it
+                                 already exists: after the last game handled if the
+                                 run was interrupted, or with only the Event files
+                                 that are new since if it finished. Games are read
+                                 with the game index, as with @game_filter.
+        @param checkpoint_every - number of games between checkpoints
+        @param result_cache_dir - if passed, store the results of each cached trigger
+                                  (see register_cached_trigger) for each game in this
+                                  directory, and skip games whose results are already
+                                  there (see retrosheet.result_cache). Games are read
+                                  with the game index, as with @game_filter.
+        @param result_cache_bytes - size limit of the result cache
         If neither @filename nor @filenames is specified, we will expect the retrosheet on STDIN
         If either is passed, STDIN will be ignored
         """
@@ -50,44 +293,346 @@ class Analysis(object):
                              " Or send all data through STDIN and use neither.")
         
         if filenames:
-            self.filenames = filenames
+            self.filenames = archives.expand(filenames)
         elif filename:
-            self.filenames = [filename]
+            self.filenames = archives.expand([filename])
         else:
-            self.filenames = ['-'] # FileInput treats this as stdin
+            self.filenames = ['-'] # read_event_files treats this as stdin
+
+        archived = [name for name in self.filenames if name != '-' and archives.is_archived(name)]
+        if archived and (cache_dir or game_filter or checkpoint_path or result_cache_dir):
+            raise ValueError("Archived Event files (e.g. {}) can't be cached or indexed".format(
+                archived[0]))
+
+        self.cache = None
+        if cache_dir:
+            # Imported here so numpy is only needed when caching
+            from retrosheet.cache import EventFileCache
+            self.cache = EventFileCache(cache_dir)
+
+        self.game_filter = game_filter
+        self.index_path = index_path
+        if game_filter and self.filenames == ['-']:
+            raise ValueError("@game_filter needs @filename or @filenames; STDIN can't be indexed")
+
+        self.checkpoint = None
+        if checkpoint_path:
+            if self.filenames == ['-']:
+                raise ValueError("@checkpoint_path needs @filename or @filenames; STDIN can't be resumed")
+            from retrosheet.checkpoint import Checkpoint
+            self.checkpoint = Checkpoint(checkpoint_path, checkpoint_every)
+        self.checkpoint_hooks = []
+
+        self.result_cache = None
+        if result_cache_dir:
+            if self.filenames == ['-']:
+                raise ValueError("@result_cache_dir needs @filename or @filenames; STDIN can't be indexed")
+            from retrosheet.result_cache import GameResultCache
+            self.result_cache = GameResultCache(result_cache_dir, result_cache_bytes)
+
+        self.profiler = None
+        if profile:
+            from retrosheet.profiling import Profiler
+            self.profiler = Profiler()
 
         self.handlers = OrderedDict()
         self.triggers = OrderedDict()
 
-    def _retrosheet_as_filelike(self):
-        """ Return the entire retrosheet as a single (lazily-loaded) file-like """
-        return FileInput(files=self.filenames)
-            
-    def _get_python_stream(self):
-        """ Yield all lines in the retrosheet as Python objects """
-        reader = csv.reader(self._retrosheet_as_filelike())
-        for line in reader:
+    def _get_python_stream(self, wanted=None):
+        """
+        Yield all lines in the retrosheet as Python objects
+        @param wanted - set of record types (e.g. {'id', 'play'}) to yield.
+                        Lines of other types are skipped before they are
+                        split into fields. If None, yield every line.
+        """
+        if self.game_filter:
+            yield from self._get_filtered_python_stream(wanted)
+            return
+        if self.cache:
+            yield from self._get_cached_python_stream(wanted)
+            return
+        yield from self._pythonify(read_event_files(self.filenames, wanted))
+
+    def _wanted_record_types(self, by_game=False):
+        """
+        Return the set of record types that some handler subscribes to, plus
+        ID records (which start each game), or None if every type is needed
+        because a batch handler that will see whole games doesn't declare
+        the types it looks at (see Handler.record_types)
+        """
+        name_for = {cls: name for name, cls in class_for.items()}
+        wanted = {'id'}
+        for handler in self.handlers.values():
+            if by_game and hasattr(handler, 'handle_game'):
+                record_types = type(handler).game_record_types
+                if record_types is None:
+                    return None
+                wanted.update(record_types)
+            wanted.update(name_for[typ] for typ in handler.subscriptions())
+        return wanted
+
+    def _pythonify(self, lines):
+        """ Turn each line (split into fields) into a Python object """
+        if self.profiler:
+            yield from self._profiled_pythonify(lines)
+            return
+        for line in lines:
+            log.debug(line)
+            pyline = pythonify_line(line)
+            if pyline:
+                yield pyline
+
+    def _profiled_pythonify(self, lines):
+        """ Same as _pythonify, but records how long reading and pythonifying take """
+        lines = iter(lines)
+        add_stage = self.profiler.add_stage
+        perf_counter = time.perf_counter
+        while True:
+            t0 = perf_counter()
+            line = next(lines, None)
+            t1 = perf_counter()
+            add_stage('read and split lines', t1 - t0)
+            if line is None:
+                return
             log.debug(line)
             pyline = pythonify_line(line)
+            add_stage('pythonify', perf_counter() - t1)
             if pyline:
                 yield pyline
 
+    def _profiled_cache_read(self, filename, wanted):
+        """ Same as cache.read, but records how long reading from the cache takes """
+        lines = self.cache.read(filename, wanted)
+        perf_counter = time.perf_counter
+        while True:
+            t0 = perf_counter()
+            pyline = next(lines, None)
+            self.profiler.add_stage('read from cache', perf_counter() - t0)
+            if pyline is None:
+                return
+            yield pyline
+
+    def _counted(self, stream):
+        """ Pass through the Python stream, counting lines and games in the profiler """
+        count_line = self.profiler.count_line
+        for pyline in stream:
+            count_line(type(pyline).__name__, isinstance(pyline, ID))
+            yield pyline
+
+    def _stream(self, wanted=None):
+        """ The Python stream that a run iterates over """
+        if self.profiler:
+            return self._counted(self._get_python_stream(wanted))
+        return self._get_python_stream(wanted)
+
+    def _get_cached_python_stream(self, wanted=None):
+        """
+        Same as _get_python_stream, but reads each Event file from the cache
+        if possible, and caches the ones that aren't
+        """
+        for filename in self.filenames:
+            if filename == '-':
+                # Can't cache STDIN
+                yield from self._pythonify(read_event_files([filename], wanted))
+            elif self.cache.is_fresh(filename):
+                log.info("Reading {} from cache".format(filename))
+                if self.profiler:
+                    yield from self._profiled_cache_read(filename, wanted)
+                else:
+                    yield from self.cache.read(filename, wanted)
+            else:
+                # The cache gets every line, whether or not it's wanted now
+                lines = list(read_event_files([filename]))
+                self.cache.write(filename, lines)
+                if wanted is not None:
+                    lines = (line for line in lines if line[0] in wanted)
+                yield from self._pythonify(lines)
+
+    def _get_filtered_python_stream(self, wanted=None):
+        """
+        Same as _get_python_stream, but only reads the games that pass
+        self.game_filter, seeking to each one with the game index
+        """
+        from retrosheet.index import GameIndex
+
+        games = GameIndex(self.index_path).select(self.filenames, self.game_filter)
+        log.info("{} games pass the filter".format(len(games)))
+
+        for _, game in self._read_games(games, wanted):
+            yield from game
+
+    def _read_game_texts(self, games):
+        """
+        Yield each of @games (retrosheet.index.GameEntry) paired with its
+        text, seeking to each game in its Event file
+        """
+        infile = None
+        try:
+            for game in games:
+                if infile is None or infile.name != game.filename:
+                    if infile:
+                        infile.close()
+                    infile = open(game.filename, 'rb')
+                infile.seek(game.offset)
+                yield game, infile.read(game.length).decode()
+        finally:
+            if infile:
+                infile.close()
+
+    def _read_games(self, games, wanted=None):
+        """
+        Yield each of @games (retrosheet.index.GameEntry) paired with a list of
+        its lines as Python objects
+        @param wanted - see _get_python_stream
+        """
+        for game, text in self._read_game_texts(games):
+            yield game, list(self._pythonify(split_lines(text, wanted)))
+
+    def _indexed_games(self, games, wanted=None):
+        """
+        Yield (game, key, results, lines) for each of @games
+        (retrosheet.index.GameEntry), where key is the game's key in the
+        result cache (None if no results are cached), and either results is
+        the dict of cached trigger results for the game from the result cache
+        and lines is None, or results is None and lines is the list of the
+        game's lines as Python objects
+        @param wanted - see _get_python_stream
+        """
+        cached = self._cached_triggers()
+        if self.result_cache and cached:
+            versions = self._result_versions()
+        for game, text in self._read_game_texts(games):
+            key = None
+            if self.result_cache and cached:
+                key = self.result_cache.key(text, versions)
+                results = self.result_cache.get(key)
+                if results is not None and set(results) == set(cached):
+                    yield game, key, results, None
+                    continue
+            yield game, key, None, list(self._pythonify(split_lines(text, wanted)))
+
+    def _iter_games(self, wanted=None):
+        """
+        Yield the Python stream grouped into games. Each game is a list of
+        lines beginning with its ID record, paired with the ID record of the
+        following game (None for the last game).
+        @param wanted - see _get_python_stream
+        """
+        game = None
+        for pyline in self._stream(wanted):
+            if isinstance(pyline, ID) and game:
+                yield game, pyline
+                game = []
+            elif game is None:
+                game = []
+            game.append(pyline)
+        if game:
+            yield game, None
+
+    def export(self, path=None, record_types=None, chunk_rows=None, format=None):
+        """
+        Instead of running the handlers, export the records as columnar
+        tables, one per record type, plus one of the games (see
+        retrosheet.columnar). The tables are built and written out in
+        chunks of @chunk_rows rows.
+        @param path - directory to write the tables to, to be read back with
+                      retrosheet.columnar.load. If None, the tables are
+                      returned, in memory.
+        @param record_types - record types to export. Defaults to all of them.
+        @param format - 'numpy' (the default) or 'arrow', which needs pyarrow.
+        """
+        from retrosheet.columnar import ColumnarWriter
+
+        writer = ColumnarWriter(path, record_types, chunk_rows, format)
+        wanted = {'id'} | set(writer.record_types)
+        with closing(self._stream(wanted)) as stream:
+            for pyline in stream:
+                writer.add(pyline)
+        return writer.close()
+
     def register_handler(self, name, handler):
         """
         Register a handler for this analysis
         @param name - the name of this handler, for later reference when we go
                       to fetch its' data
         @param handler - the handler object
+
+        If the handler uses the game state (see Handler.uses_game_state), a
+        GameState is registered too, as 'game_state', the first time it's
+        needed, and shared by every handler that uses it. It is kept after
+        every other handler.
         """
+        if handler.uses_game_state:
+            from retrosheet.handlers.game_state import GameState
+            if 'game_state' not in self.handlers:
+                self.handlers['game_state'] = GameState()
+            self.handlers['game_state'].link(handler)
         self.handlers[name] = handler
+        if 'game_state' in self.handlers:
+            self.handlers.move_to_end('game_state')
+
+    def _link_game_state(self):
+        """ Link every handler that uses the game state to it (see register_handler) """
+        for handler in self.handlers.values():
+            if handler.uses_game_state:
+                self.handlers['game_state'].link(handler)
 
     def register_trigger(self, name, trigger):
         self.triggers[name] = trigger
 
-    def fire_trigger(self, trigger_name):
+    def register_cached_trigger(self, name, compute, use, version=1):
+        """
+        Register a trigger whose work is split in two (see
+        retrosheet.result_cache.CachedTrigger): @compute(handlers) returns the
+        game's result, which is passed to @use. With a result cache, the
+        results are stored for each game, and games whose results are all
+        stored are skipped: only @use is called for them, and neither the
+        handlers nor other triggers see them. Cached triggers must fire
+        exactly once per game, and need a by_game run to be cached.
+        @param version - change this when @compute changes, so results stored
+                         by the old version aren't used
+        """
+        from retrosheet.result_cache import CachedTrigger
+        self.triggers[name] = CachedTrigger(compute, use, version)
+
+    def _cached_triggers(self):
+        """ Return a dict of the registered CachedTriggers """
+        from retrosheet.result_cache import CachedTrigger
+        return OrderedDict((name, trigger) for name, trigger in self.triggers.items()
+                           if isinstance(trigger, CachedTrigger))
+
+    def _result_versions(self):
+        """
+        Identify the code that computes cached results: the class and version
+        of each handler (see Handler.version), and the version of each cached
+        trigger. Results are only reused if all of these are unchanged.
+        """
+        handlers = tuple((name, type(handler).__module__, type(handler).__qualname__,
+                          getattr(handler, 'version', None))
+                         for name, handler in self.handlers.items())
+        triggers = tuple((name, trigger.version) for name, trigger in self._cached_triggers().items())
+        return handlers, triggers
+
+    def register_checkpoint_hook(self, save, restore):
+        """
+        Register functions to checkpoint state kept outside the handlers, e.g.
+        arrays that a trigger builds up (see retrosheet.checkpoint)
+        @param save - called with no arguments when a checkpoint is saved. Must
+                      return something picklable.
+        @param restore - called with whatever @save returned when resuming from
+                         a checkpoint
+        """
+        self.checkpoint_hooks.append((save, restore))
+
+    def fire_trigger(self, trigger_name, handlers=None):
         # A trigger is a function that receives the dictionary of
         # handlers and does something with their data
-        self.triggers[trigger_name](self.handlers)
+        if handlers is None:
+            handlers = self.handlers
+        if self.profiler:
+            self.profiler.time_trigger(trigger_name, self.triggers[trigger_name], handlers)
+        else:
+            self.triggers[trigger_name](handlers)
 
     def preprocess(self):
         pass
@@ -95,26 +640,241 @@ class Analysis(object):
     def postprocess(self):
         pass
 
-    
-    def run(self):
+    def run(self, nprocs=1, chunksize=16, by_game=False, prefetch=0):
+        """
+        Feed every line of the retrosheet to the handlers, firing triggers as
+        they are returned. Each line only goes to the handlers that handle its
+        record type (see Handler.subscriptions), which are looked up once
+        when the run starts. Lines of a type no handler handles are skipped
+        as soon as they are read.
+        @param nprocs - number of worker processes. If greater than 1, games
+                        are handed out to a process pool (see _run_parallel)
+        @param chunksize - number of games sent to a worker at a time when
+                           running in parallel
+        @param by_game - if True, group the records into games (everything from
+                         one ID record up to the next, and the last game up to
+                         the end of the retrosheet). Batch handlers, which have a
+                         handle_game method, get each game as a list of records
+                         instead of one record at a time. Once the other handlers
+                         have seen a game's records, each handler's end-of-game
+                         function (see Handler.end_of_game) is called, in the
+                         order the handlers were registered, for every game
+                         including the last.
+        @param prefetch - if greater than 0, read and parse the retrosheet in
+                          a separate thread, up to this many batches of
+                          PREFETCH_LINES lines (PREFETCH_GAMES games if
+                          by_game) ahead of the handlers (see _prefetched).
+                          Ignored when running in parallel, where the pool
+                          already reads ahead of the workers.
+        Runs with a checkpoint or a result cache (see __init__) can't run in
+        parallel, and runs with a result cache must be by_game.
+        """
+        if (self.checkpoint or self.result_cache) and nprocs > 1:
+            raise ValueError("Runs with a checkpoint or a result cache can't be run in parallel")
+        if self.result_cache and not by_game:
+            raise ValueError("Runs with a result cache must deliver records by game (by_game=True)")
+
         self.preprocess()
-        
+        if self.profiler:
+            self.profiler.start()
+
         try:
-            for pyline in self._get_python_stream():
-                for handler in self.handlers.values():
-                    try:
-                        # run the handler
-                        trigger_name = handler.handle(pyline)
-                    except NonfatalHandlerException as e:
-                        log.error(e)
-                        handler.mark_error()
-
-                    # if the handler returned a trigger, fire it
-                    if trigger_name:
-                        self.fire_trigger(trigger_name)
-                        
+            if self.checkpoint or self.result_cache:
+                self._run_indexed(by_game, prefetch)
+            elif nprocs > 1:
+                self._run_parallel(nprocs, chunksize, by_game)
+            elif by_game:
+                subscribers = _subscribers(self.handlers, self.profiler, by_game=True)
+                end_of_game = _end_of_game(self.handlers, self.profiler)
+                games = self._iter_games(self._wanted_record_types(by_game=True))
+                if prefetch > 0:
+                    games = _prefetched(games, prefetch, PREFETCH_GAMES)
+                with closing(games):
+                    for game, _ in games:
+                        _handle_game(subscribers, end_of_game, game, self.fire_trigger)
+            else:
+                subscribers = _subscribers(self.handlers, self.profiler)
+                stream = self._stream(self._wanted_record_types())
+                if prefetch > 0:
+                    stream = _prefetched(stream, prefetch, PREFETCH_LINES)
+                with closing(stream):
+                    for pyline in stream:
+                        _handle_line(subscribers, pyline, self.fire_trigger)
+
         except FatalHandlerException as e:
             log.error(e)
 
+        if self.profiler:
+            self.profiler.stop()
+            sys.stderr.write(self.profiler.summary() + '\n')
+
         self.postprocess()
-                
+
+    def _run_indexed(self, by_game=False, prefetch=0):
+        """
+        Run the analysis one game at a time, reading each game with the game
+        index. This is how runs with a checkpoint or a result cache go.
+
+        With a checkpoint, save one every self.checkpoint.every games and once
+        every game has been handled. If a checkpoint was already saved,
+        restore the handlers and the state of the checkpoint hooks from it,
+        and only handle the games after it. Checkpoints are taken between two
+        games, before the next game's ID record is handled, so the handlers
+        and triggers see the same records in the same order as an
+        uninterrupted run. A run stopped by a FatalHandlerException does not
+        save a checkpoint at the end.
+
+        With a result cache, games whose cached trigger results are all in the
+        cache only have the results passed to the triggers' use functions.
+        Other games are handled as usual, and the results of their cached
+        triggers are stored.
+        """
+        from retrosheet.index import GameIndex
+        from retrosheet.checkpoint import file_stamp
+
+        game_filter = self.game_filter or (lambda game: True)
+        games = GameIndex(self.index_path).select(self.filenames, game_filter)
+        files = OrderedDict()
+        ngames = 0
+
+        state = self.checkpoint.load() if self.checkpoint else None
+        if state:
+            games = self.checkpoint.remaining_games(state, games)
+            self._restore_checkpoint(state)
+            files.update(state['files'])
+            ngames = state['ngames']
+            log.info("Resuming from checkpoint after {} games, with {} games to go".format(
+                ngames, len(games)))
+
+        if by_game:
+            subscribers = _subscribers(self.handlers, self.profiler, by_game=True)
+            end_of_game = _end_of_game(self.handlers, self.profiler)
+        else:
+            subscribers = _subscribers(self.handlers, self.profiler)
+        cached = self._cached_triggers()
+        stream = self._indexed_games(games, self._wanted_record_types(by_game))
+        if prefetch > 0:
+            stream = _prefetched(stream, prefetch, PREFETCH_GAMES)
+
+        since_checkpoint = 0
+        with closing(stream):
+            for entry, key, results, game in stream:
+                if self.checkpoint:
+                    path = os.path.abspath(entry.filename)
+                    if since_checkpoint >= self.checkpoint.every:
+                        self._save_checkpoint(files, (path, entry.offset), ngames)
+                        since_checkpoint = 0
+                    if path not in files:
+                        files[path] = file_stamp(path)
+
+                if results is not None:
+                    for name, result in results.items():
+                        cached[name].use(result)
+                elif by_game:
+                    for trigger in cached.values():
+                        trigger.result = _not_fired
+                    _handle_game(subscribers, end_of_game, game, self.fire_trigger)
+                    if key is not None:
+                        results = {name: trigger.result for name, trigger in cached.items()}
+                        if _not_fired not in results.values():
+                            self.result_cache.put(key, results)
+                else:
+                    for pyline in game:
+                        _handle_line(subscribers, pyline, self.fire_trigger)
+                ngames += 1
+                since_checkpoint += 1
+
+        if self.checkpoint:
+            for filename in self.filenames:
+                path = os.path.abspath(filename)
+                files[path] = file_stamp(path)
+            self._save_checkpoint(files, None, ngames)
+
+    def _save_checkpoint(self, files, position, ngames):
+        user_state = [save() for save, _ in self.checkpoint_hooks]
+        self.checkpoint.save(files, position, ngames, self.handlers, user_state,
+                             ids.players.unknown())
+
+    def _restore_checkpoint(self, state):
+        """
+        Restore the handlers in place from a checkpoint, so that anything
+        holding on to them sees the restored state, and call the restore
+        function of each checkpoint hook. Player IDs that were given codes as
+        they turned up get the same codes again first, since the handlers
+        hold those codes.
+        """
+        ids.players.restore(state['unknown_players'])
+        handlers = pickle.loads(state['handlers'])
+        saved = [(name, type(handler)) for name, handler in handlers.items()]
+        registered = [(name, type(handler)) for name, handler in self.handlers.items()]
+        if saved != registered:
+            raise ValueError("The checkpoint has handlers {}, but this analysis has {}".format(
+                saved, registered))
+        # Links to other handlers (see Handler.links) are not state: they
+        # are left out, and made again to this analysis' own handlers
+        for name, handler in self.handlers.items():
+            handler.__dict__.update((attr, value) for attr, value in handlers[name].__dict__.items()
+                                    if attr not in handler.links)
+        self._link_game_state()
+
+        user_state = pickle.loads(state['user_state'])
+        if len(user_state) != len(self.checkpoint_hooks):
+            raise ValueError("The checkpoint has state for {} hooks, but {} are registered".format(
+                len(user_state), len(self.checkpoint_hooks)))
+        for (_, restore), hook_state in zip(self.checkpoint_hooks, user_state):
+            restore(hook_state)
+
+    def _run_parallel(self, nprocs, chunksize, by_game=False):
+        """
+        Run the analysis across a pool of @nprocs processes. Each game is
+        handled by a fresh copy of the handlers as they were registered, so
+        handlers must be picklable.
+
+        Triggers are not run in the workers. Instead, the workers send back a
+        copy of the handlers as they were when each trigger fired, and the
+        trigger is run on that copy here, once per game and in the same order
+        as a serial run. This means a trigger cannot change the handlers' state
+        for the rest of the game it fires in (resetting handlers at the end of
+        a game is fine, since every game starts from a fresh copy anyway).
+
+        After each game, its handlers are folded into self.handlers with
+        Handler.merge(), so that self.handlers hold the combined results
+        at the end of the run.
+
+        When profiling, handler times are summed over all the workers, so
+        they can add up to more than the wall time of the run.
+        """
+        # Limit how many games are read ahead of the workers. Pool.imap would
+        # otherwise read the entire retrosheet into memory up front.
+        max_pending = nprocs * chunksize * 4
+        slots = threading.Semaphore(max_pending)
+        stopping = threading.Event()
+
+        def throttled(tasks):
+            for task in tasks:
+                slots.acquire()
+                if stopping.is_set():
+                    return
+                yield task
+
+        handlers_pickle = pickle.dumps(self.handlers)
+        profile = self.profiler is not None
+        initargs = (handlers_pickle, profile, by_game)
+        with Pool(nprocs, initializer=_init_worker, initargs=initargs) as pool:
+            try:
+                games = self._iter_games(self._wanted_record_types(by_game))
+                results = pool.imap(_run_game, throttled(games), chunksize)
+                for fired, game_handlers, exc, handler_stats in results:
+                    slots.release()
+                    if handler_stats:
+                        self.profiler.merge_handler_stats(handler_stats)
+                    for trigger_name, snapshot in fired:
+                        self.fire_trigger(trigger_name, pickle.loads(snapshot))
+                    for name, handler in self.handlers.items():
+                        handler.merge(game_handlers[name])
+                    if exc is not None:
+                        raise exc
+            finally:
+                # Unblock the reader so the pool can shut down
+                stopping.set()
+                slots.release(max_pending)
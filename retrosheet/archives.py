@@ -0,0 +1,139 @@
+"""
+Reading Event files straight out of the zip archives Retrosheet ships them
+in, and out of gzipped files, without extracting them to disk first.
+
+Anywhere a list of Event files is expected, each name can be:
+  - path/to/2019NYA.EVN: a plain Event file
+  - path/to/2019NYA.EVN.gz: a gzipped Event file
+  - path/to/2019eve.zip: every Event file in the archive (see EVENT_FILES)
+  - path/to/2019eve.zip/*.EVN: the members of the archive matching a glob
+and the part outside of any archive can be a glob too (e.g. data/*.zip).
+expand() turns such a list into one name per Event file, where the Event
+files in archives are named path/to/2019eve.zip/2019NYA.EVN.
+
+Archived Event files (members of zip archives and gzipped files) can't be
+seeked in, so they are read whole, decompressed ahead of the parser by a
+pool of threads (see retrosheet.reader.read_event_files). zlib lets go of
+the GIL while it decompresses, so the threads run alongside the parser.
+"""
+import os
+import glob
+import gzip
+import zipfile
+import fnmatch
+import threading
+
+# Members of an archive that are read when only the archive is named:
+# regular season (.EVA, .EVN) and postseason (.EVE) Event files
+EVENT_FILES = '*.EV[ANE]'
+
+def split_archive(name):
+    """
+    Split @name into the zip archive it names and the member (or member
+    glob) inside it. Returns (archive, member), where member is None if
+    only the archive is named, or (None, None) if @name isn't in a zip
+    archive. The archive part may be a glob.
+    """
+    parts = name.replace(os.sep, '/').split('/')
+    for i, part in enumerate(parts):
+        if part.lower().endswith('.zip'):
+            archive = '/'.join(parts[:i + 1])
+            if glob.has_magic(archive) or os.path.isfile(archive):
+                return archive, '/'.join(parts[i + 1:]) or None
+    return None, None
+
+def is_archived(name):
+    """ True if @name is a member of a zip archive or a gzipped file, rather than a plain file """
+    return name.lower().endswith('.gz') or split_archive(name)[0] is not None
+
+def expand(names):
+    """
+    Return the list of Event files named by @names, expanding archives and
+    globs (see above), in order. Archive members are listed in the order of
+    their names. '-' (STDIN) is passed through.
+    Raises ValueError if a glob matches nothing.
+    """
+    members_of = {}
+    expanded = []
+    for name in names:
+        if name == '-':
+            expanded.append(name)
+            continue
+
+        archive_pattern, member_pattern = split_archive(name)
+        pattern = archive_pattern or name
+        if glob.has_magic(pattern):
+            paths = sorted(glob.glob(pattern))
+            if not paths:
+                raise ValueError("No files match {}".format(pattern))
+        else:
+            paths = [pattern]
+
+        if archive_pattern is None:
+            expanded.extend(paths)
+            continue
+
+        matched = []
+        for archive in paths:
+            if archive not in members_of:
+                with zipfile.ZipFile(archive) as zf:
+                    members_of[archive] = sorted(info.filename for info in zf.infolist()
+                                                 if not info.is_dir())
+            matched.extend('{}/{}'.format(archive, member) for member in members_of[archive]
+                           if fnmatch.fnmatchcase(member, member_pattern or EVENT_FILES))
+        if not matched:
+            raise ValueError("No Event files in archives match {}".format(name))
+        expanded.extend(matched)
+    return expanded
+
+def size(name):
+    """
+    Total size in bytes of the Event files named by @name (see expand),
+    uncompressed if they are archived
+    """
+    total = 0
+    for filename in expand([name]):
+        archive, member = split_archive(filename)
+        if filename.lower().endswith('.gz'):
+            # The last 4 bytes of a gzip file hold its uncompressed size
+            with open(filename, 'rb') as infile:
+                infile.seek(-4, os.SEEK_END)
+                total += int.from_bytes(infile.read(4), 'little')
+        elif archive is None:
+            total += os.path.getsize(filename)
+        else:
+            with zipfile.ZipFile(archive) as zf:
+                total += zf.getinfo(member).file_size
+    return total
+
+class ArchiveReader(object):
+    """
+    Reads archived Event files whole. Each zip archive is opened once and
+    shared by every thread reading from it; zipfile only holds a lock
+    while it reads the compressed bytes, not while it decompresses them.
+    """
+    def __init__(self):
+        self._zipfiles = {}
+        self._lock = threading.Lock()
+
+    def _zipfile(self, archive):
+        with self._lock:
+            if archive not in self._zipfiles:
+                self._zipfiles[archive] = zipfile.ZipFile(archive)
+            return self._zipfiles[archive]
+
+    def read(self, name):
+        """ Return the text of the archived Event file @name (from expand()) """
+        archive, member = split_archive(name)
+        if archive is not None:
+            data = self._zipfile(archive).read(member)
+        else:
+            with gzip.open(name, 'rb') as infile:
+                data = infile.read()
+        return data.decode('utf-8')
+
+    def close(self):
+        with self._lock:
+            for zf in self._zipfiles.values():
+                zf.close()
+            self._zipfiles = {}
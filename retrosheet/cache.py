@@ -0,0 +1,163 @@
+"""
+Binary cache of parsed event files, so that repeated analyses of the same
+files don't pay to read and split the raw text every time.
+
+Each event file gets its own directory in the cache, holding:
+  - meta.json: the event file's path, mtime and size when the cache was
+    written. The cache is only used while these still match.
+  - strings.npy, string_offsets.npy: every distinct field value in the file,
+    utf-8 encoded and concatenated, with the offset where each one starts.
+    Fields are stored as indexes into this table (index 0 is reserved for
+    padding).
+  - kinds.npy: the record type (index into record_types) of each line
+  - <record type>.npy: 2D array of string indexes, one row per line of that
+    type, padded to the longest line of that type
+
+The arrays are memory-mapped when read, and decoded a chunk at a time.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging as log
+
+import numpy as np
+
+from retrosheet.event import class_for
+
+CACHE_VERSION = 1
+
+# Record types in the order they are numbered in kinds.npy
+record_types = list(class_for)
+kind_for = {rtype: k for k, rtype in enumerate(record_types)}
+
+# Number of lines decoded at a time when reading the cache
+CHUNK_SIZE = 1 << 16
+
+class EventFileCache(object):
+    def __init__(self, cache_dir):
+        """
+        @param cache_dir - directory to store cached event files in. Created
+                           if it doesn't exist.
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_dir(self, filename):
+        key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def _meta_for(filename):
+        st = os.stat(filename)
+        return {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(filename),
+            'mtime_ns': st.st_mtime_ns,
+            'size': st.st_size,
+        }
+
+    def is_fresh(self, filename):
+        """ True if there is a cache of @filename that is up to date """
+        try:
+            with open(os.path.join(self._entry_dir(filename), 'meta.json'), 'r') as infile:
+                return json.load(infile) == self._meta_for(filename)
+        except (OSError, ValueError):
+            return False
+
+    def write(self, filename, rows):
+        """
+        Cache the contents of @filename
+        @param rows - list of the lines in the file, each split into fields
+                      (as from csv.reader). Lines whose record type is not
+                      recognized are skipped.
+        """
+        strings = {None: 0}
+        kinds = []
+        codes = {}
+        for row in rows:
+            if not row or row[0] not in kind_for:
+                continue
+            rtype = row[0]
+            kinds.append(kind_for[rtype])
+            codes.setdefault(rtype, []).append(
+                [strings.setdefault(field, len(strings)) for field in row[1:]]
+            )
+
+        entry_dir = self._entry_dir(filename)
+        tmp_dir = entry_dir + '.tmp{}'.format(os.getpid())
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        encoded = [s.encode('utf-8') if s is not None else b'' for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(s) for s in encoded], out=offsets[1:])
+        np.save(os.path.join(tmp_dir, 'strings.npy'),
+                np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(os.path.join(tmp_dir, 'string_offsets.npy'), offsets)
+        np.save(os.path.join(tmp_dir, 'kinds.npy'), np.array(kinds, dtype=np.uint8))
+
+        for rtype, rtype_codes in codes.items():
+            width = max(len(c) for c in rtype_codes)
+            table = np.zeros((len(rtype_codes), width), dtype=np.int32)
+            for i, c in enumerate(rtype_codes):
+                table[i, :len(c)] = c
+            np.save(os.path.join(tmp_dir, '{}.npy'.format(rtype)), table)
+
+        # Written last, so an entry is never considered fresh until complete
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as outfile:
+            json.dump(self._meta_for(filename), outfile)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.rename(tmp_dir, entry_dir)
+        log.info("Cached {} ({} lines)".format(filename, len(kinds)))
+
+    def read(self, filename, wanted=None):
+        """
+        Yield the lines of @filename from the cache, as Python objects
+        (see retrosheet.event). Only call this if is_fresh(@filename).
+        @param wanted - set of record types (e.g. {'id', 'play'}) to yield.
+                        Lines of other types are skipped without being
+                        decoded. If None, yield every line.
+        """
+        entry_dir = self._entry_dir(filename)
+        def load(name):
+            return np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r')
+
+        blob = load('strings').tobytes()
+        offsets = load('string_offsets').tolist()
+        strings = np.array(
+            [None] + [blob[offsets[i]:offsets[i+1]].decode('utf-8')
+                      for i in range(1, len(offsets) - 1)],
+            dtype=object,
+        )
+
+        kinds = load('kinds')
+        tables = {}
+        for k, rtype in enumerate(record_types):
+            if os.path.exists(os.path.join(entry_dir, rtype + '.npy')):
+                tables[k] = load(rtype)
+        classes = [class_for[rtype] for rtype in record_types]
+        skip = [wanted is not None and rtype not in wanted for rtype in record_types]
+        pos = [0] * len(record_types)
+
+        for start in range(0, len(kinds), CHUNK_SIZE):
+            chunk = kinds[start:start+CHUNK_SIZE]
+            counts = np.bincount(chunk, minlength=len(record_types)).tolist()
+            rows = [None] * len(record_types)
+            for k, count in enumerate(counts):
+                if count and skip[k]:
+                    pos[k] += count
+                elif count:
+                    rows[k] = iter(strings[tables[k][pos[k]:pos[k]+count]].tolist())
+                    pos[k] += count
+
+            for k in chunk.tolist():
+                if skip[k]:
+                    continue
+                fields = next(rows[k])
+                if fields and fields[-1] is None:
+                    # Shorter than the longest line of its type: drop the padding
+                    while fields and fields[-1] is None:
+                        fields.pop()
+                yield classes[k](*fields)
@@ -0,0 +1,102 @@
+"""
+Checkpoints of an Analysis run, saved at game boundaries, so that a long
+run that crashes or is interrupted can pick up where it left off, and a
+finished run can be extended with new Event files without re-reading the
+ones it has already been through.
+
+A checkpoint holds:
+  - every Event file the run has started on, in order, with its mtime and
+    size at the time
+  - the position of the next game to handle: its Event file and the byte
+    offset of its ID record (see retrosheet.index), or None once every
+    Event file has been read
+  - the number of games handled so far
+  - the handlers, pickled as they were between two games
+  - the player IDs that were given codes as they turned up (see
+    retrosheet.ids), so that they keep those codes after resuming
+  - whatever the functions registered with Analysis.register_checkpoint_hook
+    returned, for state kept outside the handlers (e.g. arrays built up by
+    a trigger)
+"""
+import os
+import pickle
+import logging as log
+
+CHECKPOINT_VERSION = 2
+
+def file_stamp(filename):
+    """ Return the mtime and size of @filename, to tell if it has changed """
+    st = os.stat(filename)
+    return [st.st_mtime_ns, st.st_size]
+
+class Checkpoint(object):
+    def __init__(self, path, every=1000):
+        """
+        @param path - file to save the checkpoint in
+        @param every - number of games between checkpoints
+        """
+        self.path = path
+        self.every = every
+
+    def load(self):
+        """ Return the saved checkpoint as a dict, or None if there isn't one """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as infile:
+            state = pickle.load(infile)
+        if state.get('version') != CHECKPOINT_VERSION:
+            log.warning("Ignoring checkpoint {} from another version".format(self.path))
+            return None
+        return state
+
+    def save(self, files, position, ngames, handlers, user_state, unknown_players=()):
+        """
+        Save a checkpoint, replacing the last one. The file is written
+        under another name first, so an interruption never leaves a
+        half-written checkpoint behind.
+        @param files - dict mapping the absolute path of every Event file
+                       started so far to its file_stamp()
+        @param position - (absolute path, byte offset) of the next game to
+                          handle, or None if the run is finished
+        @param ngames - number of games handled so far
+        @param handlers - dict of handlers
+        @param user_state - list of states returned by the checkpoint hooks
+        @param unknown_players - ids.players.unknown()
+        """
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'files': list(files.items()),
+            'position': position,
+            'ngames': ngames,
+            'handlers': pickle.dumps(handlers),
+            'user_state': pickle.dumps(user_state),
+            'unknown_players': list(unknown_players),
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as outfile:
+            pickle.dump(state, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        log.info("Saved checkpoint after {} games".format(ngames))
+
+    @staticmethod
+    def remaining_games(state, games):
+        """
+        Return the games that the run saved in @state still has to handle
+        @param state - dict returned by load()
+        @param games - list of retrosheet.index.GameEntry for every game in
+                       the run, in order
+        Raises ValueError if an Event file the run has started on has
+        changed since, since the games already handled can't be undone.
+        """
+        done = dict(state['files'])
+        for path, stamp in done.items():
+            if os.path.exists(path) and file_stamp(path) != stamp:
+                raise ValueError("{} has changed since the checkpoint was saved".format(path))
+
+        position = state['position']
+        remaining = []
+        for game in games:
+            path = os.path.abspath(game.filename)
+            if path not in done or (position and path == position[0] and game.offset >= position[1]):
+                remaining.append(game)
+        return remaining
@@ -0,0 +1,344 @@
+"""
+Columnar export of the record stream, for analyses that are easier to do
+on whole arrays than with a Handler (see Analysis.export).
+
+Each record type becomes a table with one row per record, plus a 'games'
+table with one row per game. Every table has:
+  - game_idx: the game the record is in, counting ID records from 0
+  - seq: the position of the record within its game, among the records
+    exported, so that e.g. substitutions can be placed between plays
+and then the record's own columns (see COLUMNS). Small integer fields are
+stored as int8/int16. Player IDs are stored as their codes (see
+retrosheet.ids), which are the same in every table. Other text fields are
+stored as int32 codes into a list of categories, named after the kind of
+value (e.g. 'event'), which is saved once for the whole export. Tables are
+joined by game on game_idx: e.g. Tables.info('hometeam')[plays['game_idx']]
+is the home team of each play.
+
+Rows are gathered in typed arrays and written out every @chunk_rows rows
+per table, so memory stays bounded apart from the categories. Tables are
+written as NumPy structured arrays (<table>.<chunk>.npy), or, with
+format='arrow' and pyarrow installed, as Arrow IPC files (<table>.arrow, one
+record batch per chunk).
+meta.json lists the tables, their columns and the categories.
+"""
+import os
+import json
+from array import array
+from operator import attrgetter
+
+import numpy as np
+
+from retrosheet import ids
+from retrosheet.event import ID, class_for
+
+EXPORT_VERSION = 1
+
+# Default number of rows of a table kept in memory before writing them out
+CHUNK_ROWS = 1 << 16
+
+# Typecodes of the arrays rows are gathered in, and the dtypes they become
+_typecodes = {'int8': 'b', 'int16': 'h', 'int32': 'i'}
+
+def _data_field(i):
+    """ Field @i of a data record, or '' if it doesn't have that many """
+    return lambda data: data.data[i] if len(data.data) > i else ''
+
+# For each record type, its columns as (name, type, getter), where type is
+# one of the integer dtypes, 'player' for a player ID (stored as its code,
+# with the player IDs as its categories), or the name of the categories the
+# field is coded into
+_player_columns = [
+    ('player', 'player', attrgetter('playerID')),
+    ('playername', 'playername', attrgetter('playername')),
+    ('homeaway', 'int8', attrgetter('homeaway')),
+    ('battingorder', 'int8', attrgetter('battingorder')),
+    ('position', 'int8', attrgetter('position')),
+]
+COLUMNS = {
+    'version': [('version', 'version', attrgetter('version'))],
+    'start': _player_columns,
+    'sub': _player_columns,
+    'play': [
+        ('inning', 'int16', attrgetter('inning')),
+        ('homeaway', 'int8', attrgetter('homeaway')),
+        ('player', 'player', attrgetter('playerID')),
+        ('count', 'count', attrgetter('count')),
+        ('pitches', 'pitches', attrgetter('pitches')),
+        ('event', 'event', attrgetter('event')),
+    ],
+    'info': [
+        ('fieldname', 'fieldname', attrgetter('fieldname')),
+        ('data', 'info', attrgetter('data')),
+    ],
+    'data': [
+        ('kind', 'data_kind', _data_field(0)),
+        ('player', 'player', _data_field(1)),
+        ('value', 'data_value', _data_field(2)),
+    ],
+    'com': [('comment', 'comment', attrgetter('comment'))],
+    'padj': [('player', 'player', attrgetter('playerID')), ('hand', 'hand', attrgetter('hand'))],
+    'badj': [('player', 'player', attrgetter('playerID')), ('hand', 'hand', attrgetter('hand'))],
+    'radj': [('player', 'player', attrgetter('playerID')), ('base', 'base', attrgetter('base'))],
+}
+
+def has_arrow():
+    try:
+        import pyarrow
+        return True
+    except ImportError:
+        return False
+
+class Categories(object):
+    """ Numbers each distinct value of a kind of text field, in the order they are first seen """
+    def __init__(self):
+        self.values = []
+        self.code_for = {}
+
+    def code(self, value):
+        code = self.code_for.get(value)
+        if code is None:
+            code = self.code_for[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class _Table(object):
+    """ The rows of one table not written out yet """
+    def __init__(self, name, columns, categories):
+        self.name = name
+        self.columns = [('game_idx', 'int32', None), ('seq', 'int32', None)] + list(columns)
+        self.dtype = np.dtype([(col, 'int32' if kind not in _typecodes else kind)
+                               for col, kind, _ in self.columns])
+
+        # (getter, function that encodes its value) for each column of the record
+        self.encoders = []
+        for col, kind, getter in columns:
+            if kind == 'player':
+                encode = ids.players.code
+            elif kind in _typecodes:
+                encode = None
+            else:
+                encode = categories.setdefault(kind, Categories()).code
+            self.encoders.append((getter, encode))
+
+        self.nrows = 0
+        self.nchunks = 0
+        self._clear()
+
+    def _clear(self):
+        self.buffers = [array(_typecodes.get(self.dtype[i].name, 'i'))
+                        for i in range(len(self.columns))]
+
+    def add(self, game_idx, seq, record):
+        buffers = self.buffers
+        buffers[0].append(game_idx)
+        buffers[1].append(seq)
+        for buf, (getter, encode) in zip(buffers[2:], self.encoders):
+            value = getter(record)
+            buf.append(encode(value) if encode else value)
+
+    def __len__(self):
+        return len(self.buffers[0])
+
+    def take(self):
+        """ Return the rows gathered so far as a structured array, and start over """
+        rows = np.empty(len(self), dtype=self.dtype)
+        for (col, _, _), buf in zip(self.columns, self.buffers):
+            rows[col] = np.frombuffer(buf, dtype=self.dtype[col])
+        self.nrows += len(rows)
+        self.nchunks += 1
+        self._clear()
+        return rows
+
+class ColumnarWriter(object):
+    def __init__(self, path=None, record_types=None, chunk_rows=None, format=None):
+        """
+        @param path - directory to write the tables to. Created if it doesn't
+                      exist. If None, the tables are kept in memory and
+                      returned by close().
+        @param record_types - record types to make tables of. Defaults to
+                              every type in COLUMNS.
+        @param chunk_rows - number of rows of a table to gather before
+                            writing them out. Defaults to CHUNK_ROWS.
+        @param format - 'numpy' (the default) or 'arrow', which needs pyarrow.
+        """
+        self.path = path
+        self.chunk_rows = chunk_rows or CHUNK_ROWS
+        self.format = format or 'numpy'
+        if self.format not in ('numpy', 'arrow'):
+            raise ValueError("Unknown format {}".format(self.format))
+        if self.format == 'arrow' and not has_arrow():
+            raise ImportError("format='arrow' needs pyarrow")
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+        self.categories = {}
+        self.games = _Table('games', [('gameID', 'gameID', attrgetter('gameID'))],
+                            self.categories)
+        record_types = list(COLUMNS) if record_types is None else record_types
+        self.tables = {rtype: _Table(rtype, COLUMNS[rtype], self.categories)
+                       for rtype in record_types}
+        self._table_for = {class_for[rtype]: table for rtype, table in self.tables.items()}
+        self._arrow_writers = {}
+        self._chunks = {name: [] for name in ['games'] + list(self.tables)}
+
+        self.game_idx = -1
+        self.seq = 0
+
+    @property
+    def record_types(self):
+        return list(self.tables)
+
+    def add(self, record):
+        """ Add @record (see retrosheet.event) to its table """
+        if type(record) is ID:
+            self.game_idx += 1
+            self.seq = 0
+            self._add(self.games, record)
+        elif self.game_idx < 0:
+            raise ValueError("{} record before the first ID record".format(type(record).__name__))
+        table = self._table_for.get(type(record))
+        if table is not None:
+            self._add(table, record)
+        self.seq += 1
+
+    def _add(self, table, record):
+        table.add(self.game_idx, self.seq, record)
+        if len(table) >= self.chunk_rows:
+            self._write(table)
+
+    def _write(self, table):
+        rows = table.take()
+        if self.path is None:
+            self._chunks[table.name].append(rows)
+        elif self.format == 'numpy':
+            np.save(os.path.join(self.path, '{}.{:05d}.npy'.format(table.name, table.nchunks - 1)),
+                    rows)
+        else:
+            self._write_arrow(table.name, rows)
+
+    def _write_arrow(self, name, rows):
+        import pyarrow as pa
+        # The fields of a structured array are strided views of it; copy each
+        # into a buffer of its own for pyarrow
+        arrays = [pa.array(np.ascontiguousarray(rows[col])) for col in rows.dtype.names]
+        if name not in self._arrow_writers:
+            schema = pa.schema([(col, pa.from_numpy_dtype(rows.dtype[col]))
+                                for col in rows.dtype.names])
+            self._arrow_writers[name] = pa.ipc.new_file(
+                os.path.join(self.path, name + '.arrow'), schema)
+        writer = self._arrow_writers[name]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=writer.schema))
+
+    def close(self):
+        """
+        Write out the rest of the rows and the categories. Returns the
+        Tables if they are kept in memory.
+        """
+        tables = [self.games] + list(self.tables.values())
+        for table in tables:
+            if len(table) or not table.nchunks:
+                self._write(table)
+        for writer in self._arrow_writers.values():
+            writer.close()
+        self._arrow_writers = {}
+
+        categories = {kind: cats.values for kind, cats in self.categories.items()}
+        categories['player'] = [ids.players.id(code) for code in range(len(ids.players))]
+        meta = {
+            'version': EXPORT_VERSION,
+            'format': self.format,
+            'tables': {table.name: {'columns': [[col, kind] for col, kind, _ in table.columns],
+                                    'nrows': table.nrows, 'nchunks': table.nchunks}
+                       for table in tables},
+            'categories': categories,
+        }
+        if self.path is None:
+            return Tables({name: np.concatenate(chunks) for name, chunks in self._chunks.items()},
+                          meta)
+        with open(os.path.join(self.path, 'meta.json'), 'w') as outfile:
+            json.dump(meta, outfile)
+
+class Tables(object):
+    """
+    Exported tables, as NumPy structured arrays. tables[name] is the table
+    of that record type (or 'games').
+    """
+    def __init__(self, tables, meta):
+        self.tables = tables
+        self.meta = meta
+        self.categories = {kind: np.array(values, dtype=object)
+                           for kind, values in meta['categories'].items()}
+        self._kind_of = {name: dict((col, kind) for col, kind in table['columns'])
+                         for name, table in meta['tables'].items()}
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def __contains__(self, name):
+        return name in self.tables
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def kind(self, table, column):
+        """ The type of @column of @table: an integer dtype, or the name of its categories """
+        return self._kind_of[table][column]
+
+    def decode(self, table, column, rows=None):
+        """
+        Return the values of the coded @column of @table as an array of
+        strings
+        @param rows - if passed, only decode these rows (e.g. a boolean mask)
+        """
+        codes = self.tables[table][column]
+        if rows is not None:
+            codes = codes[rows]
+        return self.categories[self.kind(table, column)][codes]
+
+    def code(self, kind, value):
+        """ Return the code of @value in the categories @kind, or -1 if it never appears """
+        matches = np.flatnonzero(self.categories[kind] == value)
+        return int(matches[0]) if len(matches) else -1
+
+    def info(self, fieldname):
+        """
+        Return an array with the value of the info field @fieldname (e.g.
+        'hometeam') of each game, indexed by game_idx. Games without it get
+        None.
+        """
+        info = self.tables['info']
+        ngames = len(self.tables['games'])
+        values = np.full(ngames, None, dtype=object)
+        rows = info['fieldname'] == self.code('fieldname', fieldname)
+        values[info['game_idx'][rows]] = self.decode('info', 'data', rows)
+        return values
+
+def load(path):
+    """ Return the Tables exported to the directory @path """
+    with open(os.path.join(path, 'meta.json'), 'r') as infile:
+        meta = json.load(infile)
+    if meta.get('version') != EXPORT_VERSION:
+        raise ValueError("{} was exported by another version".format(path))
+
+    tables = {}
+    for name, table in meta['tables'].items():
+        if meta['format'] == 'numpy':
+            tables[name] = np.concatenate([
+                np.load(os.path.join(path, '{}.{:05d}.npy'.format(name, i)))
+                for i in range(table['nchunks'])
+            ])
+        else:
+            tables[name] = _load_arrow(os.path.join(path, name + '.arrow'))
+    return Tables(tables, meta)
+
+def _load_arrow(filename):
+    import pyarrow as pa
+    with pa.memory_map(filename, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    columns = [table.column(col).to_numpy() for col in table.column_names]
+    rows = np.empty(table.num_rows, dtype=[(col, values.dtype)
+                                           for col, values in zip(table.column_names, columns)])
+    for col, values in zip(table.column_names, columns):
+        rows[col] = values
+    return rows
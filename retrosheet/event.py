@@ -3,34 +3,59 @@ Simple structs for Pythonifying the Event file from the MLB retrosheet
 """
 import logging as log
 
+from retrosheet import ids
+
 __author__ = "Vyassa Baratham"
 
 # TODO: home/away as named enum
 
 class EventLine(object):
     """
-    Base class for a line from the event file
+    Base class for a line from the event file.
+
+    There is one of these objects for every line of every event file, so
+    each subclass declares __slots__ to do without a per-instance __dict__.
+    Subclasses that add attributes must list them in __slots__.
     """
-    pass
+    __slots__ = ()
+
+# The integer fields in the event file (home/away, batting order, fielding
+# position, inning) are almost always small, so look them up instead of
+# parsing them with int() on every line
+_small_ints = {str(i): i for i in range(100)}
+
+def _int(s):
+    try:
+        return _small_ints[s]
+    except KeyError:
+        return int(s)
 
 # TODO: This should all be specifiable as a json or
 # something... object types for each arg... etc.
 
 class ID(EventLine):
+    __slots__ = ('gameID',)
+
     def __init__(self, gameID):
         self.gameID = gameID
 
 class Version(EventLine):
+    __slots__ = ('version',)
+
     def __init__(self, version):
         self.version = version
 
 class Start(EventLine):
+    # player is the integer code of playerID (see retrosheet.ids)
+    __slots__ = ('playerID', 'player', 'playername', 'homeaway', 'battingorder', 'position')
+
     def __init__(self, playerID, playername, homeaway, battingorder, position):
         self.playerID = playerID
+        self.player = ids.players.code(playerID)
         self.playername = playername
-        self.homeaway = int(homeaway)
-        self.battingorder = int(battingorder)
-        self.position = int(position)
+        self.homeaway = _int(homeaway)
+        self.battingorder = _int(battingorder)
+        self.position = _int(position)
 
     def __str__(self):
         return ','.join(str(s) for s in [
@@ -38,12 +63,16 @@ class Start(EventLine):
         ])
 
 class Sub(EventLine):
+    # player is the integer code of playerID (see retrosheet.ids)
+    __slots__ = ('playerID', 'player', 'playername', 'homeaway', 'battingorder', 'position')
+
     def __init__(self, playerID, playername, homeaway, battingorder, position):
         self.playerID = playerID
+        self.player = ids.players.code(playerID)
         self.playername = playername
-        self.homeaway = int(homeaway)
-        self.battingorder = int(battingorder)
-        self.position = int(position)
+        self.homeaway = _int(homeaway)
+        self.battingorder = _int(battingorder)
+        self.position = _int(position)
 
     def __str__(self):
         return ','.join(str(s) for s in [
@@ -51,10 +80,12 @@ class Sub(EventLine):
         ])
 
 class Play(EventLine):
-    # TODO: Create a separate parser for the "play" subfield
+    # The "event" subfield is parsed by retrosheet.play_parser.parse_event
+    __slots__ = ('inning', 'homeaway', 'playerID', 'count', 'pitches', 'event')
+
     def __init__(self, inning, homeaway, playerID, count, pitches, event):
-        self.inning = int(inning)
-        self.homeaway = int(homeaway)
+        self.inning = _int(inning)
+        self.homeaway = _int(homeaway)
         self.playerID = playerID
         self.count = count
         self.pitches = pitches
@@ -66,31 +97,43 @@ class Play(EventLine):
         ])
     
 class Info(EventLine):
+    __slots__ = ('fieldname', 'data')
+
     def __init__(self, fieldname, data):
         self.fieldname = fieldname
         self.data = data
 
 class Data(EventLine):
+    __slots__ = ('data',)
+
     def __init__(self, *data):
         self.data = data
 
 class Com(EventLine):
+    __slots__ = ('comment',)
+
     def __init__(self, comment):
         self.comment = comment
 
 class Padj(EventLine):
     # This allegedly only happened on 9/28/1995 (https://www.retrosheet.org/eventfile.htm)
     # But I'm seeing it in CIN201905040 from 2019
+    __slots__ = ('playerID', 'hand')
+
     def __init__(self, playerID, hand):
         self.playerID = playerID
         self.hand = hand
 
 class Badj(EventLine):
+    __slots__ = ('playerID', 'hand')
+
     def __init__(self, playerID, hand):
         self.playerID = playerID
         self.hand = hand
 
 class Radj(EventLine):
+    __slots__ = ('playerID', 'base')
+
     def __init__(self, playerID, base):
         self.playerID = playerID
         self.base = base
@@ -3,3 +3,4 @@ from .innings_played import *
 from .winner import *
 from .game_trigger import *
 from .active_players import *
+from .game_state import *
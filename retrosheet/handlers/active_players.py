@@ -1,18 +1,42 @@
 from .handler import Handler
+from retrosheet import ids
+from retrosheet.event import Start, Sub
 """
 Handler to keep a list of all players who were active in at least
 one game in the sample we analyze
 """
 
 class ActivePlayers(Handler):
+    # 2: players are identified by their codes
+    version = 2
+
+    record_types = {'start', 'sub'}
+
     def __init__(self):
         super(ActivePlayers, self).__init__()
-        self.playerIDs = set()
+        # Codes (see retrosheet.ids) of the active players
+        self.players = set()
+
+    @property
+    def playerIDs(self):
+        return {ids.players.id(player) for player in self.players}
 
     def handle_start(self, start):
-        self.playerIDs.add(start.playerID)
+        self.players.add(start.player)
         
     def handle_sub(self, sub):
-        self.playerIDs.add(sub.playerID)
+        self.players.add(sub.player)
+
+    def handle_game(self, game):
+        self.players.update(pyline.player for pyline in game
+                            if type(pyline) is Start or type(pyline) is Sub)
+
+    def reset_game(self):
+        """ Forget the players seen so far, emptying the set in place (see Handler.reset) """
+        self.players.clear()
+
+    def merge(self, other):
+        self.players |= other.players
+        self.error = self.error or other.error
     
 
@@ -0,0 +1,65 @@
+import logging as log
+
+from retrosheet.play_parser import parse_event
+from .handler import Handler
+from .inning import OutsCounter
+
+"""
+Shared tracking of the outs and inning, so that handlers that need them
+don't each parse every play to count outs (see Handler.uses_game_state)
+"""
+
+class GameState(OutsCounter, Handler):
+    """
+    Keeps the outs and inning of the current game. The Analysis registers one
+    under the name 'game_state' as soon as a handler that uses it is
+    registered, links it to each such handler as handler.game_state, and
+    keeps it after all the other handlers, so that it handles each record
+    last. Handlers reading it therefore see the state before the record
+    they are handling: at a play, the outs before the play; at an ID
+    record, the end of the previous game.
+
+    Like the Inning handler, it checks each play's inning and home/away
+    against the outs so far. When they disagree it has lost track of the
+    game: it puts the handlers that use it in error, as they would be if
+    they had raised WrongInningException themselves, and stops counting
+    until the next game.
+    """
+
+    # Handlers are linked to the state in place of holding one; restoring or
+    # merging the state must not pick up another copy's handlers
+    links = ('dependents',)
+
+    def __init__(self):
+        super(GameState, self).__init__()
+        self.tot_outs = 0
+
+        # True once a play disagrees with the outs so far, until the next game
+        self.lost_track = False
+
+    def link(self, handler):
+        """ Make @handler read this state, as handler.game_state """
+        if 'dependents' not in self.__dict__:
+            self.dependents = []
+        if handler not in self.dependents:
+            self.dependents.append(handler)
+        handler.game_state = self
+
+    def handle_id(self, _id):
+        self.tot_outs = 0
+        self.lost_track = False
+
+    def handle_play(self, play):
+        if self.lost_track:
+            return
+
+        wrong = self.wrong_inning(play)
+        if wrong is not None:
+            self.lost_track = True
+            log.error(wrong)
+            for handler in self.__dict__.get('dependents', ()):
+                if not handler.error:
+                    handler.mark_error()
+            return
+
+        self.tot_outs += parse_event(play.event).outs
@@ -1,5 +1,5 @@
 from .handler import Handler
-import logging as log
+from retrosheet.event import ID
 """
 This Handler just fires a trigger when it encounters an "ID" record, which terminates the previous game
 """
@@ -35,5 +35,17 @@ class GameTrigger(Handler):
     def handle_id(self, _id):
         return self.advance_game(_id.gameID)
 
+    def handle_game(self, game):
+        """
+        When records are delivered a game at a time, fire the trigger at the
+        end of every game, including the last. prev_gameID is set to the
+        game that just ended, as it is when the trigger fires on the next
+        ID record.
+        """
+        if isinstance(game[0], ID):
+            self.advance_game(game[0].gameID)
+            self.prev_gameID = self.current_gameID
+            return self.trigger_name
+
     def reset(self):
         self.error = False
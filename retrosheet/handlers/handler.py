@@ -1,30 +1,113 @@
+from collections import OrderedDict
+
 from retrosheet import event
 import logging as log
 
+# Name of the Handler method that handles each type of record
+method_for = OrderedDict([
+    (event.ID, 'handle_id'),
+    (event.Version, 'handle_version'),
+    (event.Start, 'handle_start'),
+    (event.Sub, 'handle_sub'),
+    (event.Play, 'handle_play'),
+    (event.Info, 'handle_info'),
+    (event.Data, 'handle_data'),
+    (event.Com, 'handle_com'),
+    (event.Padj, 'handle_padj'),
+    (event.Badj, 'handle_badj'),
+    (event.Radj, 'handle_radj'),
+])
+
 class Handler(object):
     """
     Base class for handlers
+
+    When the Analysis delivers records a game at a time (Analysis.run with
+    by_game=True), a handler can define handle_game(self, game) to get each
+    game as a list of records, instead of one record at a time through
+    the handle_* methods. Like the handle_* methods, it may return the name
+    of a trigger to fire.
     """
 
+    # Maps each record type to the (unbound) function that handles it, for
+    # only those record types where the class overrides the do-nothing
+    # handle_* method below. Built once per class, when the class is defined.
+    dispatch = {}
+
+    # The record types that handle_game looks at, e.g. {'start', 'sub'}, so
+    # that when the Analysis delivers whole games it can skip lines of every
+    # other type without splitting them. None means every type, which is
+    # always correct. Handlers without handle_game don't need this: they see
+    # the types they have handle_* methods for (see subscriptions()).
+    record_types = None
+
+    # record_types, or None if a class overrides handle_game below the one
+    # declaring them. Built once per class, when the class is defined.
+    game_record_types = None
+
+    # Bump this in a subclass when a change alters what the handler computes,
+    # so that results cached with the old version (see retrosheet.result_cache)
+    # aren't reused
+    version = 1
+
+    # Set this in a subclass that reads the outs and inning of the current
+    # game. The Analysis then links the handler to the GameState it shares
+    # with every other such handler, as self.game_state, which is updated
+    # once per record however many handlers read it (see GameState).
+    uses_game_state = False
+    game_state = None
+
+    # Attributes that link the handler to other handlers rather than hold
+    # its own state, which merge() and restoring a checkpoint leave alone
+    links = ('game_state',)
+
+    def __init_subclass__(cls, **kwargs):
+        super(Handler, cls).__init_subclass__(**kwargs)
+        cls.dispatch = {
+            typ: getattr(cls, name) for typ, name in method_for.items()
+            if getattr(cls, name) is not getattr(Handler, name)
+        }
+        cls.game_record_types = cls._declared_game_record_types()
+        cls._resets_in_place = cls._reset_game_covers_init()
+
+    @classmethod
+    def _declared_game_record_types(cls):
+        for klass in cls.__mro__:
+            if 'record_types' in klass.__dict__:
+                return klass.record_types
+            if 'handle_game' in klass.__dict__:
+                return None
+        return None
+
+    @classmethod
+    def _reset_game_covers_init(cls):
+        """
+        Whether reset() can call reset_game(): only if the class defining it
+        is a subclass of (or is) the one defining __init__, so that a
+        subclass adding attributes in its own __init__ is reset by rerunning
+        it until it defines reset_game() too
+        """
+        for klass in cls.__mro__:
+            if 'reset_game' in klass.__dict__:
+                return True
+            if '__init__' in klass.__dict__:
+                return False
+        return False
+
     def __init__(self, *args, **kwargs):
         # True when we are in an error state:
         self.error = False
-    
-    @property
-    def fcn_for(self):
-        return {
-            event.ID: self.handle_id,
-            event.Version: self.handle_version,
-            event.Start: self.handle_start,
-            event.Sub: self.handle_sub,
-            event.Play: self.handle_play,
-            event.Info: self.handle_info,
-            event.Data: self.handle_data,
-            event.Com: self.handle_com,
-            event.Padj: self.handle_padj,
-            event.Badj: self.handle_badj,
-            event.Radj: self.handle_radj,
-        }
+
+    def subscriptions(self):
+        """
+        Return a dict mapping each record type this handler wants to see to
+        the bound function that handles it. The Analysis object only sends a
+        record to the handlers subscribed to its type. A handler that
+        overrides handle() itself is subscribed to every record type.
+        """
+        if type(self).handle is not Handler.handle:
+            return {typ: self.handle for typ in method_for}
+        return {typ: fcn.__get__(self) for typ, fcn in self.dispatch.items()}
 
     def handle_id(self, _id):
         pass
@@ -59,11 +142,35 @@ class Handler(object):
     def handle_radj(self, radj):
         pass
 
+    def end_game(self):
+        """
+        Called at the end of every game, including the last, when the
+        Analysis delivers records a game at a time. Handlers that wrap up a
+        game when the next ID record arrives can do it here instead, so that
+        it also happens for the last game. May return the name of a trigger
+        to fire.
+        """
+        pass
+
+    def end_of_game(self):
+        """
+        Return the function the Analysis should call with each game's records
+        at the end of the game, when delivering records a game at a time:
+        handle_game for batch handlers, or a function that calls end_game
+        for handlers that override it. Returns None if there is nothing to do.
+        """
+        if hasattr(self, 'handle_game'):
+            return self.handle_game
+        if type(self).end_game is not Handler.end_game:
+            return lambda game: self.end_game()
+        return None
+
     def handle(self, pyline):
         """ Pass the line off to the appropriate handling function """
         if not self.error:
-            typ = type(pyline)
-            return self.fcn_for[typ](pyline)
+            fcn = self.dispatch.get(type(pyline))
+            if fcn:
+                return fcn(self, pyline)
         else:
             log.debug("Not running b/c in error state: {}".format(pyline))
 
@@ -95,6 +202,19 @@ class Handler(object):
         self.error = False
         self._exit_error(*args, **kwargs)
 
+    def merge(self, other):
+        """
+        Fold the state of @other, a copy of this handler that ran over the
+        games immediately following the ones this handler has seen, into
+        this handler. This is how results from parallel runs are combined.
+
+        By default the later state wins, which is right for handlers that only
+        track the current game. Handlers that accumulate data across games
+        (e.g. ActivePlayers) must override this.
+        """
+        self.__dict__.update((name, value) for name, value in other.__dict__.items()
+                             if name not in self.links)
+
     def reset(self):
         """
         Resets the handler. Usually this means re-initializing all member
@@ -104,5 +224,18 @@ class Handler(object):
 
         This function mnust be called by the Analysis object after firing
         triggers for each game
+
+        A handler reset after every game can instead define reset_game(),
+        which clears its containers in place so that nothing is allocated
+        per game (e.g. InningsPlayed). reset() only calls it when the class
+        defining it also defines the __init__ in effect: a subclass that
+        overrides __init__ is still reset by rerunning it, unless it defines
+        its own reset_game(). Anything an in-place reset has handed out,
+        like InningsPlayed's inn_played dicts, is cleared too, so copy it
+        first if it has to outlive the game.
         """
-        self.__init__()
+        if self._resets_in_place:
+            self.error = False
+            self.reset_game()
+        else:
+            self.__init__()
@@ -1,41 +1,70 @@
-from retrosheet import HOME, AWAY
-from .inning import Inning
+from array import array
+
+from retrosheet import HOME, AWAY, ids
+from retrosheet.ids import NO_PLAYER
+from .handler import Handler
 
 """
 Handler to count the number of innings each player played
 """
 
+# What InningsPlayedStruct's arrays hold before anyone has entered the game
+_EMPTY_SLOTS = array('q', [NO_PLAYER] * 10)
+_NOT_ENTERED = array('d', [0] * 10)
+
 class InningsPlayedStruct(object):
     """
     This struct stores the data we need to track for each team 
     in order to count innings played for each player
+
+    Players are identified by their integer codes (see retrosheet.ids)
     """
     def __init__(self):
-        # player ID of each player currently in the game, in batting order
-        self.playerIDs = [''] * 10
+        # code of each player currently in the game, in batting order
+        self.players = array('q', _EMPTY_SLOTS)
 
         # inning each of those players joined the game
-        self.when_entered = [0] * 10
+        self.when_entered = array('d', _NOT_ENTERED)
 
         # when a player leaves the game or the game ends, their # innings played is stored here
         self.inn_played = {}
+
+    def clear(self):
+        """ Start over for a new game, in place """
+        self.players[:] = _EMPTY_SLOTS
+        self.when_entered[:] = _NOT_ENTERED
+        self.inn_played.clear()
+
+    @property
+    def playerIDs(self):
+        """ player ID of each player currently in the game, in batting order ('' for none) """
+        return [ids.players.id(player) if player != NO_PLAYER else '' for player in self.players]
         
 
-class InningsPlayed(Inning):
+class InningsPlayed(Handler):
+    # 2: players are identified by their codes
+    # 3: reads the inning from the shared game state
+    version = 3
+
+    uses_game_state = True
+
     def __init__(self):
         super(InningsPlayed, self).__init__()
         
         self.home = InningsPlayedStruct()
         self.away = InningsPlayedStruct()
 
-    # Rename this function for readability. Calling float(self) to get
-    # the current inning is pretty opaque - self.inning_as_float makes
-    # a bit more sense.
     def inning_as_float(self):
-        return self.__float__()
+        """ The current inning, from the game state (see GameState) """
+        game_state = self.game_state
+        if game_state is None:
+            raise RuntimeError("InningsPlayed reads the inning from a GameState, and none is linked to it. "
+                               "Register it with Analysis.register_handler, or link it with "
+                               "GameState.link() and pass the GameState each record after it.")
+        return game_state.inning_as_float()
 
     def handle_start(self, start):
-        self.home.playerIDs[start.battingorder] = start.playerID
+        self.home.players[start.battingorder] = start.player
 
     def handle_sub(self, sub):
         if sub.homeaway == AWAY:
@@ -46,21 +75,139 @@ class InningsPlayed(Inning):
             raise Exception("Unrecognized home/away in substituion. Current sub: {}".format(sub))
 
         # Find the outgoing player based on batting order
-        outgoing = data.playerIDs[sub.battingorder]
+        outgoing = data.players[sub.battingorder]
         # and count his innings played
-        data.inn_played[outgoing] = self.inning_as_float() - data.when_entered[sub.battingorder]
+        if outgoing != NO_PLAYER:
+            data.inn_played[outgoing] = self.inning_as_float() - data.when_entered[sub.battingorder]
 
         # Put the incoming player into the list of active players
-        data.playerIDs[sub.battingorder] = sub.playerID
+        data.players[sub.battingorder] = sub.player
         # and record when he entered
         data.when_entered[sub.battingorder] = self.inning_as_float()
         
     def handle_id(self, _id):
         """ New game """
+        self.end_game()
+
+    def end_game(self):
+        """ Count innings played by everyone still in the game at the end """
         for data in (self.home, self.away):
-            for battingorder, playerID in enumerate(data.playerIDs):
-                if playerID: # index 0 (designated hitter) will be empty for NL. Also all will be empty before the first game
-                    data.inn_played[playerID] = self.inning_as_float() - data.when_entered[battingorder]
+            for battingorder, player in enumerate(data.players):
+                if player != NO_PLAYER: # index 0 (designated hitter) will be empty for NL. Also all will be empty before the first game
+                    data.inn_played[player] = self.inning_as_float() - data.when_entered[battingorder]
                     
+    def merge(self, other):
+        """
+        Take the current-game state from @other, keeping innings played
+        by players who appear only in this handler's games
+        """
+        home_inn_played = {**self.home.inn_played, **other.home.inn_played}
+        away_inn_played = {**self.away.inn_played, **other.away.inn_played}
+        super(InningsPlayed, self).merge(other)
+        self.home.inn_played = home_inn_played
+        self.away.inn_played = away_inn_played
+
+    def reset_game(self):
+        """ Start over for a new game, clearing the structs in place (see Handler.reset) """
+        self.home.clear()
+        self.away.clear()
+
     def get_all_innings_played(self):
-        return {**self.home.inn_played, **self.away.inn_played}
+        """ Return a dict mapping player ID to innings played, for both teams """
+        inn_played = {**self.home.inn_played, **self.away.inn_played}
+        return {ids.players.id(player): ip for player, ip in inn_played.items()}
+
+
+# Keys of an empty batting order slot: its player code, or its playerID in
+# rows keyed by playerID
+_EMPTY_KEYS = frozenset([NO_PLAYER, ''])
+
+def append_csr_row(data, indices, indptr, row, column_for=None):
+    """
+    Append one row to a sparse matrix being built in CSR form
+    @param data, indices, indptr - the CSR arrays, appended to in place
+    @param row - dict mapping each key to its value. An empty batting order
+                 slot (NO_PLAYER, or '' in rows keyed by playerID) is ignored.
+    @param column_for - dict mapping each key to its column (e.g. utils.players).
+                        If None, the keys are the columns.
+    """
+    keys = [key for key in row if key not in _EMPTY_KEYS]
+    if column_for is None:
+        indices.extend(keys)
+    else:
+        indices.extend(column_for[key] for key in keys)
+    data.extend(row[key] for key in keys)
+    indptr.append(len(indices))
+
+
+class InningsPlayedMatrix(object):
+    """
+    Builds a sparse matrix of innings played, one row per team per game, in
+    CSR form as the rows are added. Nothing is preallocated, so the number of
+    games doesn't need to be known in advance, and memory only grows with the
+    number of nonzero entries.
+    """
+    def __init__(self, column_for=None):
+        """
+        @param column_for - dict mapping each key of the rows passed to
+                            add_row to its column (e.g. utils.players for
+                            rows keyed by playerID). If None, the keys are
+                            player codes, which are the columns (see
+                            retrosheet.ids).
+        """
+        self.column_for = column_for
+
+        # The three CSR arrays, grown in place as rows are added
+        self.data = array('d')
+        self.indices = array('q')
+        self.indptr = array('q', [0])
+
+    @property
+    def nrows(self):
+        return len(self.indptr) - 1
+
+    def add_row(self, inn_played):
+        """
+        Append one row
+        @param inn_played - dict mapping player (see column_for) to innings
+                            played. An empty batting order slot (NO_PLAYER,
+                            or the empty playerID) is ignored.
+        """
+        append_csr_row(self.data, self.indices, self.indptr, inn_played, self.column_for)
+
+    def add_game(self, inn_played):
+        """
+        Append the rows for the away team and home team, in that order,
+        from an InningsPlayed handler at the end of a game. column_for
+        must be None, since the handler keys players by code.
+        """
+        rows = [None, None]
+        rows[AWAY] = inn_played.away.inn_played
+        rows[HOME] = inn_played.home.inn_played
+        for row in rows:
+            self.add_row(row)
+
+    def to_csr(self, ncols=None):
+        """
+        Return the matrix as a scipy.sparse.csr_matrix
+        @param ncols - number of columns. Defaults to the number of players in
+                       column_for, or the number of player codes.
+        """
+        import numpy as np
+        import scipy.sparse
+
+        if ncols is None:
+            ncols = len(self.column_for if self.column_for is not None else ids.players)
+        x = scipy.sparse.csr_matrix(
+            (np.frombuffer(self.data, dtype=np.float64),
+             np.frombuffer(self.indices, dtype=np.int64),
+             np.frombuffer(self.indptr, dtype=np.int64)),
+            shape=(self.nrows, ncols),
+            copy=True,
+        )
+        x.sort_indices()
+        return x
+
+    def to_coo(self, ncols=None):
+        """ Return the matrix as a scipy.sparse.coo_matrix """
+        return self.to_csr(ncols).tocoo()
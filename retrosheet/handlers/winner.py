@@ -1,16 +1,19 @@
 import logging as log
 
-from retrosheet import HOME, AWAY
+from retrosheet import HOME, AWAY, ids
 from .handler import Handler
 """
 Handler to determine who won the game by comparing the winning pitcher to the rosters
 """
 class Winner(Handler):
+    # 2: pitchers are identified by their codes
+    version = 2
+
     def __init__(self):
         super(Winner, self).__init__()
         
-        # List of pitchers for the home and away teams
-        self.pitcherIDs = [set(), set()]
+        # Codes (see retrosheet.ids) of the pitchers for the away and home teams
+        self.pitchers = [set(), set()]
 
         # Visiting and home team names, to be found from info records
         self.visteam = None
@@ -19,9 +22,22 @@ class Winner(Handler):
         # Winning pitcher, also to be found from info records
         self.wp = None
 
+    @property
+    def pitcherIDs(self):
+        """ player IDs of the pitchers for the away and home teams """
+        return [{ids.players.id(player) for player in pitchers} for pitchers in self.pitchers]
+
+    def reset_game(self):
+        """ Start over for a new game, emptying the pitcher sets in place (see Handler.reset) """
+        for pitchers in self.pitchers:
+            pitchers.clear()
+        self.visteam = None
+        self.hometeam = None
+        self.wp = None
+
     def handle_start(self, start):
         if start.position == 1:
-            self.pitcherIDs[start.homeaway].add(start.playerID)
+            self.pitchers[start.homeaway].add(start.player)
 
     def handle_sub(self, sub):
         self.handle_start(sub)
@@ -48,9 +64,10 @@ class Winner(Handler):
         assert self.hometeam, "Must encounter info 'hometeam' before computing winning team"
         assert self.wp, "Must encounter info 'wp' before computing winning team"
 
-        if self.wp in self.pitcherIDs[HOME]:
-            assert self.wp not in self.pitcherIDs[AWAY], "Winning pitcher can't be on both teams"
+        wp = ids.players.code(self.wp)
+        if wp in self.pitchers[HOME]:
+            assert wp not in self.pitchers[AWAY], "Winning pitcher can't be on both teams"
             return HOME, self.hometeam
         else:
-            assert self.wp in self.pitcherIDs[AWAY], "Winning pitcher has to be on the other team"
+            assert wp in self.pitchers[AWAY], "Winning pitcher has to be on the other team"
             return AWAY, self.visteam
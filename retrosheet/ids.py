@@ -0,0 +1,95 @@
+"""
+Dense integer codes for player IDs, assigned once when a line of an Event
+file is parsed, so that handlers can keep their state in integer arrays and
+int-keyed dicts instead of hashing the same 8-character strings over and
+over.
+
+Every player in the player registry (utils.players) has their index there
+as their code, which is also their column in the X matrix, so matrices can
+be built straight from the codes. Players who aren't in the registry (or
+every player, if the registry can't be loaded) are numbered after those, in
+the order they turn up. Those codes only mean something in the process that
+assigned them, so results that outlive a run or come from another process
+should only hold codes of registered players. Checkpoints save and restore
+them (see Analysis._run_indexed).
+
+Once codes have been given out, the registry can't be pointed at another
+playerIDs file (utils.PlayerRegistry.set_path), since they would no longer
+be the players' numbers there.
+"""
+import logging as log
+
+# Code of an empty slot, e.g. an empty batting order slot
+NO_PLAYER = -1
+
+class IDCodes(object):
+    def __init__(self, known=None):
+        """
+        @param known - function returning the IDs that have fixed codes, in
+                       code order. Called the first time a code is needed.
+        """
+        self._known = known
+        self._codes = None
+        self._ids = None
+        self.nknown = 0
+
+        # What @known returned, once it has been called
+        self.source = None
+
+    def _load(self):
+        ids = []
+        if self._known is not None:
+            try:
+                self.source = self._known()
+                ids = list(self.source)
+            except (ImportError, OSError) as e:
+                log.warning("Numbering player IDs as they turn up, since the "
+                            "player registry can't be loaded: {}".format(e))
+        self._ids = ids
+        self._codes = dict(zip(ids, range(len(ids))))
+        self.nknown = len(ids)
+
+    def code(self, id):
+        """ Return the code of @id, giving it the next one if it doesn't have one yet """
+        if self._codes is None:
+            self._load()
+        try:
+            return self._codes[id]
+        except KeyError:
+            code = self._codes[id] = len(self._ids)
+            self._ids.append(id)
+            return code
+
+    def id(self, code):
+        """ Return the ID with code @code """
+        if self._ids is None:
+            self._load()
+        return self._ids[code]
+
+    def __len__(self):
+        if self._ids is None:
+            self._load()
+        return len(self._ids)
+
+    def unknown(self):
+        """ Return the IDs numbered as they turned up, in code order """
+        if self._ids is None:
+            self._load()
+        return self._ids[self.nknown:]
+
+    def restore(self, unknown):
+        """
+        Give the IDs in @unknown (from unknown(), e.g. in another process)
+        the same codes they had there. Raises ValueError if some other ID
+        already has one of those codes.
+        """
+        for i, id in enumerate(unknown):
+            if self.code(id) != self.nknown + i:
+                raise ValueError("Player {} already has code {}, not {}".format(
+                    id, self.code(id), self.nknown + i))
+
+def _registered_players():
+    from retrosheet.utils import players
+    return players
+
+players = IDCodes(_registered_players)
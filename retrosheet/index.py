@@ -0,0 +1,150 @@
+"""
+Index of where each game starts and ends in a set of event files, so that
+an analysis of a few games can read just those games instead of the whole
+retrosheet.
+
+For each game the index stores the event file, the byte offset of its ID
+record, the length of the game in bytes, and the date, home team and
+visiting team from its info records. The index can be saved to disk, in
+which case only event files that are new or have changed (by mtime and
+size) are re-scanned.
+"""
+import os
+import json
+import logging as log
+from collections import namedtuple
+
+from retrosheet.checkpoint import file_stamp
+
+INDEX_VERSION = 1
+
+GameEntry = namedtuple('GameEntry', [
+    'filename', 'gameID', 'offset', 'length', 'date', 'hometeam', 'visteam',
+])
+
+# info records we keep in the index, and the GameEntry field for each
+_indexed_info = {
+    b'info,date,': 'date',
+    b'info,hometeam,': 'hometeam',
+    b'info,visteam,': 'visteam',
+}
+
+def scan_event_file(filename):
+    """ Return a list of GameEntry for every game in @filename """
+    games = []
+    game = None
+    offset = 0
+
+    def finish(end):
+        game['length'] = end - game['offset']
+        games.append(GameEntry(**game))
+
+    with open(filename, 'rb') as infile:
+        for line in infile:
+            if line.startswith(b'id,'):
+                if game:
+                    finish(offset)
+                game = {
+                    'filename': filename,
+                    'gameID': line[3:].strip().decode(),
+                    'offset': offset,
+                    'length': None,
+                    'date': None,
+                    'hometeam': None,
+                    'visteam': None,
+                }
+            elif game and line.startswith(b'info,'):
+                for prefix, field in _indexed_info.items():
+                    if line.startswith(prefix):
+                        game[field] = line[len(prefix):].strip().decode()
+            offset += len(line)
+    if game:
+        finish(offset)
+    return games
+
+class GameIndex(object):
+    def __init__(self, path=None):
+        """
+        @param path - file to save the index in. If None, the index is only
+                      kept in memory.
+        """
+        self.path = path
+        self.files = {}
+        if path and os.path.exists(path):
+            with open(path, 'r') as infile:
+                saved = json.load(infile)
+            if saved.get('version') == INDEX_VERSION:
+                self.files = saved['files']
+
+    def update(self, filenames):
+        """
+        Index any of @filenames that aren't indexed yet or have changed since
+        they were, and save the index if it has a path
+        """
+        changed = False
+        for filename in filenames:
+            key = os.path.abspath(filename)
+            stamp = file_stamp(filename)
+            entry = self.files.get(key)
+            if entry is None or entry['stamp'] != stamp:
+                log.info("Indexing games in {}".format(filename))
+                self.files[key] = {
+                    'stamp': stamp,
+                    'games': [list(game[1:]) for game in scan_event_file(filename)],
+                }
+                changed = True
+
+        if changed and self.path:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as outfile:
+                json.dump({'version': INDEX_VERSION, 'files': self.files}, outfile)
+            os.replace(tmp_path, self.path)
+
+    def games(self, filenames):
+        """
+        Yield a GameEntry for every game in @filenames, in order. The files
+        must already have been indexed with update().
+        """
+        for filename in filenames:
+            for game in self.files[os.path.abspath(filename)]['games']:
+                yield GameEntry(filename, *game)
+
+    def select(self, filenames, game_filter):
+        """ Return the GameEntry of every game in @filenames for which @game_filter is True """
+        self.update(filenames)
+        return [game for game in self.games(filenames) if game_filter(game)]
+
+def _as_date(date):
+    """ Format @date (a datetime.date, or a string like the info,date record) like the info,date record """
+    if hasattr(date, 'strftime'):
+        return date.strftime('%Y/%m/%d')
+    return date.replace('-', '/')
+
+class GameFilter(object):
+    """
+    Selects games from the index by ID, team and/or date. A game must match
+    every criterion that is given.
+    """
+    def __init__(self, gameIDs=None, teams=None, date_from=None, date_to=None):
+        """
+        @param gameIDs - collection of game IDs to keep
+        @param teams - collection of teams. A game is kept if either team is in it.
+        @param date_from - first date to keep (datetime.date or "YYYY/MM/DD")
+        @param date_to - last date to keep (datetime.date or "YYYY/MM/DD")
+        """
+        self.gameIDs = set(gameIDs) if gameIDs is not None else None
+        self.teams = set(teams) if teams is not None else None
+        self.date_from = _as_date(date_from) if date_from is not None else None
+        self.date_to = _as_date(date_to) if date_to is not None else None
+
+    def __call__(self, game):
+        if self.gameIDs is not None and game.gameID not in self.gameIDs:
+            return False
+        if self.teams is not None and \
+           game.hometeam not in self.teams and game.visteam not in self.teams:
+            return False
+        if self.date_from is not None and (game.date is None or game.date < self.date_from):
+            return False
+        if self.date_to is not None and (game.date is None or game.date > self.date_to):
+            return False
+        return True
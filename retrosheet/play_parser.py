@@ -0,0 +1,175 @@
+"""
+Parser for the event subfield of "play" records (see
+https://www.retrosheet.org/eventfile.htm#5), e.g. "64(1)3/GDP.3-H;2-3"
+
+An event is made of:
+  - the basic play ("64(1)3"), which may be followed by "+" and a second
+    play when the first is a strikeout or walk ("K+SB2")
+  - modifiers, each starting with "/" ("/GDP")
+  - advances, after a ".", separated by ";" ("3-H;2-3")
+
+The number of distinct event strings is small compared to the number of
+plays, so parse_event() memoizes its results. They are shared between all
+plays with the same event string, so they are immutable.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+__author__ = "Vyassa Baratham"
+
+# TODO: "U" for unknown fielders?
+
+# Grounded double plays take the form $(%)$, triple plays $(%)$(%)$
+# Lined double plays take the form $(B)$(%), triple plays $(B)$(%)$(%)
+# Where "$" represents 1 or more fielders (digit) and "%" represents a runner (digit or "B")
+doubleplay_regex = re.compile(r"(?:\d+\(\d\)\d+)|(?:\d+\(B\)\d+\(\d\))")
+tripleplay_regex = re.compile(r"(?:\d+\(\d\)\d+\(\d\)\d+)|(?:\d+\(B\)\d+\(\d\)\d+\(\d\))|(?:\d+\(\d\)\d+\(B\)\d+\(\d\))")
+
+# {baserunner: B123} "X" {base advancing to: 123H} not followed by { optional: "(UR)" {error: "(*E*)"} }
+caughtadvancing_noerror_regex = re.compile(r"[B\d]X[H\d](?!(\(UR\))?\(\d*E\d*\))")
+
+# "CS" {base advancing to: 23H} {error: "(*E*)"}
+# negates "CS"
+caughtstealing_error_regex = re.compile(r"CS[23H]\(.*E.*\)")
+
+# "PO" ["CS"] {base: 123H} {error: "(*E*)"}
+pickoff_error_regex = re.compile(r"PO(CS)?[123H]\(.*E.*\)")
+
+# Runner put out in a force or double/triple play, e.g. the "1" in "64(1)3"
+runner_out_regex = re.compile(r"\(([B\d])\)")
+
+# Runner who was on the base before @base
+prev_base = {'2': '1', '3': '2', 'H': '3'}
+
+# Basic plays that can be followed by "+" and another event
+compound_plays = ('K', 'W', 'IW', 'I')
+
+ParsedEvent = namedtuple('ParsedEvent', [
+    'basic_play',   # basic play, e.g. "64(1)3" or "K"
+    'second_play',  # play following "+" (e.g. "SB2" in "K+SB2"), or None
+    'modifiers',    # tuple of modifiers without their "/", e.g. ("G", "DP")
+    'advances',     # tuple of Advance
+    'outs',         # number of outs recorded on the play
+    'runners_out',  # tuple of the runners put out, each "B", "1", "2" or "3"
+])
+
+Advance = namedtuple('Advance', [
+    'runner',  # "B", "1", "2" or "3"
+    'to',      # base the runner advanced or was thrown out at: "1", "2", "3" or "H"
+    'out',     # True if the runner was put out ("X" with no error)
+    'params',  # tuple of parenthesized parameters, e.g. ("UR", "6E2")
+])
+
+def split_outside_parens(s, sep):
+    """ Split @s on @sep, except where @sep is inside parentheses """
+    if '(' not in s:
+        return s.split(sep)
+    parts = ['']
+    depth = 0
+    for c in s:
+        if c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        if c == sep and depth == 0:
+            parts.append('')
+        else:
+            parts[-1] += c
+    return parts
+
+def _parse_advance(advance):
+    params = tuple(p.rstrip(')') for p in advance[3:].split('(')[1:])
+    out = bool(caughtadvancing_noerror_regex.match(advance))
+    return Advance(advance[:1], advance[2:3], out, params)
+
+def _basic_play_outs(play):
+    """
+    Return the runners put out by @play, a basic play (or the second play
+    after "+") other than a strikeout
+    """
+    # FLYOUT OR GROUNDOUT
+    if play[:1].isdigit():
+        if "E" in play:
+            return ()
+        if tripleplay_regex.match(play):
+            nouts = 3
+        elif doubleplay_regex.match(play):
+            nouts = 2
+        else:
+            nouts = 1
+        runners = runner_out_regex.findall(play)
+        if (len(runners) < nouts or not play.endswith(')')) and 'B' not in runners:
+            # The last fielder put out the batter, e.g. "64(1)3"
+            runners.append('B')
+        return tuple(runners[:nouts])
+
+    # CAUGHT STEALING
+    # A runner is caught stealing iff there was no error on the pickoff attempt
+    elif play.startswith('CS'):
+        if not caughtstealing_error_regex.match(play):
+            return (prev_base.get(play[2:3], ''),)
+
+    # PICKOFF
+    # A runner is picked off iff there was no error on the pickoff attempt
+    elif play.startswith('POCS'):
+        if not pickoff_error_regex.match(play):
+            return (prev_base.get(play[4:5], ''),)
+    elif play.startswith('PO'):
+        if not pickoff_error_regex.match(play):
+            return (play[2:3],)
+
+    # FC for fielder's choice would be accompanied by X if an out was made,
+    # which is counted with the advances
+    return ()
+
+def _parse_event(event):
+    # "!" marks an exceptional play and "?" some uncertainty. According to
+    # https://www.retrosheet.org/eventfile.htm, both can safely be ignored
+    event = event.replace('!', '').replace('?', '')
+
+    main, _, advances = event.partition('.')
+    advances = tuple(_parse_advance(a) for a in advances.split(';') if a)
+    basic_play, *modifiers = split_outside_parens(main, '/')
+
+    runners_out = []
+    second_play = None
+    first, plus, rest = basic_play.partition('+')
+    if plus and first in compound_plays:
+        basic_play, second_play = first, rest
+        if basic_play == 'K' and "B-" not in event:
+            # Strikeout + other event. Count the strikeout here,
+            # and the other event below
+            runners_out.append('B')
+        runners_out.extend(_basic_play_outs(second_play))
+
+    # STRIKEOUT
+    elif basic_play.startswith('K'):
+        # "B-" is Batter reached (i.e. passed ball)
+        # "BX" is Batter out advancing, which is counted with the advances
+        if "B-" not in event and "BX" not in event:
+            runners_out.append('B')
+
+    else:
+        runners_out.extend(_basic_play_outs(basic_play))
+
+    # Record an out for each runner caught advancing, indicated by
+    # X in the advances
+    runners_out.extend(a.runner for a in advances if a.out)
+
+    return ParsedEvent(
+        basic_play=basic_play,
+        second_play=second_play,
+        modifiers=tuple(modifiers),
+        advances=advances,
+        outs=len(runners_out),
+        runners_out=tuple(runners_out),
+    )
+
+@lru_cache(maxsize=1 << 16)
+def parse_event(event):
+    """
+    Parse the event subfield of a play record, returning a ParsedEvent.
+    Results are memoized on the raw event string.
+    """
+    return _parse_event(event)
@@ -0,0 +1,201 @@
+"""
+Vectorized version of the out and inning bookkeeping done by the Inning
+handler, for working on a whole game's or season's plays at once.
+
+Plays are given as parallel arrays: which game each play belongs to, the
+inning and home/away from the play record, and the number of outs recorded
+on the play. Outs come from classifying each distinct event string once
+(see EventCodes), so play_parser only runs once per distinct event, not
+once per play.
+
+PlayState then computes, for every play and with no Python loop over plays:
+  - the total outs in the game before and after the play
+  - the half inning the play is in
+  - the value of Inning.inning_as_float before and after the play
+  - whether the play agrees with the inning and home/away we'd expect from
+    the outs so far, the check that makes Inning raise WrongInningException
+and, per game, the total outs at the end of the game and whether the game
+was consistent throughout. Unlike Inning, which stops at the first
+inconsistent play, outs keep being counted past it, so the values for
+inconsistent games should not be relied on.
+"""
+from array import array
+
+import numpy as np
+
+from retrosheet.event import ID, Play
+from retrosheet.play_parser import parse_event
+
+def inning_as_float(tot_outs):
+    """
+    The value of Inning.__float__ after @tot_outs outs in a game. Works on
+    ints and on numpy arrays.
+    """
+    return (tot_outs // 6) + 1 + tot_outs / 3.0
+
+class EventCodes(object):
+    """
+    Numbers each distinct event string, and keeps the number of outs
+    recorded on each. Codes are assigned in the order events are first seen.
+    """
+    def __init__(self):
+        self.events = []
+        self.code_for = {}
+        self._outs = array('b')
+
+    def __len__(self):
+        return len(self.events)
+
+    def code(self, event):
+        """ Return the code for @event, assigning one if it's new """
+        code = self.code_for.get(event)
+        if code is None:
+            code = len(self.events)
+            self.code_for[event] = code
+            self.events.append(event)
+            self._outs.append(parse_event(event).outs)
+        return code
+
+    def classify(self, events):
+        """ Return an int32 array of the codes for each of @events """
+        return np.array([self.code(event) for event in events], dtype=np.int32)
+
+    @property
+    def outs(self):
+        """ int8 array of the outs recorded on each event, indexed by code """
+        return np.frombuffer(self._outs, dtype=np.int8)
+
+class PlayArrays(object):
+    """
+    The play records from a stream of Python lines (see retrosheet.event),
+    as parallel arrays with one entry per play
+    """
+    def __init__(self, pylines, codes=None):
+        """
+        @param pylines - iterable of lines from the event file as Python
+                         objects. Each ID record starts a new game.
+        @param codes - EventCodes to classify events with. Pass the same one
+                       to several PlayArrays to share codes between them.
+        """
+        self.codes = codes if codes is not None else EventCodes()
+        self.gameIDs = []
+        game_idx = array('i')
+        inning = array('i')
+        homeaway = array('b')
+        event_code = array('i')
+
+        code = self.codes.code
+        g = -1
+        for pyline in pylines:
+            typ = type(pyline)
+            if typ is Play:
+                game_idx.append(g)
+                inning.append(pyline.inning)
+                homeaway.append(pyline.homeaway)
+                event_code.append(code(pyline.event))
+            elif typ is ID:
+                g += 1
+                self.gameIDs.append(pyline.gameID)
+
+        if game_idx and game_idx[0] < 0:
+            raise ValueError("Play record before the first ID record")
+
+        self.game_idx = np.frombuffer(game_idx, dtype=np.int32)
+        self.inning = np.frombuffer(inning, dtype=np.int32)
+        self.homeaway = np.frombuffer(homeaway, dtype=np.int8)
+        self.event_code = np.frombuffer(event_code, dtype=np.int32)
+
+    @property
+    def ngames(self):
+        return len(self.gameIDs)
+
+    @property
+    def outs(self):
+        """ Outs recorded on each play """
+        return self.codes.outs[self.event_code]
+
+    def play_state(self):
+        """ Return the PlayState of these plays """
+        return PlayState(self.game_idx, self.inning, self.homeaway, self.outs, self.ngames)
+
+class PlayState(object):
+    def __init__(self, game_idx, inning, homeaway, outs, ngames=None):
+        """
+        @param game_idx - game each play belongs to. Plays from the same game
+                          must be contiguous and in order.
+        @param inning - inning of each play, from the play record
+        @param homeaway - team at bat for each play, from the play record
+        @param outs - outs recorded on each play
+        @param ngames - number of games, including any without plays.
+                        Defaults to max(game_idx) + 1.
+        """
+        game_idx = np.asarray(game_idx, dtype=np.int64)
+        inning = np.asarray(inning)
+        homeaway = np.asarray(homeaway)
+        outs = np.asarray(outs, dtype=np.int64)
+        nplays = len(game_idx)
+        if ngames is None:
+            ngames = int(game_idx.max()) + 1 if nplays else 0
+        self.ngames = ngames
+        self.game_idx = game_idx
+
+        # First and last play of each run of plays from the same game. With
+        # no plays there are no runs, and every game ends with 0 outs.
+        new_game = np.ones(nplays, dtype=bool)
+        new_game[1:] = game_idx[1:] != game_idx[:-1]
+        starts = np.flatnonzero(new_game)
+        if nplays:
+            ends = np.append(starts[1:], nplays) - 1
+        else:
+            ends = starts
+
+        # Total outs after each play: a running sum over all plays, minus
+        # the running sum before each play's game started
+        cumulative = np.cumsum(outs)
+        before_game = np.repeat(cumulative[starts] - outs[starts], ends - starts + 1)
+        self.tot_outs_after = cumulative - before_game
+        self.tot_outs_before = self.tot_outs_after - outs
+
+        # Same as Inning.inning and Inning.at_bat before each play
+        expected_inning = self.tot_outs_before // 6 + 1
+        expected_homeaway = (self.tot_outs_before % 6) // 3
+        self.half_inning = self.tot_outs_before // 3
+        self.consistent = (inning == expected_inning) & (homeaway == expected_homeaway)
+
+        self.game_outs = np.zeros(ngames, dtype=np.int64)
+        self.game_outs[game_idx[ends]] = self.tot_outs_after[ends]
+
+        # Index of the first inconsistent play in each game, or -1
+        self.first_inconsistent = np.full(ngames, -1, dtype=np.int64)
+        bad = np.flatnonzero(~self.consistent)
+        bad_games, first = np.unique(game_idx[bad], return_index=True)
+        self.first_inconsistent[bad_games] = bad[first]
+        self.game_consistent = self.first_inconsistent < 0
+
+    @property
+    def inning_before(self):
+        """ Inning.inning_as_float before each play """
+        return inning_as_float(self.tot_outs_before)
+
+    @property
+    def inning_after(self):
+        """ Inning.inning_as_float after each play """
+        return inning_as_float(self.tot_outs_after)
+
+    @property
+    def game_end_inning(self):
+        """ Inning.inning_as_float at the end of each game """
+        return inning_as_float(self.game_outs)
+
+    @property
+    def half_starts(self):
+        """ Indexes of the plays that start a game or a half inning """
+        boundary = np.ones(len(self.game_idx), dtype=bool)
+        boundary[1:] = (self.game_idx[1:] != self.game_idx[:-1]) | \
+                       (self.half_inning[1:] != self.half_inning[:-1])
+        return np.flatnonzero(boundary)
+
+    @property
+    def inconsistent_games(self):
+        """ Indexes of the games where we lost track of the inning """
+        return np.flatnonzero(~self.game_consistent)
@@ -0,0 +1,139 @@
+"""
+Opt-in instrumentation for Analysis runs. Records how long each stage of
+the pipeline takes (reading/splitting lines, turning them into Python
+objects, handlers, triggers), how often and for how long each handler runs
+on each record type, and logs progress as the run goes.
+
+None of this is used unless the Analysis is created with profile=True.
+"""
+import time
+import logging as log
+from collections import OrderedDict
+
+class Profiler(object):
+    def __init__(self, progress_interval=10.0):
+        """
+        @param progress_interval - log lines/sec and games/sec at most this
+                                   often (in seconds)
+        """
+        self.progress_interval = progress_interval
+
+        # stage name -> cumulative seconds
+        self.stage_time = OrderedDict()
+
+        # number of lines of each record type
+        self.lines = OrderedDict()
+        self.games = 0
+
+        # (handler name, record type name) -> number of calls, cumulative seconds
+        self.handler_calls = OrderedDict()
+        self.handler_time = OrderedDict()
+
+        # trigger name -> number of calls, cumulative seconds
+        self.trigger_calls = OrderedDict()
+        self.trigger_time = OrderedDict()
+
+        self.start_time = None
+        self.end_time = None
+        self._last_progress = None
+
+    def start(self):
+        self.start_time = self._last_progress = time.perf_counter()
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        return end - self.start_time
+
+    @property
+    def total_lines(self):
+        return sum(self.lines.values())
+
+    def add_stage(self, stage, seconds):
+        self.stage_time[stage] = self.stage_time.get(stage, 0.0) + seconds
+
+    def count_line(self, typename, is_game):
+        """ Count one line of the stream, and log progress if it's time to """
+        self.lines[typename] = self.lines.get(typename, 0) + 1
+        if is_game:
+            self.games += 1
+            now = time.perf_counter()
+            if now - self._last_progress >= self.progress_interval:
+                self._last_progress = now
+                log.info("{} lines ({:.0f}/sec), {} games ({:.1f}/sec)".format(
+                    self.total_lines, self.total_lines / self.elapsed,
+                    self.games, self.games / self.elapsed,
+                ))
+
+    def time_handler(self, handler_name, typename, fcn):
+        """
+        Wrap the handling function @fcn so that its calls are counted and timed
+        """
+        key = (handler_name, typename)
+        self.handler_calls.setdefault(key, 0)
+        self.handler_time.setdefault(key, 0.0)
+        calls, times = self.handler_calls, self.handler_time
+        perf_counter = time.perf_counter
+        def timed(pyline):
+            t0 = perf_counter()
+            try:
+                return fcn(pyline)
+            finally:
+                times[key] += perf_counter() - t0
+                calls[key] += 1
+        return timed
+
+    def time_trigger(self, trigger_name, trigger, handlers):
+        """ Fire @trigger on @handlers, counting and timing it """
+        t0 = time.perf_counter()
+        try:
+            trigger(handlers)
+        finally:
+            self.trigger_time[trigger_name] = \
+                self.trigger_time.get(trigger_name, 0.0) + time.perf_counter() - t0
+            self.trigger_calls[trigger_name] = self.trigger_calls.get(trigger_name, 0) + 1
+
+    def handler_stats(self):
+        """ Return the handler call counts and times, to be merged into another Profiler """
+        return self.handler_calls, self.handler_time
+
+    def merge_handler_stats(self, stats):
+        calls, times = stats
+        for key, n in calls.items():
+            self.handler_calls[key] = self.handler_calls.get(key, 0) + n
+        for key, t in times.items():
+            self.handler_time[key] = self.handler_time.get(key, 0.0) + t
+
+    def summary(self):
+        """ Return a human-readable summary of everything recorded """
+        elapsed = self.elapsed
+        out = ["Analysis profile: {:.2f} sec, {} lines ({:.0f}/sec), {} games ({:.1f}/sec)".format(
+            elapsed, self.total_lines, self.total_lines / elapsed if elapsed else 0,
+            self.games, self.games / elapsed if elapsed else 0,
+        )]
+
+        out.append("  Lines by record type:")
+        for typename, n in self.lines.items():
+            out.append("    {:<10} {:>12}".format(typename, n))
+
+        out.append("  Stages (sec):")
+        for stage, t in self.stage_time.items():
+            out.append("    {:<24} {:>10.3f}".format(stage, t))
+
+        out.append("  Handlers (calls, sec, usec/call):")
+        for key, t in sorted(self.handler_time.items(), key=lambda kv: -kv[1]):
+            n = self.handler_calls[key]
+            if n:
+                out.append("    {:<24} {:<10} {:>12} {:>10.3f} {:>10.2f}".format(
+                    key[0], key[1], n, t, 1e6 * t / n))
+
+        if self.trigger_calls:
+            out.append("  Triggers (calls, sec, usec/call):")
+            for name, n in self.trigger_calls.items():
+                t = self.trigger_time[name]
+                out.append("    {:<24} {:>12} {:>10.3f} {:>10.2f}".format(name, n, t, 1e6 * t / n))
+
+        return '\n'.join(out)
@@ -0,0 +1,126 @@
+"""
+Fast reader for event files, which splits each line into fields the way
+csv.reader would, but without going through FileInput and the general csv
+machinery for every line.
+
+Files are read in large binary chunks, cut at the last newline in each
+chunk and decoded in one go. The event format only uses quotes in names and
+comments, so lines without a quote are split with str.split, and only the
+few lines with quotes go through csv.
+
+Lines whose record type isn't wanted are skipped without being split: a
+regular expression picks out the wanted lines of each chunk, so the lines
+that are skipped are never looked at in Python.
+
+Event files in zip archives or gzipped (see retrosheet.archives) are read
+whole, by a pool of threads that decompress the next few of them while the
+lines of the current one are being split and parsed.
+"""
+import re
+import sys
+import csv
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from retrosheet import archives
+
+# Bytes read from an event file at a time
+CHUNK_SIZE = 1 << 20
+
+# Threads decompressing archived event files
+DECOMPRESS_THREADS = 4
+
+@lru_cache(maxsize=64)
+def _lines_of_types(record_types):
+    """ Regular expression matching the lines whose record type is one of @record_types """
+    return re.compile(r'^(?:{})(?:,[^\n]*)?$'.format(
+        '|'.join(re.escape(rtype) for rtype in sorted(record_types))), re.M)
+
+def split_lines(text, wanted=None):
+    """
+    Yield each line of @text split into fields, skipping empty lines
+    @param wanted - set of record types (e.g. {'id', 'play'}) to yield. Lines
+                    of other types are skipped. If None, yield every line.
+    """
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if wanted is None:
+        lines = text.split('\n')
+    elif not wanted:
+        return
+    else:
+        lines = _lines_of_types(frozenset(wanted)).findall(text)
+    for line in lines:
+        if not line:
+            continue
+        if '"' in line:
+            yield next(csv.reader([line]))
+        else:
+            yield line.split(',')
+
+def _read_chunks(infile, chunk_size):
+    """ Yield the contents of the binary file @infile as text, a chunk of whole lines at a time """
+    leftover = b''
+    while True:
+        chunk = infile.read(chunk_size)
+        if not chunk:
+            break
+        chunk = leftover + chunk
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            # No complete line yet
+            leftover = chunk
+            continue
+        leftover = chunk[end:]
+        yield chunk[:end].decode('utf-8')
+    if leftover:
+        yield leftover.decode('utf-8')
+
+def _archived_texts(names, reader, pool, threads):
+    """
+    Yield the text of each of the archived event files @names in order,
+    keeping up to twice @threads of them being decompressed ahead
+    """
+    names = iter(names)
+    pending = deque()
+    while True:
+        while len(pending) < 2 * threads:
+            name = next(names, None)
+            if name is None:
+                break
+            pending.append(pool.submit(reader.read, name))
+        if not pending:
+            return
+        yield pending.popleft().result()
+
+def read_event_files(filenames, wanted=None, chunk_size=CHUNK_SIZE, threads=DECOMPRESS_THREADS):
+    """
+    Yield each line of each of @filenames split into fields, as csv.reader
+    would. A filename of '-' means STDIN.
+    @param filenames - list of event files, as returned by archives.expand
+    @param wanted - see split_lines
+    @param threads - number of threads decompressing archived event files.
+                     If 0, they are decompressed as they are reached.
+    """
+    archived = [filename for filename in filenames
+                if filename != '-' and archives.is_archived(filename)]
+    reader = archives.ArchiveReader()
+    pool = ThreadPoolExecutor(threads) if archived and threads > 0 else None
+    texts = _archived_texts(archived, reader, pool, threads) if pool else None
+    try:
+        for filename in filenames:
+            if filename == '-':
+                for text in _read_chunks(sys.stdin.buffer, chunk_size):
+                    yield from split_lines(text, wanted)
+            elif archived and archives.is_archived(filename):
+                text = next(texts) if pool else reader.read(filename)
+                yield from split_lines(text, wanted)
+            else:
+                with open(filename, 'rb') as infile:
+                    for text in _read_chunks(infile, chunk_size):
+                        yield from split_lines(text, wanted)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        reader.close()
@@ -0,0 +1,130 @@
+"""
+Cache of per-game results, so that rerunning an analysis over games it has
+already seen doesn't have to parse them or run the handlers again.
+
+A CachedTrigger splits a trigger in two: compute(handlers) works out what
+the trigger needs from the handlers at the end of a game (e.g. the innings
+played by each player and the winning team) and returns it, and use(result)
+does whatever the trigger does with that (e.g. append it to arrays). The
+results of every cached trigger for a game are stored together in a
+GameResultCache, keyed by a hash of the game's text in the Event file and
+the versions of the handlers and cached triggers. The next time the same
+game comes up, Analysis calls use() with the stored results and skips the
+game entirely.
+
+Each game's results are pickled to their own file, in a subdirectory named
+after the first two characters of the key. Hits update the file's mtime,
+and once the cache grows past its size limit, the least recently used
+entries are removed.
+"""
+import os
+import pickle
+import hashlib
+import logging as log
+
+class CachedTrigger(object):
+    def __init__(self, compute, use, version=1):
+        """
+        @param compute - function called with the dict of handlers when the
+                         trigger fires. Returns a picklable result for the game.
+        @param use - function called with the result, whether it was just
+                     computed or came from the cache
+        @param version - change this when @compute changes, so that results
+                         computed by the old version aren't used
+        """
+        self.compute = compute
+        self.use = use
+        self.version = version
+
+        # Result of the last time the trigger fired (see Analysis._run_indexed)
+        self.result = None
+
+    def __call__(self, handlers):
+        self.result = self.compute(handlers)
+        self.use(self.result)
+
+class GameResultCache(object):
+    def __init__(self, cache_dir, max_bytes=1 << 30):
+        """
+        @param cache_dir - directory to store results in. Created if it
+                           doesn't exist.
+        @param max_bytes - once the cache is bigger than this, least recently
+                           used results are removed until it is 10% smaller
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # path: size of every entry, and their total. Found by scanning
+        # cache_dir the first time something is stored.
+        self._sizes = None
+        self._total = 0
+
+    @staticmethod
+    def key(text, versions):
+        """
+        Return the key for a game
+        @param text - the game's text in the Event file
+        @param versions - anything identifying the code that computes the
+                          results (see Analysis._result_versions). Its repr()
+                          goes into the key.
+        """
+        sha = hashlib.sha1(repr(versions).encode('utf-8'))
+        sha.update(text.encode('utf-8'))
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.pkl')
+
+    def get(self, key):
+        """ Return the results stored under @key, or None if there aren't any """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as infile:
+                results = pickle.load(infile)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError):
+            log.warning("Ignoring unreadable cached result {}".format(path))
+            return None
+        os.utime(path)
+        return results
+
+    def put(self, key, results):
+        """ Store @results under @key, evicting old entries if the cache is full """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as outfile:
+            pickle.dump(results, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        if self._sizes is None:
+            self._scan()
+        size = os.path.getsize(path)
+        self._total += size - self._sizes.get(path, 0)
+        self._sizes[path] = size
+        if self._total > self.max_bytes:
+            self._evict(int(self.max_bytes * 0.9))
+
+    def _scan(self):
+        self._sizes = {}
+        for subdir in os.scandir(self.cache_dir):
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir.path):
+                if entry.name.endswith('.pkl'):
+                    self._sizes[entry.path] = entry.stat().st_size
+        self._total = sum(self._sizes.values())
+
+    def _evict(self, target_bytes):
+        """ Remove least recently used entries until the cache holds at most @target_bytes """
+        by_age = sorted(self._sizes, key=lambda path: os.stat(path).st_mtime_ns)
+        nevicted = 0
+        for path in by_age:
+            if self._total <= target_bytes:
+                break
+            os.remove(path)
+            self._total -= self._sizes.pop(path)
+            nevicted += 1
+        log.info("Evicted {} cached game results".format(nevicted))
@@ -0,0 +1,122 @@
+"""
+Running an analysis over many seasons at once. The Event files are split
+into shards (one per season, or one per team file), each shard is run by
+its own Analysis in a separate process, and the results come back in shard
+order so they can be merged (e.g. with Handler.merge) as if one Analysis
+had read every file in turn.
+
+Shards are handed out largest first (by the size of their Event files), so
+that a big shard started last doesn't leave the other processes idle at
+the end.
+
+Player codes (see retrosheet.ids) of players in the global player index
+(utils.players) are the same in every shard, so the columns of matrices
+built by different shards line up. Each process numbers the players
+missing from the index itself, as they turn up, so run_shards checks that
+every shard numbered them the same way as the shards before it, and
+raises ValueError if not: the same code would mean different players in
+different shards' results. Add such players to the index to shard over
+them.
+"""
+import os
+import re
+from collections import OrderedDict
+from multiprocessing import Pool
+
+from retrosheet import archives, ids
+from retrosheet.analysis import Analysis
+
+# Retrosheet Event files are named like 2019NYA.EVA: season, then home team
+_season_regex = re.compile(r'^(\d{4})')
+
+def season_of(filename):
+    """ Return the season of the Event file @filename, from its name, or None """
+    match = _season_regex.match(os.path.basename(filename))
+    return int(match.group(1)) if match else None
+
+def shard_by_season(filenames):
+    """
+    Return a list of shards, one per season in order, each a list of the
+    Event files from that season. Zip archives are expanded first (see
+    archives.expand), so an archive of several seasons is split up too.
+    Files whose names don't start with a season go in a shard of their own
+    at the end.
+    """
+    seasons = OrderedDict()
+    unknown = []
+    for filename in archives.expand(filenames):
+        season = season_of(filename)
+        if season is None:
+            unknown.append(filename)
+        else:
+            seasons.setdefault(season, []).append(filename)
+    return [seasons[season] for season in sorted(seasons)] + ([unknown] if unknown else [])
+
+def shard_by_file(filenames):
+    """ Return a list of shards, one per Event file (i.e. per team per season) """
+    return [[filename] for filename in archives.expand(filenames)]
+
+def shard_size(shard):
+    """ Total size in bytes of the Event files in @shard (see archives.size) """
+    return sum(archives.size(filename) for filename in shard)
+
+def _run_shard(task):
+    """
+    Run one shard in a worker process. Returns the shard's index, its
+    handlers at the end of the run, what the collect function returned
+    by @setup returns, and the players the process numbered itself (see
+    ids.IDCodes.unknown).
+    """
+    index, filenames, setup, analysis_kwargs, run_kwargs = task
+    analysis = Analysis(filenames=filenames, **analysis_kwargs)
+    collect = setup(analysis)
+    analysis.run(**run_kwargs)
+    return index, analysis.handlers, collect() if collect else None, ids.players.unknown()
+
+def _restore_unknown_players(index, unknown):
+    """
+    Give the players shard @index numbered itself the same codes here, or
+    raise ValueError if an earlier shard gave any of those codes to
+    another player
+    """
+    try:
+        ids.players.restore(unknown)
+    except ValueError as e:
+        raise ValueError("Shard {} numbered the players missing from the player index "
+                         "differently from an earlier shard ({}). Add them to the index "
+                         "so that their codes are the same in every shard.".format(index, e))
+
+def largest_first(shards):
+    """ Return the indexes of @shards, largest first (see shard_size) """
+    return sorted(range(len(shards)), key=lambda i: shard_size(shards[i]), reverse=True)
+
+def run_shards(shards, setup, nprocs=None, analysis_kwargs=None, **run_kwargs):
+    """
+    Run an Analysis over each of @shards in a pool of processes, and yield
+    (shard index, handlers, result) for each shard in shard order, as soon
+    as it and every shard before it have finished. Codes of players missing
+    from the player index are checked to mean the same in every shard, and
+    can be decoded here with ids.players.
+    @param shards - list of lists of Event files (e.g. from shard_by_season)
+    @param setup - function called with a fresh Analysis for each shard, which
+                   registers its handlers and triggers, and returns a function
+                   that is called after the run and returns the shard's result
+                   (or None). Must be picklable, i.e. defined at module level.
+                   Handlers and results must be picklable too.
+    @param nprocs - number of processes. Defaults to the number of CPUs.
+    @param analysis_kwargs - extra arguments for each Analysis
+    Other keyword arguments go to each Analysis.run.
+    """
+    analysis_kwargs = analysis_kwargs or {}
+    tasks = [(i, shards[i], setup, analysis_kwargs, run_kwargs) for i in largest_first(shards)]
+
+    finished = {}
+    next_index = 0
+    with Pool(nprocs) as pool:
+        for index, handlers, result, unknown in pool.imap_unordered(_run_shard, tasks, chunksize=1):
+            finished[index] = (handlers, result, unknown)
+            while next_index in finished:
+                handlers, result, unknown = finished.pop(next_index)
+                _restore_unknown_players(next_index, unknown)
+                yield next_index, handlers, result
+                next_index += 1
@@ -0,0 +1,217 @@
+"""
+Sparse datasets on disk, written a row at a time and read back in batches,
+so that neither building nor using a dataset needs it all in memory.
+
+A dataset is an HDF5 file holding a sparse matrix x in CSR form, with one
+label y per row:
+  - data, indices: the nonzero values of x and their columns, row by row
+  - indptr: where each row starts in data and indices, plus where the
+    last row ends
+  - y: the label of each row
+and the number of columns of x in the 'ncols' attribute. Every dataset is
+resizable and chunked, so rows can be appended as they are computed.
+
+Rows are buffered in memory and written every buffer_rows rows. indptr is
+always written last, so the rows it covers are complete even if the
+writer is interrupted; anything past them is ignored when reading, and
+dropped when the writer reopens the file.
+"""
+import os
+from array import array
+
+import numpy as np
+import h5py
+import scipy.sparse
+
+from retrosheet.handlers.innings_played import append_csr_row
+
+# Elements per HDF5 chunk
+CHUNK_SIZE = 1 << 16
+
+class SparseDatasetWriter(object):
+    def __init__(self, path, ncols, column_for=None, buffer_rows=4096, append=False):
+        """
+        @param path - HDF5 file to write
+        @param ncols - number of columns of x
+        @param column_for - dict mapping each key of the rows passed to
+                            add_row to its column (e.g. utils.players). If
+                            None, the keys are the columns.
+        @param buffer_rows - number of rows to keep in memory before
+                             writing them out
+        @param append - if True and @path exists, add rows after the ones
+                        already in it instead of starting over
+        """
+        self.path = path
+        self.column_for = column_for
+        self.buffer_rows = buffer_rows
+
+        # Rows not written yet
+        self._data = array('d')
+        self._indices = array('q')
+        self._indptr = array('q')
+        self._y = array('d')
+
+        if append and os.path.exists(path):
+            self.file = h5py.File(path, 'a')
+            if self.file.attrs['ncols'] != ncols:
+                raise ValueError("{} has {} columns, not {}".format(
+                    path, self.file.attrs['ncols'], ncols))
+            self.truncate(len(self.file['indptr']) - 1)
+        else:
+            self.file = h5py.File(path, 'w')
+            self.file.attrs['ncols'] = ncols
+            for name, dtype in [('data', 'f8'), ('indices', 'i8'), ('y', 'f8')]:
+                self.file.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype,
+                                         chunks=(CHUNK_SIZE,))
+            self.file.create_dataset('indptr', data=np.zeros(1, dtype=np.int64),
+                                     maxshape=(None,), chunks=(CHUNK_SIZE,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def nrows(self):
+        """ Number of rows added, including any not written yet """
+        return len(self.file['indptr']) - 1 + len(self._indptr)
+
+    def add_row(self, row, label):
+        """
+        Append one row
+        @param row - dict mapping each key (see column_for) to its value.
+                     An empty batting order slot (NO_PLAYER, or '' in rows
+                     keyed by playerID) is ignored.
+        @param label - the row's y
+        """
+        append_csr_row(self._data, self._indices, self._indptr, row, self.column_for)
+        self._y.append(label)
+        if len(self._indptr) >= self.buffer_rows:
+            self.flush()
+
+    def add_rows(self, x, y):
+        """
+        Append a block of rows, e.g. built by another process
+        @param x - scipy.sparse matrix whose columns are those of the dataset
+        @param y - labels of the rows of @x
+        """
+        x = x.tocsr()
+        if x.shape[1] != self.file.attrs['ncols'] or x.shape[0] != len(y):
+            raise ValueError("Can't add a {} block with {} labels to a dataset with {} columns".format(
+                x.shape, len(y), self.file.attrs['ncols']))
+        self.flush()
+        f = self.file
+        offset = f['indptr'][-1]
+        self._append(f['data'], x.data.astype(np.float64))
+        self._append(f['indices'], x.indices.astype(np.int64))
+        self._append(f['y'], np.asarray(y, dtype=np.float64))
+        self._append(f['indptr'], x.indptr[1:].astype(np.int64) + offset)
+        f.flush()
+
+    @staticmethod
+    def _append(dataset, values):
+        start = len(dataset)
+        dataset.resize((start + len(values),))
+        dataset[start:] = values
+
+    def flush(self):
+        """ Write out the buffered rows """
+        if not self._indptr:
+            return
+        f = self.file
+        indices = np.frombuffer(self._indices, dtype=np.int64)
+        if len(indices) and indices.max() >= f.attrs['ncols']:
+            raise ValueError("Column {} is past the last of the {} columns of {}".format(
+                indices.max(), f.attrs['ncols'], self.path))
+        offset = f['indptr'][-1]
+        self._append(f['data'], np.frombuffer(self._data, dtype=np.float64))
+        self._append(f['indices'], indices)
+        self._append(f['y'], np.frombuffer(self._y, dtype=np.float64))
+        # Last, so that the rows it points to are all there
+        self._append(f['indptr'], np.frombuffer(self._indptr, dtype=np.int64) + offset)
+        f.flush()
+
+        self._data = array('d')
+        self._indices = array('q')
+        self._indptr = array('q')
+        self._y = array('d')
+
+    def truncate(self, nrows):
+        """ Drop every row after the first @nrows, e.g. to go back to a checkpoint """
+        self.flush()
+        f = self.file
+        if nrows > len(f['indptr']) - 1:
+            raise ValueError("Can't truncate {} rows to {}".format(len(f['indptr']) - 1, nrows))
+        nnz = f['indptr'][nrows]
+        f['indptr'].resize((nrows + 1,))
+        f['y'].resize((nrows,))
+        f['data'].resize((nnz,))
+        f['indices'].resize((nnz,))
+        f.flush()
+
+    def close(self):
+        if self.file:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+class SparseDatasetReader(object):
+    def __init__(self, path):
+        """ @param path - HDF5 file written by SparseDatasetWriter """
+        self.file = h5py.File(path, 'r')
+        self.indptr = self.file['indptr'][:]
+        self.ncols = int(self.file.attrs['ncols'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    @property
+    def nrows(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self):
+        return self.nrows, self.ncols
+
+    def rows(self, start, stop, columns=None):
+        """
+        Return rows @start to @stop (not included) of x as a
+        scipy.sparse.csr_matrix, and their labels
+        @param columns - if passed, only keep these columns, in this order
+        """
+        stop = min(stop, self.nrows)
+        begin, end = self.indptr[start], self.indptr[stop]
+        x = scipy.sparse.csr_matrix(
+            (self.file['data'][begin:end], self.file['indices'][begin:end],
+             self.indptr[start:stop + 1] - begin),
+            shape=(stop - start, self.ncols),
+        )
+        if columns is not None:
+            x = x[:, columns]
+        return x, self.file['y'][start:stop]
+
+    def batches(self, batch_size, columns=None):
+        """ Yield (x, y) for each batch of @batch_size rows in turn (see rows()) """
+        for start in range(0, self.nrows, batch_size):
+            yield self.rows(start, start + batch_size, columns)
+
+    def to_csr(self, columns=None, batch_size=1 << 16):
+        """
+        Return all of x as one scipy.sparse.csr_matrix, and y, reading them
+        in batches (see rows())
+        """
+        xs, ys = [], []
+        for x, y in self.batches(batch_size, columns):
+            xs.append(x)
+            ys.append(y)
+        if not xs:
+            ncols = self.ncols if columns is None else len(columns)
+            return scipy.sparse.csr_matrix((0, ncols)), np.zeros(0)
+        return scipy.sparse.vstack(xs, format='csr'), np.concatenate(ys)
@@ -1,27 +1,185 @@
+import os
 import csv
+import hashlib
 import logging as log
+from collections.abc import Mapping
 
 import numpy as np
 
-playerID_to_idx = {}
-log.info("Loading playerIDs.csv...")
-with open('playerIDs.csv', 'r') as infile:
-    reader = csv.DictReader(infile)
-    i = 0
-    for person in reader:
-        if person['Play debut']:
-            playerID_to_idx[person['ID']] = i
-            i += 1
-log.info("Done.")
+from retrosheet.checkpoint import file_stamp
+
+# playerIDs.csv ships at the top level of the repository
+DEFAULT_PLAYER_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'playerIDs.csv'
+)
+
+# Where player indexes are kept, since the package directory may not be writable
+DEFAULT_INDEX_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(os.path.join('~', '.cache')),
+    'simple-retrosheet',
+)
+
+# 2: text is stored as bytes, and the index is kept in DEFAULT_INDEX_DIR
+INDEX_VERSION = 2
+
+class PlayerRegistry(Mapping):
+    """
+    Numbers every player in playerIDs.csv who made a playing debut, in the
+    order they appear in the file. Acts as a read-only dict from playerID to
+    that number (which is the player's column in the X matrix), and can look
+    up a player's ID, name and debut from their number.
+
+    Nothing is read until the registry is first used. The first time a
+    playerIDs file is loaded, a compact index of it is written to
+    @index_dir, holding the debuted players' IDs and debut dates as bytes,
+    their names as one block of UTF-8 with the offset of each, and the order
+    that sorts the IDs. Later loads read only that index. If the index
+    can't be written, the csv is read every time instead. Looking up many
+    players at once with indexes() is a binary search over the sorted IDs;
+    single lookups go through a dict built from the index the first time
+    one is made. The index is rebuilt whenever the csv's mtime or size
+    changes, or it can't be read.
+    """
+    def __init__(self, path=DEFAULT_PLAYER_FILE, index_dir=DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        self.set_path(path)
+
+    def set_path(self, path):
+        """
+        Use the players in @path from now on. Anything already loaded
+        is discarded. Raises RuntimeError if the player codes (see
+        retrosheet.ids) have already been taken from this registry, since
+        they would no longer be the players' numbers.
+        """
+        from retrosheet import ids
+        if ids.players.source is self and os.path.abspath(path) != os.path.abspath(self.path):
+            raise RuntimeError("Can't use the players in {}: player codes have already been "
+                               "given out from {}".format(path, self.path))
+        self.path = path
+        self._ids = None
+        self._idx_for = None
+
+    @property
+    def index_path(self):
+        """ The index of the csv, named after it and the hash of its absolute path """
+        path = os.path.abspath(self.path)
+        digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.index_dir, '{}.{}.idx.npz'.format(os.path.basename(path), digest))
+
+    def _stamp(self):
+        return np.array([INDEX_VERSION] + file_stamp(self.path), dtype=np.int64)
+
+    def _build_index(self):
+        log.info("Indexing {}...".format(self.path))
+        ids, names, debuts = [], [], []
+        with open(self.path, 'r', newline='') as infile:
+            for person in csv.DictReader(infile):
+                if person['Play debut']:
+                    ids.append(person['ID'])
+                    names.append('{} {}'.format(person['First'], person['Last']).encode('utf-8'))
+                    debuts.append(person['Play debut'])
+        ids = np.array(ids, dtype=bytes)
+        arrays = {
+            'stamp': self._stamp(),
+            'ids': ids,
+            'names': np.frombuffer(b''.join(names), dtype=np.uint8),
+            'name_offsets': np.cumsum([0] + [len(name) for name in names], dtype=np.int64),
+            'debuts': np.array(debuts, dtype=bytes),
+            'sort_order': np.argsort(ids, kind='stable'),
+        }
+        # Written under a name of its own and then moved into place, so that
+        # processes loading the registry at once never see a partial index
+        tmp_path = self.index_path + '.tmp{}'.format(os.getpid())
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as outfile:
+                np.savez_compressed(outfile, **arrays)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            log.warning("Could not save player index {}, so {} will be read again next time: {}".format(
+                self.index_path, self.path, e))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        log.info("Done.")
+        return arrays
+
+    def _load(self):
+        arrays = None
+        try:
+            with np.load(self.index_path) as index:
+                if np.array_equal(index['stamp'], self._stamp()):
+                    arrays = {k: index[k] for k in index.files}
+        except Exception as e:
+            # Missing, or unreadable (e.g. cut short when an older version
+            # wrote it in place): start over
+            if os.path.exists(self.index_path):
+                log.warning("Rebuilding unreadable player index {}: {}".format(self.index_path, e))
+        if arrays is None:
+            arrays = self._build_index()
+
+        self._names = arrays['names'].tobytes()
+        self._name_offsets = arrays['name_offsets']
+        self._debuts = arrays['debuts']
+        self._sort_order = arrays['sort_order']
+        self._sorted_ids = arrays['ids'][self._sort_order]
+        self._ids = arrays['ids'].astype(str)
+
+    def _loaded(self):
+        if self._ids is None:
+            self._load()
+        return self
+
+    def indexes(self, playerIDs):
+        """
+        Return an array of the index of each player in @playerIDs.
+        Raises KeyError if any of them are unknown.
+        """
+        self._loaded()
+        playerIDs = np.asarray(playerIDs, dtype=self._sorted_ids.dtype)
+        pos = np.searchsorted(self._sorted_ids, playerIDs)
+        pos[pos == len(self._sorted_ids)] = 0
+        unknown = self._sorted_ids[pos] != playerIDs
+        if unknown.any():
+            raise KeyError(playerIDs[unknown][0])
+        return self._sort_order[pos]
+
+    def __getitem__(self, playerID):
+        if self._idx_for is None:
+            ids = self._loaded()._ids.tolist()
+            self._idx_for = dict(zip(ids, range(len(ids))))
+        return self._idx_for[playerID]
+
+    def __len__(self):
+        return len(self._loaded()._ids)
+
+    def __iter__(self):
+        return iter(self._loaded()._ids.tolist())
+
+    def playerID(self, idx):
+        """ ID of the player with index @idx """
+        return str(self._loaded()._ids[idx])
+
+    def name(self, idx):
+        """ "First Last" name of the player with index @idx """
+        self._loaded()
+        start, end = self._name_offsets[idx], self._name_offsets[idx + 1]
+        return self._names[start:end].decode('utf-8')
+
+    def debut(self, idx):
+        """ Playing debut (MM/DD/YYYY) of the player with index @idx """
+        return self._loaded()._debuts[idx].decode('ascii')
+
+players = PlayerRegistry()
+
+# Older name for the registry, which can be used as a playerID -> index dict
+playerID_to_idx = players
 
 def to_row(inn_played):
     """
     Given a playerID to innings played dict, return a row of the X matrix
     """
-    row = np.zeros(shape=len(playerID_to_idx))
+    row = np.zeros(shape=len(players))
     for playerID, ip in inn_played.items():
         if playerID:
-            row[playerID_to_idx[playerID]] = ip
+            row[players[playerID]] = ip
     return row
-
-
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# For the synthetic event file generator
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+from generate_events import generate
+
+from retrosheet import Analysis, ids
+from retrosheet.handlers import ActivePlayers, InningsPlayed, Winner, GameTrigger
+
+@pytest.fixture(scope='session')
+def event_files(tmp_path_factory):
+    """ Three synthetic event files of 30 games each """
+    return generate(str(tmp_path_factory.mktemp('events')), 3, 30, seed=1, hard_play_rate=0.05)
+
+def game_result(handlers):
+    """
+    What a regressionWAR-like analysis keeps from each game: the game ID and
+    either 'err' or the innings played by each player ID on each team and
+    the winner
+    """
+    gameID = handlers['trigger'].prev_gameID
+    errored = [handler for handler in handlers.values() if handler.error]
+    if errored:
+        for handler in errored:
+            handler.resolve_error()
+        result = (gameID, 'err')
+    else:
+        inn_played = handlers['inn_played']
+        result = (gameID,
+                  sorted((ids.players.id(p), ip) for p, ip in inn_played.away.inn_played.items()),
+                  sorted((ids.players.id(p), ip) for p, ip in inn_played.home.inn_played.items()),
+                  handlers['winner'].get_winning_team())
+    for name in ['inn_played', 'winner']:
+        handlers[name].reset()
+    return result
+
+@pytest.fixture
+def make_analysis():
+    """
+    Return a function that makes an Analysis of the event files it is
+    passed, with the handlers of regressionWAR, and the list that the
+    result of each game (see game_result) is appended to
+    """
+    def make(filenames, **kwargs):
+        analysis = Analysis(filenames=filenames, **kwargs)
+        analysis.register_handler('all_players', ActivePlayers())
+        analysis.register_handler('inn_played', InningsPlayed())
+        analysis.register_handler('winner', Winner())
+        analysis.register_handler('trigger', GameTrigger('endofgame'))
+        results = []
+        analysis.register_cached_trigger('endofgame', game_result, results.append)
+        return analysis, results
+    return make
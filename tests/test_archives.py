@@ -0,0 +1,71 @@
+import os
+import gzip
+import shutil
+import zipfile
+
+import pytest
+
+from retrosheet import archives
+from retrosheet.reader import read_event_files
+
+@pytest.fixture
+def archived(event_files, tmp_path):
+    """
+    The synthetic event files archived three ways: all in one zip (with a
+    file that isn't an Event file), and each one gzipped
+    """
+    zip_path = str(tmp_path / '2019eve.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for filename in event_files:
+            zf.write(filename, os.path.basename(filename))
+        zf.writestr('TEAM2019', 'NYA,A,New York,Yankees\n')
+    gz_paths = []
+    for filename in event_files:
+        gz_path = str(tmp_path / (os.path.basename(filename) + '.gz'))
+        with open(filename, 'rb') as infile, gzip.open(gz_path, 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+        gz_paths.append(gz_path)
+    return zip_path, gz_paths
+
+def test_expand(event_files, archived):
+    zip_path, gz_paths = archived
+    members = ['{}/{}'.format(zip_path, os.path.basename(f)) for f in event_files]
+    assert archives.expand([zip_path]) == members
+    assert archives.expand([zip_path + '/*1.EVN']) == members[1:2]
+    assert archives.expand([os.path.join(os.path.dirname(zip_path), '*.zip')]) == members
+    assert archives.expand(gz_paths + ['-']) == gz_paths + ['-']
+    with pytest.raises(ValueError):
+        archives.expand([zip_path + '/*.EVA'])
+    with pytest.raises(ValueError):
+        archives.expand([os.path.join(os.path.dirname(zip_path), '*.nope')])
+
+def test_size(event_files, archived):
+    zip_path, gz_paths = archived
+    sizes = [os.path.getsize(f) for f in event_files]
+    assert archives.size(zip_path) == sum(sizes)
+    assert [archives.size(gz_path) for gz_path in gz_paths] == sizes
+
+@pytest.mark.parametrize('threads', [0, 1, 4])
+def test_read_archived(event_files, archived, threads):
+    zip_path, gz_paths = archived
+    expected = list(read_event_files(event_files))
+    assert list(read_event_files(archives.expand([zip_path]), threads=threads)) == expected
+    assert list(read_event_files(gz_paths, threads=threads)) == expected
+    # Archived and plain files mixed
+    mixed = [gz_paths[0]] + event_files[1:]
+    assert list(read_event_files(mixed, threads=threads)) == expected
+
+@pytest.mark.parametrize('run_kwargs', [{}, {'by_game': True}, {'nprocs': 2}])
+def test_analysis_of_archives(make_analysis, event_files, archived, run_kwargs):
+    zip_path, gz_paths = archived
+    analysis, expected = make_analysis(event_files)
+    analysis.run(**run_kwargs)
+    for filenames in [[zip_path], gz_paths]:
+        analysis, results = make_analysis(filenames)
+        analysis.run(**run_kwargs)
+        assert results == expected
+
+def test_archives_cant_be_indexed(make_analysis, archived, tmp_path):
+    zip_path, _ = archived
+    with pytest.raises(ValueError):
+        make_analysis([zip_path], checkpoint_path=str(tmp_path / 'checkpoint'))
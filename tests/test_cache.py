@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from retrosheet.cache import EventFileCache
+from retrosheet.event import pythonify_line
+from retrosheet.reader import read_event_files
+
+LINES = [
+    'id,AAA201904010',
+    'version,2',
+    'info,visteam,BBB',
+    'info,attendance,',
+    'start,smitj001,"Smith, Jr., John",0,1,8',
+    'play,1,0,smitj001,00,,K',
+    'com,"He said ""safe"""',
+    'sub,doeja001,"Jane Doe",0,1,11',
+    'play,1,0,doeja001,12,BX,S8/G.1-2',
+    'badj,doeja001,L',
+    'data,er,abcd001,2',
+    'data,er',
+    'data,er,abcd001,',
+    'data,er,abcd001,2,extra,fields',
+    'id,AAA201904020',
+    'play,1,0,smitj001,,,NP',
+]
+
+def records(pylines):
+    """ Each record as its type and the values of its attributes, to compare them """
+    return [(type(pyline).__name__, tuple(getattr(pyline, slot, None) for slot in pyline.__slots__))
+            for pyline in pylines]
+
+@pytest.fixture
+def event_file(tmp_path):
+    path = tmp_path / 'test.EVN'
+    path.write_text('\n'.join(LINES) + '\n', encoding='utf-8')
+    return str(path)
+
+@pytest.fixture
+def cache(tmp_path, event_file):
+    cache = EventFileCache(str(tmp_path / 'cache'))
+    assert not cache.is_fresh(event_file)
+    cache.write(event_file, list(read_event_files([event_file])))
+    return cache
+
+def test_cached_records_same_as_text(cache, event_file):
+    assert cache.is_fresh(event_file)
+    expected = records(pythonify_line(line) for line in read_event_files([event_file]))
+    assert records(cache.read(event_file)) == expected
+
+    data = [values for name, values in expected if name == 'Data']
+    assert data == [(('er', 'abcd001', '2'),), (('er',),), (('er', 'abcd001', ''),),
+                    (('er', 'abcd001', '2', 'extra', 'fields'),)]
+
+def test_wanted_skips_record_types(cache, event_file):
+    wanted = {'id', 'play'}
+    expected = records(pythonify_line(line) for line in read_event_files([event_file], wanted))
+    cached = records(cache.read(event_file, wanted))
+    assert cached == expected
+    assert {name for name, _ in cached} == {'ID', 'Play'}
+    assert records(cache.read(event_file, set())) == []
+
+def test_changed_mtime_is_stale(cache, event_file):
+    st = os.stat(event_file)
+    os.utime(event_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert not cache.is_fresh(event_file)
+
+def test_changed_size_is_stale(cache, event_file):
+    st = os.stat(event_file)
+    with open(event_file, 'a') as outfile:
+        outfile.write('com,"more"\n')
+    # Same mtime, so only the size tells them apart
+    os.utime(event_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert not cache.is_fresh(event_file)
+
+def test_rewrite_makes_fresh_again(cache, event_file):
+    with open(event_file, 'a') as outfile:
+        outfile.write('com,"more"\n')
+    assert not cache.is_fresh(event_file)
+    cache.write(event_file, list(read_event_files([event_file])))
+    assert cache.is_fresh(event_file)
+    assert records(cache.read(event_file))[-1] == ('Com', ('more',))
@@ -0,0 +1,65 @@
+import pytest
+
+from retrosheet.handlers import ActivePlayers
+
+def run(analysis, by_game):
+    analysis.run(by_game=by_game)
+
+def with_checkpoint(make_analysis, filenames, path, stop_after=None):
+    """
+    make_analysis() with a checkpoint every 7 games, whose results are
+    saved with the checkpoint. If @stop_after is passed, the run is
+    interrupted once that many games have results.
+    """
+    analysis, results = make_analysis(filenames, checkpoint_path=path, checkpoint_every=7)
+    analysis.register_checkpoint_hook(lambda: list(results), results.extend)
+    if stop_after is not None:
+        trigger = analysis.triggers['endofgame']
+        def use(result):
+            results.append(result)
+            if len(results) == stop_after:
+                raise KeyboardInterrupt()
+        trigger.use = use
+    return analysis, results
+
+@pytest.mark.parametrize('by_game', [False, True])
+def test_resume_after_interruption(make_analysis, event_files, tmp_path, by_game):
+    analysis, expected = make_analysis(event_files)
+    run(analysis, by_game)
+
+    path = str(tmp_path / 'checkpoint')
+    analysis, results = with_checkpoint(make_analysis, event_files, path, stop_after=40)
+    with pytest.raises(KeyboardInterrupt):
+        run(analysis, by_game)
+
+    analysis, results = with_checkpoint(make_analysis, event_files, path)
+    run(analysis, by_game)
+    assert results == expected
+    assert analysis.handlers['inn_played'].game_state is analysis.handlers['game_state']
+
+@pytest.mark.parametrize('by_game', [False, True])
+def test_resume_with_new_files(make_analysis, event_files, tmp_path, by_game):
+    analysis, expected = make_analysis(event_files)
+    run(analysis, by_game)
+
+    path = str(tmp_path / 'checkpoint')
+    analysis, _ = with_checkpoint(make_analysis, event_files[:2], path)
+    run(analysis, by_game)
+    analysis, results = with_checkpoint(make_analysis, event_files, path)
+    run(analysis, by_game)
+    assert results == expected
+
+    # Nothing new: nothing is run again
+    analysis, results = with_checkpoint(make_analysis, event_files, path)
+    run(analysis, by_game)
+    assert results == expected
+
+def test_checkpoint_of_other_handlers(make_analysis, event_files, tmp_path):
+    path = str(tmp_path / 'checkpoint')
+    analysis, _ = with_checkpoint(make_analysis, event_files[:1], path)
+    run(analysis, True)
+
+    analysis, _ = with_checkpoint(make_analysis, event_files, path)
+    analysis.handlers['winner'] = ActivePlayers()
+    with pytest.raises(ValueError):
+        run(analysis, True)
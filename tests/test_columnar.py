@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from retrosheet import Analysis, columnar
+
+def in_memory(event_files):
+    return Analysis(filenames=event_files).export(chunk_rows=100)
+
+def assert_same_tables(expected, actual):
+    assert sorted(expected) == sorted(actual)
+    for name in expected:
+        assert expected[name].dtype == actual[name].dtype, name
+        np.testing.assert_array_equal(expected[name], actual[name], err_msg=name)
+    assert expected.meta['categories'] == actual.meta['categories']
+
+def test_numpy_is_the_default(event_files, tmp_path):
+    Analysis(filenames=event_files).export(str(tmp_path), chunk_rows=100)
+    assert columnar.load(str(tmp_path)).meta['format'] == 'numpy'
+
+def test_numpy_round_trip(event_files, tmp_path):
+    expected = in_memory(event_files)
+    Analysis(filenames=event_files).export(str(tmp_path), chunk_rows=100, format='numpy')
+    assert_same_tables(expected, columnar.load(str(tmp_path)))
+
+def test_arrow_round_trip(event_files, tmp_path):
+    pytest.importorskip('pyarrow')
+    expected = in_memory(event_files)
+    Analysis(filenames=event_files).export(str(tmp_path), chunk_rows=100, format='arrow')
+    assert_same_tables(expected, columnar.load(str(tmp_path)))
+
+def test_tables_join_by_game(event_files):
+    tables = in_memory(event_files)
+    assert len(tables['games']) == 90
+    plays = tables['play']
+    assert np.all(np.diff(plays['game_idx']) >= 0)
+    hometeam = tables.info('hometeam')[plays['game_idx']]
+    assert all(team is not None for team in hometeam)
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        columnar.ColumnarWriter(str(tmp_path), format='csv')
@@ -0,0 +1,35 @@
+import pytest
+
+from retrosheet import ids
+from retrosheet.ids import IDCodes
+from retrosheet.utils import PlayerRegistry
+
+def write_players(path, playerIDs):
+    lines = ['ID,Last,First,Play debut,Mgr debut,Coach debut,Ump debut']
+    lines += ['{},Last,First,04/01/2019,,,'.format(playerID) for playerID in playerIDs]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    registry = PlayerRegistry(write_players(tmp_path / 'first.csv', ['aaaa001', 'bbbb001']),
+                              index_dir=str(tmp_path / 'index'))
+    monkeypatch.setattr(ids, 'players', IDCodes(lambda: registry))
+    return registry
+
+def test_registered_players_have_their_index_as_code(registry):
+    assert ids.players.code('bbbb001') == 1
+    assert ids.players.code('zzzz001') == 2
+    assert ids.players.unknown() == ['zzzz001']
+
+def test_set_path_before_codes_are_given_out(registry, tmp_path):
+    registry.set_path(write_players(tmp_path / 'second.csv', ['cccc001']))
+    assert ids.players.code('cccc001') == 0
+
+def test_set_path_after_codes_are_given_out(registry, tmp_path):
+    ids.players.code('aaaa001')
+    with pytest.raises(RuntimeError):
+        registry.set_path(write_players(tmp_path / 'second.csv', ['cccc001']))
+    # The same file again is fine
+    registry.set_path(registry.path)
+    assert registry['bbbb001'] == 1
@@ -0,0 +1,99 @@
+import datetime
+
+import pytest
+
+from retrosheet import index as index_module
+from retrosheet.index import GameFilter, GameIndex, scan_event_file
+
+GAMES = [
+    ('AAA201904010', '2019/04/01', 'AAA', 'BBB'),
+    ('CCC201904050', '2019/04/05', 'CCC', 'AAA'),
+    ('DDD201905010', '2019/05/01', 'DDD', 'EEE'),
+    ('EEE201906010', None, 'EEE', 'BBB'),
+]
+
+def game_text(gameID, date, hometeam, visteam, newline='\n'):
+    lines = ['id,' + gameID, 'version,2', 'info,visteam,' + visteam, 'info,hometeam,' + hometeam]
+    if date:
+        lines.append('info,date,' + date)
+    lines += ['start,smitj001,"José Smith",0,1,8', 'play,1,0,smitj001,00,,K', 'com,"Über"']
+    return newline.join(lines) + newline
+
+def write_games(path, games, newline='\n'):
+    texts = [game_text(*game, newline=newline) for game in games]
+    with open(path, 'wb') as outfile:
+        outfile.write('com,"header"{}'.format(newline).encode('utf-8'))
+        outfile.write(''.join(texts).encode('utf-8'))
+    return [text.encode('utf-8') for text in texts]
+
+@pytest.mark.parametrize('newline', ['\n', '\r\n'])
+def test_offsets_rebuild_each_game(tmp_path, newline):
+    path = str(tmp_path / 'test.EVN')
+    texts = write_games(path, GAMES, newline)
+    games = scan_event_file(path)
+    assert [game.gameID for game in games] == [game[0] for game in GAMES]
+    with open(path, 'rb') as infile:
+        content = infile.read()
+    for game, text in zip(games, texts):
+        assert content[game.offset:game.offset + game.length] == text
+    assert games[-1].offset + games[-1].length == len(content)
+    assert [(game.date, game.hometeam, game.visteam) for game in games] == \
+        [game[1:] for game in GAMES]
+
+def test_saved_index_only_rescans_changed_files(tmp_path, monkeypatch):
+    first, second = str(tmp_path / 'first.EVN'), str(tmp_path / 'second.EVN')
+    write_games(first, GAMES[:2])
+    write_games(second, GAMES[2:])
+
+    scanned = []
+    def scan(filename):
+        scanned.append(filename)
+        return scan_event_file(filename)
+    monkeypatch.setattr(index_module, 'scan_event_file', scan)
+
+    path = str(tmp_path / 'games.idx')
+    GameIndex(path).update([first, second])
+    assert scanned == [first, second]
+
+    del scanned[:]
+    saved = GameIndex(path)
+    saved.update([first, second])
+    assert scanned == []
+    assert [game.gameID for game in saved.games([second, first])] == \
+        [GAMES[2][0], GAMES[3][0], GAMES[0][0], GAMES[1][0]]
+
+    write_games(second, GAMES[3:])
+    GameIndex(path).update([first, second])
+    assert scanned == [second]
+    assert [game.gameID for game in GameIndex(path).games([second])] == [GAMES[3][0]]
+
+@pytest.fixture
+def games(tmp_path):
+    path = str(tmp_path / 'test.EVN')
+    write_games(path, GAMES)
+    return GameIndex().select([path], GameFilter())
+
+def selected(games, game_filter):
+    return [game.gameID for game in games if game_filter(game)]
+
+def test_no_criteria_keeps_every_game(games):
+    assert len(games) == len(GAMES)
+
+def test_filter_by_gameIDs(games):
+    assert selected(games, GameFilter(gameIDs=['CCC201904050', 'XXX'])) == ['CCC201904050']
+
+def test_filter_by_teams(games):
+    assert selected(games, GameFilter(teams=['AAA'])) == ['AAA201904010', 'CCC201904050']
+    assert selected(games, GameFilter(teams={'BBB', 'DDD'})) == \
+        ['AAA201904010', 'DDD201905010', 'EEE201906010']
+
+def test_filter_by_dates(games):
+    assert selected(games, GameFilter(date_from='2019/04/05')) == ['CCC201904050', 'DDD201905010']
+    assert selected(games, GameFilter(date_to=datetime.date(2019, 4, 5))) == \
+        ['AAA201904010', 'CCC201904050']
+    assert selected(games, GameFilter(date_from=datetime.date(2019, 4, 2),
+                                      date_to='2019-05-01')) == ['CCC201904050', 'DDD201905010']
+
+def test_criteria_combine(games):
+    game_filter = GameFilter(teams=['AAA'], date_from=datetime.date(2019, 4, 2))
+    assert selected(games, game_filter) == ['CCC201904050']
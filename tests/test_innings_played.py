@@ -0,0 +1,35 @@
+import pytest
+
+from retrosheet.event import pythonify_line
+from retrosheet.handlers import GameState, InningsPlayed
+
+LINES = [
+    ['id', 'A'],
+    ['start', 'aaaa001', 'A', '0', '1', '8'],
+    ['start', 'bbbb001', 'B', '1', '1', '8'],
+    ['play', '1', '0', 'aaaa001', '00', '', 'K'],
+    ['play', '1', '0', 'aaaa001', '00', '', 'K'],
+    ['play', '1', '0', 'aaaa001', '00', '', 'K'],
+    ['sub', 'cccc001', 'C', '1', '1', '8'],
+]
+
+def feed(handlers, lines):
+    for line in lines:
+        pyline = pythonify_line(line)
+        for handler in handlers:
+            handler.handle(pyline)
+
+def test_unlinked_handler_raises_clear_error():
+    handler = InningsPlayed()
+    with pytest.raises(RuntimeError, match='GameState'):
+        feed([handler], LINES)
+
+def test_linked_by_hand():
+    handler = InningsPlayed()
+    game_state = GameState()
+    game_state.link(handler)
+    # The GameState handles each record last, as in an Analysis
+    feed([handler, game_state], LINES)
+    assert handler.game_state is game_state
+    assert game_state.inning == 1 and game_state.at_bat == 1
+    assert handler.get_all_innings_played() == {'bbbb001': pytest.approx(1 + 3 / 3.0)}
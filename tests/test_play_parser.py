@@ -0,0 +1,83 @@
+import pytest
+
+from retrosheet.event import pythonify_line
+from retrosheet.handlers import Inning
+from retrosheet.play_parser import parse_event
+
+from generate_events import load_hard_plays
+
+# Outs and runners put out on each play in hard_plays.txt, going by the
+# notes there
+HARD_PLAY_OUTS = {
+    'FC6/G.3XH(UR)(6E2);2-3;B-2': (),
+    'S7/G+.BX3(75)(E7)': ('B',),
+    'CS3(25)/MREV.1-2(TH3)': ('2',),
+    'CS3(E1/TH).2-H(UR)(TH)(NR)': (),
+    '6(1)3(B)56(2)/GTP.3-H(NR)': ('1', 'B', '2'),
+}
+
+def test_every_hard_play_has_expected_outs():
+    assert sorted(load_hard_plays()) == sorted(HARD_PLAY_OUTS)
+
+@pytest.mark.parametrize('event', sorted(HARD_PLAY_OUTS))
+def test_hard_play_outs(event):
+    parsed = parse_event(event)
+    assert parsed.runners_out == HARD_PLAY_OUTS[event]
+    assert parsed.outs == len(HARD_PLAY_OUTS[event])
+
+@pytest.mark.parametrize('event, runners_out', [
+    ('K', ('B',)),
+    ('K.B-1', ()),
+    ('K23.BX1(3)', ('B',)),
+    ('K+SB2', ('B',)),
+    ('W+PO1', ('1',)),
+    ('POCS2(14)', ('1',)),
+    ('63.2-H(E2)', ('B',)),
+    ('E6.B-1', ()),
+    ('64(1)3/GDP', ('1', 'B')),
+    ('8/F.3XH(82)', ('B', '3')),
+    ('S8.2-H;1-3', ()),
+])
+def test_outs(event, runners_out):
+    parsed = parse_event(event)
+    assert parsed.runners_out == runners_out
+    assert parsed.outs == len(runners_out)
+
+def test_compound_play():
+    parsed = parse_event('K+SB2')
+    assert (parsed.basic_play, parsed.second_play) == ('K', 'SB2')
+
+def test_modifiers_split_outside_parens():
+    parsed = parse_event('CS3(E1/TH).2-H(UR)(TH)(NR)')
+    assert parsed.basic_play == 'CS3(E1/TH)'
+    assert parsed.modifiers == ()
+
+def test_advances():
+    parsed = parse_event('FC6/G.3XH(UR)(6E2);2-3;B-2')
+    assert [(a.runner, a.to, a.out, a.params) for a in parsed.advances] == [
+        ('3', 'H', False, ('UR', '6E2')),
+        ('2', '3', False, ()),
+        ('B', '2', False, ()),
+    ]
+
+def test_error_on_advance_keeps_groundout():
+    parsed = parse_event('63.2-H(E2)')
+    assert parsed.advances[0].params == ('E2',)
+    assert not parsed.advances[0].out
+
+def play(inning, homeaway, event):
+    return pythonify_line(['play', str(inning), str(homeaway), 'abcde001', '00', '', event])
+
+def test_strikeout_plus_with_two_outs_ends_the_half_inning():
+    inning = Inning()
+    inning.handle_id(None)
+    for record in [play(1, 0, 'K'), play(1, 0, '63'), play(1, 0, 'K+SB2'),
+                   play(1, 1, '8'), play(1, 1, '43'), play(1, 1, '7'),
+                   play(2, 0, 'S8')]:
+        inning.handle_play(record)
+    assert (inning.inning, inning.at_bat, inning.out) == (2, 0, 0)
+
+def test_event_string_is_not_modified():
+    record = play(1, 0, 'K+SB2!')
+    Inning().handle_play(record)
+    assert record.event == 'K+SB2!'
@@ -0,0 +1,87 @@
+import numpy as np
+
+from retrosheet.event import ID, Play, pythonify_line
+from retrosheet.handlers import Inning, WrongInningException
+from retrosheet.play_parser import parse_event
+from retrosheet.play_state import PlayArrays, PlayState
+from retrosheet.reader import read_event_files
+
+def read_pylines(filenames):
+    return [pythonify_line(line) for line in read_event_files(filenames)]
+
+def inning_floats(pylines):
+    """
+    float() of an Inning handler before and after each play and at the end
+    of each game, and the games in which it raised WrongInningException
+    """
+    inning = Inning()
+    before, after, game_end, lost = [], [], [], set()
+    game = -1
+    for pyline in pylines:
+        if type(pyline) is ID:
+            if game >= 0:
+                game_end.append(float(inning))
+            game += 1
+            inning.handle_id(pyline)
+        elif type(pyline) is Play:
+            before.append(float(inning))
+            try:
+                inning.handle_play(pyline)
+            except WrongInningException:
+                # PlayState keeps counting outs past an inconsistent play
+                lost.add(game)
+                inning.tot_outs += parse_event(pyline.event).outs
+            after.append(float(inning))
+    game_end.append(float(inning))
+    return before, after, game_end, lost
+
+def test_matches_inning_handler(event_files):
+    pylines = read_pylines(event_files)
+    arrays = PlayArrays(pylines)
+    state = arrays.play_state()
+    before, after, game_end, lost = inning_floats(pylines)
+
+    assert arrays.ngames == 90
+    np.testing.assert_array_equal(state.inning_before, before)
+    np.testing.assert_array_equal(state.inning_after, after)
+    np.testing.assert_array_equal(state.game_end_inning, game_end)
+    assert set(state.inconsistent_games) == lost
+
+def test_flags_game_with_bad_play():
+    lines = [
+        ['id', 'A'],
+        ['play', '1', '0', 'p', '00', '', 'K'],
+        ['play', '1', '0', 'p', '00', '', 'K'],
+        ['play', '1', '0', 'p', '00', '', 'K'],
+        ['play', '1', '1', 'p', '00', '', 'S8'],
+        ['id', 'B'],
+        ['play', '1', '0', 'p', '00', '', 'K'],
+        # Still the top of the first with 1 out, not the bottom
+        ['play', '1', '1', 'p', '00', '', 'K'],
+        ['play', '1', '0', 'p', '00', '', 'K'],
+    ]
+    state = PlayArrays([pythonify_line(line) for line in lines]).play_state()
+    np.testing.assert_array_equal(state.inconsistent_games, [1])
+    np.testing.assert_array_equal(state.first_inconsistent, [-1, 5])
+    np.testing.assert_array_equal(state.game_outs, [3, 3])
+    np.testing.assert_array_equal(state.half_starts, [0, 3, 4])
+
+def test_games_without_plays():
+    state = PlayArrays([pythonify_line(['id', 'X'])]).play_state()
+    assert state.ngames == 1
+    np.testing.assert_array_equal(state.game_outs, [0])
+    np.testing.assert_array_equal(state.game_end_inning, [1.0])
+    assert len(state.inconsistent_games) == 0
+    assert len(state.half_starts) == 0
+
+    state = PlayState([], [], [], [], ngames=2)
+    np.testing.assert_array_equal(state.game_outs, [0, 0])
+    np.testing.assert_array_equal(state.game_consistent, [True, True])
+    assert len(state.inning_before) == 0
+
+    assert PlayState([], [], [], []).ngames == 0
+
+def test_games_without_plays_between_others():
+    lines = [['id', 'A'], ['id', 'B'], ['play', '1', '0', 'p', '00', '', 'K'], ['id', 'C']]
+    state = PlayArrays([pythonify_line(line) for line in lines]).play_state()
+    np.testing.assert_array_equal(state.game_outs, [0, 1, 0])
@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+from retrosheet import Analysis, StopAnalysis
+from retrosheet.analysis import _prefetched
+from retrosheet.event import pythonify_line
+from retrosheet.handlers import Handler
+
+class StopAfter(Handler):
+    """ Stops the analysis at the ID record of game @ngames + 1 """
+    def __init__(self, ngames):
+        super(StopAfter, self).__init__()
+        self.ngames = ngames
+        self.seen = 0
+
+    def handle_id(self, _id):
+        self.seen += 1
+        if self.seen > self.ngames:
+            raise StopAnalysis("Seen {} games".format(self.ngames))
+
+def prefetch_threads():
+    return [thread for thread in threading.enumerate()
+            if thread.name == 'retrosheet-prefetch' and thread.is_alive()]
+
+@pytest.mark.parametrize('by_game', [False, True])
+def test_stop_after_some_games(event_files, by_game):
+    handler = StopAfter(5)
+    analysis = Analysis(filenames=event_files)
+    analysis.register_handler('stop', handler)
+    analysis.run(by_game=by_game, prefetch=1)
+    assert handler.seen == 6
+    assert prefetch_threads() == []
+
+def failing_stream(ngames):
+    for i in range(ngames):
+        yield pythonify_line(['id', 'GAME{:05d}'.format(i)])
+    raise OSError("Disk went away")
+
+@pytest.mark.parametrize('by_game', [False, True])
+def test_reader_exception_is_raised(event_files, by_game):
+    handler = StopAfter(10 ** 6)
+    analysis = Analysis(filenames=event_files)
+    analysis.register_handler('stop', handler)
+    analysis._stream = lambda wanted=None: failing_stream(3000)
+    with pytest.raises(OSError, match='Disk went away'):
+        analysis.run(by_game=by_game, prefetch=1)
+    assert prefetch_threads() == []
+
+def test_reader_stops_when_closed_early():
+    read = []
+    def stream():
+        for i in range(10 ** 6):
+            read.append(i)
+            yield i
+    items = _prefetched(stream(), 2, 10)
+    assert [next(items) for _ in range(5)] == list(range(5))
+    items.close()
+    assert prefetch_threads() == []
+    # At most the batch in hand, the full queue and the batch being put
+    assert len(read) <= 4 * 10
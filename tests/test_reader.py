@@ -0,0 +1,63 @@
+import csv
+
+import pytest
+
+from retrosheet.reader import read_event_files, split_lines
+
+LINES = [
+    'id,NYA201904010',
+    'version,2',
+    'info,visteam,BAL',
+    'info,hometeam,NYA',
+    'start,smitj001,"Smith, Jr., John",0,1,8',
+    'start,judga001,"José Abreu",1,2,9',
+    'play,1,0,smitj001,12,BX,S8',
+    'com,"He said ""safe"", then ""out"""',
+    'sub,doeja001,"O\'Doe, Jane",0,1,11',
+    'play,1,0,doeja001,00,,K',
+    'badj,judga001,L',
+    'data,er,abcd001,2',
+]
+TEXT = '\n'.join(LINES) + '\n'
+
+def csv_lines(text, wanted=None):
+    return [row for row in csv.reader(text.splitlines())
+            if row and (wanted is None or row[0] in wanted)]
+
+@pytest.fixture
+def event_file(tmp_path):
+    path = tmp_path / 'test.EVN'
+    path.write_bytes(TEXT.encode('utf-8'))
+    return str(path)
+
+def test_split_lines_matches_csv():
+    assert list(split_lines(TEXT)) == csv_lines(TEXT)
+
+def test_quoted_fields():
+    rows = list(split_lines(TEXT, {'start', 'com', 'sub'}))
+    assert rows[0][2] == 'Smith, Jr., John'
+    assert rows[2] == ['com', 'He said "safe", then "out"']
+    assert rows[3][2] == "O'Doe, Jane"
+
+def test_crlf():
+    text = TEXT.replace('\n', '\r\n')
+    assert list(split_lines(text)) == csv_lines(TEXT)
+
+@pytest.mark.parametrize('wanted', [{'play'}, {'start', 'sub'}, {'com', 'data', 'id'}, set()])
+def test_wanted(wanted):
+    assert list(split_lines(TEXT, wanted)) == csv_lines(TEXT, wanted)
+
+def test_record_type_prefixes_are_not_wanted():
+    # 'id' must not pick up lines of a type that starts with it, or 'info' 'in'
+    assert list(split_lines('idx,1\nid,A\ninfo,x,y\n', {'id', 'in'})) == [['id', 'A']]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 20])
+def test_chunks(event_file, chunk_size):
+    # Small chunks cut lines, including quoted ones, in the middle
+    rows = list(read_event_files([event_file], chunk_size=chunk_size))
+    assert rows == csv_lines(TEXT)
+
+def test_no_trailing_newline(tmp_path):
+    path = tmp_path / 'test.EVN'
+    path.write_bytes(TEXT.rstrip('\n').encode('utf-8'))
+    assert list(read_event_files([str(path)], chunk_size=16)) == csv_lines(TEXT)
@@ -0,0 +1,47 @@
+from retrosheet.handlers import ActivePlayers, InningsPlayed, Winner
+
+class CountingWinner(Winner):
+    """ Adds per-game state in __init__ without a reset_game() of its own """
+    def __init__(self):
+        super(CountingWinner, self).__init__()
+        self.starts = 0
+
+    def handle_start(self, start):
+        super(CountingWinner, self).handle_start(start)
+        self.starts += 1
+
+class CountingWinnerInPlace(CountingWinner):
+    def reset_game(self):
+        super(CountingWinnerInPlace, self).reset_game()
+        self.starts = 0
+
+def test_builtin_handlers_reset_in_place():
+    for cls in [ActivePlayers, InningsPlayed, Winner]:
+        assert cls._resets_in_place, cls.__name__
+
+    handler = InningsPlayed()
+    inn_played = handler.home.inn_played
+    inn_played[1] = 9.0
+    handler.error = True
+    handler.reset()
+    assert handler.home.inn_played is inn_played
+    assert inn_played == {}
+    assert not handler.error
+
+def test_subclass_with_own_init_is_reinitialized():
+    assert not CountingWinner._resets_in_place
+    handler = CountingWinner()
+    handler.starts = 3
+    pitchers = handler.pitchers
+    handler.reset()
+    assert handler.starts == 0
+    assert handler.pitchers is not pitchers
+
+def test_subclass_can_opt_back_in():
+    assert CountingWinnerInPlace._resets_in_place
+    handler = CountingWinnerInPlace()
+    handler.starts = 3
+    pitchers = handler.pitchers
+    handler.reset()
+    assert handler.starts == 0
+    assert handler.pitchers is pitchers
@@ -0,0 +1,65 @@
+import shutil
+
+from retrosheet.handlers import InningsPlayed
+
+def counting_computes(analysis):
+    """ Count the calls to the compute function of the analysis' cached trigger """
+    trigger = analysis.triggers['endofgame']
+    compute = trigger.compute
+    calls = []
+    def counted(handlers):
+        calls.append(handlers['trigger'].prev_gameID)
+        return compute(handlers)
+    trigger.compute = counted
+    return calls
+
+def test_cached_results_are_the_same(make_analysis, event_files, tmp_path):
+    analysis, expected = make_analysis(event_files)
+    analysis.run(by_game=True)
+
+    cache_dir = str(tmp_path / 'results')
+    analysis, results = make_analysis(event_files, result_cache_dir=cache_dir)
+    computed = counting_computes(analysis)
+    analysis.run(by_game=True)
+    assert results == expected
+    assert len(computed) == len(expected)
+
+    # Everything comes from the cache the second time
+    analysis, results = make_analysis(event_files, result_cache_dir=cache_dir)
+    computed = counting_computes(analysis)
+    analysis.run(by_game=True)
+    assert results == expected
+    assert computed == []
+
+def test_changed_file_is_recomputed(make_analysis, event_files, tmp_path):
+    cache_dir = str(tmp_path / 'results')
+    analysis, expected = make_analysis(event_files, result_cache_dir=cache_dir)
+    analysis.run(by_game=True)
+
+    # The same games under another name are still found by their content,
+    # and a changed game is not
+    filenames = [str(tmp_path / 'copy{}.EVN'.format(i)) for i in range(len(event_files))]
+    for src, dst in zip(event_files, filenames):
+        shutil.copy(src, dst)
+    with open(filenames[-1], 'r') as infile:
+        text = infile.read()
+    with open(filenames[-1], 'w') as outfile:
+        outfile.write(text.replace('version,2\n', 'version,2\ncom,"changed"\n', 1))
+
+    analysis, results = make_analysis(filenames, result_cache_dir=cache_dir)
+    computed = counting_computes(analysis)
+    analysis.run(by_game=True)
+    assert results == expected
+    assert len(computed) == 1
+
+def test_new_handler_version_is_recomputed(make_analysis, event_files, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'results')
+    analysis, expected = make_analysis(event_files[:1], result_cache_dir=cache_dir)
+    analysis.run(by_game=True)
+
+    monkeypatch.setattr(InningsPlayed, 'version', InningsPlayed.version + 1)
+    analysis, results = make_analysis(event_files[:1], result_cache_dir=cache_dir)
+    computed = counting_computes(analysis)
+    analysis.run(by_game=True)
+    assert results == expected
+    assert len(computed) == len(expected)
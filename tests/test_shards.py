@@ -0,0 +1,75 @@
+import os
+import zipfile
+
+import pytest
+
+from generate_events import generate
+
+from retrosheet import ids
+from retrosheet.handlers import ActivePlayers
+from retrosheet.shards import (largest_first, run_shards, shard_by_file, shard_by_season,
+                               _restore_unknown_players)
+
+# Shards run in this worker process so far
+_started = []
+
+def setup_counting(analysis):
+    """ Records the order shards are run in, and the players in each """
+    analysis.register_handler('all_players', ActivePlayers())
+    _started.append(len(_started))
+    order = _started[-1]
+    return lambda: order
+
+def touch(directory, name, size=0):
+    path = os.path.join(str(directory), name)
+    with open(path, 'wb') as outfile:
+        outfile.write(b'x' * size)
+    return path
+
+def test_shard_by_season(tmp_path):
+    b = touch(tmp_path, '2019BBB.EVN')
+    a = touch(tmp_path, '2018AAA.EVA')
+    c = touch(tmp_path, '2019CCC.EVA')
+    other = touch(tmp_path, 'other.EVN')
+    assert shard_by_season([b, other, a, c]) == [[a], [b, c], [other]]
+    assert shard_by_file([b, a]) == [[b], [a]]
+
+def test_shard_by_season_splits_archives(tmp_path):
+    archive = str(tmp_path / 'seasons.zip')
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for name in ['2020AAA.EVA', '2019AAA.EVA', '2019BBB.EVN']:
+            zf.writestr(name, 'id,X\n')
+    assert shard_by_season([archive]) == [
+        [archive + '/2019AAA.EVA', archive + '/2019BBB.EVN'],
+        [archive + '/2020AAA.EVA'],
+    ]
+
+def test_largest_first(tmp_path):
+    small = touch(tmp_path, 'small', 10)
+    big = touch(tmp_path, 'big', 100)
+    medium = touch(tmp_path, 'medium', 60)
+    assert largest_first([[small], [big], [small, medium]]) == [1, 2, 0]
+
+def test_results_in_shard_order_largest_run_first(event_files):
+    shards = [[event_files[0]], [event_files[1], event_files[2]]]
+    results = list(run_shards(shards, setup_counting, nprocs=1))
+    assert [index for index, _, _ in results] == [0, 1]
+    # One worker runs the bigger second shard first
+    assert [order for _, _, order in results] == [1, 0]
+    players = [handlers['all_players'].players for _, handlers, _ in results]
+    assert all(players)
+
+def test_codes_of_unregistered_players(tmp_path):
+    players = ['zzfi{:03d}'.format(i) for i in range(60)]
+    shard = generate(str(tmp_path), 1, 2, seed=1, players=players)
+    [(_, handlers, _)] = run_shards([shard], setup_counting, nprocs=1)
+    playerIDs = handlers['all_players'].playerIDs
+    assert playerIDs and playerIDs <= set(players)
+
+def test_codes_numbered_differently_by_shards(monkeypatch):
+    monkeypatch.setattr(ids, 'players', ids.IDCodes(lambda: ['aaaa001', 'bbbb001']))
+    _restore_unknown_players(0, ['xxxx001', 'yyyy001'])
+    _restore_unknown_players(1, ['xxxx001'])
+    assert ids.players.id(3) == 'yyyy001'
+    with pytest.raises(ValueError, match='Shard 2'):
+        _restore_unknown_players(2, ['yyyy001'])
@@ -0,0 +1,128 @@
+import h5py
+import numpy as np
+import pytest
+import scipy.sparse
+
+from retrosheet.handlers.innings_played import InningsPlayedMatrix, append_csr_row
+from retrosheet.ids import NO_PLAYER
+from retrosheet.sparse_dataset import SparseDatasetReader, SparseDatasetWriter
+
+NCOLS = 6
+
+ROWS = [
+    ({0: 9.0, 3: 4.5}, 1.0),
+    ({}, 0.0),
+    ({5: 1.0, NO_PLAYER: 3.0}, 1.0),
+    ({1: 2.0, 2: 7.0, 4: 9.0}, 0.0),
+    ({3: 1.5}, 1.0),
+]
+
+def dense(rows):
+    x = np.zeros((len(rows), NCOLS))
+    for i, (row, _) in enumerate(rows):
+        for col, value in row.items():
+            if col != NO_PLAYER:
+                x[i, col] = value
+    return x, np.array([label for _, label in rows])
+
+def read(path, **kwargs):
+    with SparseDatasetReader(path) as reader:
+        x, y = reader.to_csr(**kwargs)
+    return x.toarray(), y
+
+def write(path, rows, **kwargs):
+    with SparseDatasetWriter(path, NCOLS, **kwargs) as writer:
+        for row, label in rows:
+            writer.add_row(row, label)
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'dataset.h5')
+
+def test_append_csr_row_skips_empty_slots():
+    data, indices, indptr = [], [], [0]
+    append_csr_row(data, indices, indptr, {2: 1.0, NO_PLAYER: 5.0})
+    append_csr_row(data, indices, indptr, {'aaaa001': 3.0, '': 5.0}, {'aaaa001': 4})
+    assert (data, indices, indptr) == ([1.0, 3.0], [2, 4], [0, 1, 2])
+
+def test_matrix_skips_empty_slots():
+    matrix = InningsPlayedMatrix()
+    for row, _ in ROWS:
+        matrix.add_row(row)
+    np.testing.assert_array_equal(matrix.to_csr(NCOLS).toarray(), dense(ROWS)[0])
+
+@pytest.mark.parametrize('buffer_rows', [1, 2, 4096])
+def test_round_trip(path, buffer_rows):
+    write(path, ROWS, buffer_rows=buffer_rows)
+    x, y = read(path)
+    expected_x, expected_y = dense(ROWS)
+    np.testing.assert_array_equal(x, expected_x)
+    np.testing.assert_array_equal(y, expected_y)
+
+def test_append_after_reopening(path):
+    write(path, ROWS[:3])
+    write(path, ROWS[3:], append=True)
+    x, y = read(path)
+    np.testing.assert_array_equal(x, dense(ROWS)[0])
+    np.testing.assert_array_equal(y, dense(ROWS)[1])
+
+    with pytest.raises(ValueError):
+        SparseDatasetWriter(path, NCOLS + 1, append=True)
+
+def test_truncate(path):
+    with SparseDatasetWriter(path, NCOLS, buffer_rows=2) as writer:
+        for row, label in ROWS[:4]:
+            writer.add_row(row, label)
+        writer.truncate(2)
+        assert writer.nrows == 2
+        writer.add_row(*ROWS[4])
+        with pytest.raises(ValueError):
+            writer.truncate(4)
+    rows = ROWS[:2] + ROWS[4:]
+    x, y = read(path)
+    np.testing.assert_array_equal(x, dense(rows)[0])
+    np.testing.assert_array_equal(y, dense(rows)[1])
+
+def test_rows_past_indptr_are_ignored(path):
+    write(path, ROWS[:2])
+    # A flush interrupted before indptr was written
+    with h5py.File(path, 'a') as f:
+        for name, values in [('data', [8.0, 8.0]), ('indices', [1, 2]), ('y', [1.0])]:
+            f[name].resize((len(f[name]) + len(values),))
+            f[name][-len(values):] = values
+
+    x, y = read(path)
+    np.testing.assert_array_equal(x, dense(ROWS[:2])[0])
+    np.testing.assert_array_equal(y, dense(ROWS[:2])[1])
+
+    # and dropped when the writer reopens the file
+    write(path, ROWS[2:3], append=True)
+    x, y = read(path)
+    np.testing.assert_array_equal(x, dense(ROWS[:3])[0])
+    np.testing.assert_array_equal(y, dense(ROWS[:3])[1])
+
+def test_batches_with_columns(path):
+    write(path, ROWS)
+    columns = [4, 0, 3]
+    expected_x, expected_y = dense(ROWS)
+    with SparseDatasetReader(path) as reader:
+        assert reader.shape == (len(ROWS), NCOLS)
+        batches = list(reader.batches(2, columns=columns))
+    assert [x.shape for x, _ in batches] == [(2, 3), (2, 3), (1, 3)]
+    np.testing.assert_array_equal(np.vstack([x.toarray() for x, _ in batches]),
+                                  expected_x[:, columns])
+    np.testing.assert_array_equal(np.concatenate([y for _, y in batches]), expected_y)
+
+def test_add_rows_offsets(path):
+    block_x, block_y = dense(ROWS[2:4])
+    with SparseDatasetWriter(path, NCOLS) as writer:
+        for row, label in ROWS[:2]:
+            writer.add_row(row, label)
+        writer.add_rows(scipy.sparse.csr_matrix(block_x), block_y)
+        writer.add_row(*ROWS[4])
+        assert writer.nrows == 5
+        with pytest.raises(ValueError):
+            writer.add_rows(scipy.sparse.csr_matrix(np.zeros((1, NCOLS + 1))), [0.0])
+    x, y = read(path)
+    np.testing.assert_array_equal(x, dense(ROWS)[0])
+    np.testing.assert_array_equal(y, dense(ROWS)[1])
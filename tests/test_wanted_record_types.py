@@ -0,0 +1,65 @@
+from retrosheet import Analysis
+from retrosheet.event import Com, Data
+from retrosheet.handlers import ActivePlayers, Handler, InningsPlayed, Winner
+
+LINES = [
+    'id,AAA201904010',
+    'version,2',
+    'info,visteam,BBB',
+    'info,hometeam,AAA',
+    'info,wp,pitc001',
+    'start,pitc001,"Pitcher",1,9,1',
+    'start,batt001,"Batter",0,1,8',
+    'play,1,0,batt001,00,,K',
+    'com,"A comment"',
+    'data,er,pitc001,0',
+]
+
+class AllTypes(Handler):
+    """ Batch handler that doesn't say which types it looks at """
+    def __init__(self):
+        super(AllTypes, self).__init__()
+        self.seen = set()
+
+    def handle_game(self, game):
+        self.seen.update(type(pyline) for pyline in game)
+
+class SomeTypes(AllTypes):
+    record_types = {'play'}
+
+class MoreTypes(SomeTypes):
+    """ Overrides handle_game without declaring its types again """
+    def handle_game(self, game):
+        super(MoreTypes, self).handle_game(game)
+
+def analysis_of(tmp_path, **handlers):
+    path = tmp_path / 'test.EVN'
+    path.write_text('\n'.join(LINES) + '\n')
+    analysis = Analysis(filenames=[str(path)])
+    for name, handler in handlers.items():
+        analysis.register_handler(name, handler)
+    return analysis
+
+def test_com_and_data_skipped(tmp_path):
+    analysis = analysis_of(tmp_path, inn_played=InningsPlayed(), winner=Winner(),
+                           all_players=ActivePlayers())
+    wanted = analysis._wanted_record_types()
+    assert wanted == {'id', 'start', 'sub', 'play', 'info'}
+    assert analysis._wanted_record_types(by_game=True) == wanted
+    types = {type(pyline) for pyline in analysis._stream(wanted)}
+    assert Com not in types and Data not in types
+
+def test_batch_handler_without_record_types_gets_every_type(tmp_path):
+    handler = AllTypes()
+    analysis = analysis_of(tmp_path, all_players=ActivePlayers(), everything=handler)
+    assert analysis._wanted_record_types() == {'id', 'start', 'sub'}
+    assert analysis._wanted_record_types(by_game=True) is None
+    analysis.run(by_game=True)
+    assert Com in handler.seen and Data in handler.seen
+
+def test_batch_handler_record_types(tmp_path):
+    analysis = analysis_of(tmp_path, plays=SomeTypes())
+    assert analysis._wanted_record_types(by_game=True) == {'id', 'play'}
+    assert MoreTypes.game_record_types is None
+    analysis = analysis_of(tmp_path, plays=MoreTypes())
+    assert analysis._wanted_record_types(by_game=True) is None